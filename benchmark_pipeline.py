@@ -0,0 +1,144 @@
+# benchmark_pipeline.py
+# Banc d'essai de bout en bout : summarize_from_url → polling du statut → ask_from_url,
+# avec N clients concurrents. Affiche débit et percentiles de latence par opération.
+#
+#   python fake_ollama_server.py --pdf-dir ./bench_pdfs &
+#   python benchmark_pipeline.py --api-url http://127.0.0.1:8000 \
+#       --pdf-url http://127.0.0.1:11434/pdf/rapport.pdf --clients 5 --asks 3
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_QUESTIONS = [
+    "Quelles sont les conclusions du document ?",
+    "Quelle méthode est décrite dans le document ?",
+    "Quels documents traitent de l'éducation ?",
+]
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, op, seconds):
+        with self.lock:
+            self.latencies.setdefault(op, []).append(seconds)
+
+    def error(self, op, message):
+        with self.lock:
+            self.errors.setdefault(op, []).append(message)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def run_client(client_idx, args, recorder):
+    session = requests.Session()
+    pdf_url = args.pdf_url[client_idx % len(args.pdf_url)]
+    entreprise = f"{args.entreprise}_{client_idx % args.tenants}"
+
+    start = time.time()
+    try:
+        res = session.post(f"{args.api_url}/summarize_from_url/",
+                           json={"url": pdf_url, "entreprise": entreprise}, timeout=60)
+        res.raise_for_status()
+        data = res.json()
+    except Exception as e:
+        recorder.error("summarize_submit", str(e))
+        return
+    recorder.record("summarize_submit", time.time() - start)
+
+    job_id = data.get("job_id")
+    if data.get("mode") == "cache":
+        recorder.record("summarize_total", time.time() - start)
+    else:
+        task_id = data.get("task_id")
+        while True:
+            poll_start = time.time()
+            try:
+                status = session.get(f"{args.api_url}/get_summarize_status/{task_id}/", timeout=30).json()
+            except Exception as e:
+                recorder.error("status_poll", str(e))
+                status = {"status": "error"}
+            recorder.record("status_poll", time.time() - poll_start)
+
+            if status.get("status") == "completed":
+                recorder.record("summarize_total", time.time() - start)
+                break
+            if status.get("status") == "failed" or time.time() - start > args.job_timeout:
+                recorder.error("summarize_total", status.get("error", "timeout"))
+                return
+            time.sleep(args.poll_interval)
+
+    for i in range(args.asks):
+        question = args.question[i % len(args.question)]
+        ask_start = time.time()
+        try:
+            res = session.post(f"{args.api_url}/ask_from_url/", json={
+                "question": question, "job_id": job_id, "entreprise": entreprise
+            }, timeout=300)
+            res.raise_for_status()
+            recorder.record("ask", time.time() - ask_start)
+        except Exception as e:
+            recorder.error("ask", str(e))
+
+def build_report(recorder, wall_time):
+    report = {"wall_time": round(wall_time, 2), "operations": {}}
+    for op, values in sorted(recorder.latencies.items()):
+        report["operations"][op] = {
+            "count": len(values),
+            "errors": len(recorder.errors.get(op, [])),
+            "throughput_per_s": round(len(values) / wall_time, 3) if wall_time else 0.0,
+            "p50": round(percentile(values, 50), 3),
+            "p90": round(percentile(values, 90), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "max": round(max(values), 3),
+        }
+    for op, errors in recorder.errors.items():
+        report["operations"].setdefault(op, {"count": 0, "errors": len(errors)})
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark débit/latence du pipeline IA")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--pdf-url", action="append", required=True, help="URL de PDF (répétable)")
+    parser.add_argument("--clients", type=int, default=5, help="clients concurrents")
+    parser.add_argument("--tenants", type=int, default=1, help="nombre d'entreprises simulées")
+    parser.add_argument("--entreprise", default="Bench")
+    parser.add_argument("--asks", type=int, default=3, help="questions par client après le résumé")
+    parser.add_argument("--question", action="append", default=None)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--job-timeout", type=float, default=3600.0)
+    parser.add_argument("--json", action="store_true", help="sortie JSON brute")
+    args = parser.parse_args()
+    args.question = args.question or DEFAULT_QUESTIONS
+
+    recorder = Recorder()
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        for client_idx in range(args.clients):
+            executor.submit(run_client, client_idx, args, recorder)
+    report = build_report(recorder, time.time() - start)
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print(f"\n📊 Benchmark : {args.clients} clients, {args.asks} questions/client, durée {report['wall_time']}s")
+    print(f"{'opération':<18}{'n':>6}{'err':>6}{'débit/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for op, stats in report["operations"].items():
+        print(f"{op:<18}{stats['count']:>6}{stats['errors']:>6}{stats.get('throughput_per_s', 0):>10}"
+              f"{stats.get('p50', 0):>9}{stats.get('p95', 0):>9}{stats.get('p99', 0):>9}{stats.get('max', 0):>9}")
+
+if __name__ == "__main__":
+    main()
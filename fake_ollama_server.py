@@ -0,0 +1,220 @@
+# fake_ollama_server.py
+# Serveur local imitant l'API Ollama (/api/generate) pour tester la charge sans GPU ni réseau.
+#
+#   python fake_ollama_server.py --port 11434 --token-rate 40 --parallel 2 --failure-rate 0.02
+#   OLLAMA_BASE_URL=http://127.0.0.1:11434 celery -A ia_backend worker ...
+#
+# Sert aussi les PDF d'un dossier local (GET /pdf/<nom>) pour un benchmark 100% hors-ligne.
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BLOCK_SUMMARY = (
+    "Problématique : le document traite d'un dispositif numérique déployé dans des établissements "
+    "scolaires et des questions d'usage qu'il soulève pour les enseignants et les élèves. "
+    "Méthode : les auteurs s'appuient sur des observations de terrain, des entretiens et des "
+    "données chiffrées recueillies sur plusieurs années auprès de différentes classes. "
+    "Résultats : les usages progressent lentement, les freins principaux sont la formation, "
+    "l'équipement et le temps disponible, et les effets pédagogiques restent contrastés."
+)
+MERGE_SUMMARY = (
+    "**Introduction :** Le document présente un dispositif numérique éducatif et son contexte. "
+    "**Points clés :** Les usages observés, les freins liés à la formation et à l'équipement, "
+    "ainsi que les effets pédagogiques mesurés sont détaillés. "
+    "**Conclusion :** Le dispositif est prometteur mais son impact dépend de l'accompagnement."
+)
+CLASSIFIER_ANSWER = '{"type": "précise", "confiance": 0.8, "raison": "question sur un document spécifique"}'
+KEYWORDS_ANSWER = "numérique, éducation, enseignants, équipement, formation"
+ENRICHMENT_ANSWER = ('{"mots_cles": ["numérique", "éducation", "enseignants", "équipement", "formation"], '
+                     '"themes": ["transformation numérique", "pédagogie", "équipement scolaire"]}')
+ANSWER = "Le document indique que les usages progressent lentement, freinés par la formation et l'équipement."
+
+def pick_response(prompt):
+    if "Classifie" in prompt:
+        return CLASSIFIER_ANSWER
+    if "mots_cles" in prompt:
+        return ENRICHMENT_ANSWER
+    if "mots-clés" in prompt or "thèmes" in prompt:
+        return KEYWORDS_ANSWER
+    if "Texte à résumer" in prompt:
+        return BLOCK_SUMMARY
+    if "Résumés à fusionner" in prompt or "résumés intermédiaires" in prompt:
+        return MERGE_SUMMARY
+    return ANSWER
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if self.server.config.verbose:
+            super().log_message(fmt, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.server.config
+        if self.path in ("/api/tags", "/api/ps"):
+            self._send_json(200, {"models": [{"name": m} for m in config.models]})
+            return
+        if self.path.startswith("/pdf/") and config.pdf_dir:
+            name = os.path.basename(self.path[len("/pdf/"):])
+            path = os.path.join(config.pdf_dir, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        config = self.server.config
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        prompt = request.get("prompt", "")
+        options = request.get("options") or {}
+        self.server.count("requests")
+
+        # Injection de pannes
+        roll = random.random()
+        if roll < config.failure_rate:
+            self.server.count("failures")
+            self._send_json(500, {"error": "panne injectée"})
+            return
+        if roll < config.failure_rate + config.hang_rate:
+            self.server.count("hangs")
+            time.sleep(config.hang_seconds)
+            self._send_json(503, {"error": "blocage injecté"})
+            return
+
+        wait_start = time.time()
+        with self.server.slots:  # OLLAMA_NUM_PARALLEL simulé : au-delà, les requêtes attendent
+            queue_wait = time.time() - wait_start
+            load_duration = 0.0
+            model = request.get("model", "")
+            with self.server.lock:
+                if model != self.server.loaded_model:
+                    load_duration = config.load_seconds
+                    self.server.loaded_model = model
+            time.sleep(load_duration)
+
+            if not prompt:  # prompt vide = simple chargement du modèle (préchargement)
+                self._send_json(200, {"model": model, "response": "", "done": True,
+                                      "load_duration": int(load_duration * 1e9)})
+                self.server.count("completed")
+                return
+
+            prompt_tokens = max(1, len(prompt) // 4)
+            prompt_duration = config.prompt_latency + prompt_tokens / config.prompt_rate
+            time.sleep(prompt_duration)
+
+            words = pick_response(prompt).split(" ")
+            num_predict = options.get("num_predict") or len(words)
+            words = words[:max(1, min(len(words), num_predict))] if num_predict > 0 else words
+            token_delay = 1.0 / config.token_rate
+
+            stats = {
+                "model": model,
+                "done": True,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_duration * 1e9),
+                "eval_count": len(words),
+                "eval_duration": int(len(words) * token_delay * 1e9),
+                "load_duration": int(load_duration * 1e9),
+                "total_duration": int((time.time() - wait_start + len(words) * token_delay) * 1e9),
+            }
+
+            if request.get("stream", True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, word in enumerate(words):
+                    time.sleep(token_delay)
+                    chunk = {"model": model, "response": word if i == 0 else f" {word}", "done": False}
+                    self._write_chunk(json.dumps(chunk, ensure_ascii=False) + "\n")
+                self._write_chunk(json.dumps(dict(stats, response=""), ensure_ascii=False) + "\n")
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                time.sleep(len(words) * token_delay)
+                self._send_json(200, dict(stats, response=" ".join(words)))
+
+        self.server.count("completed")
+        self.server.add_wait(queue_wait)
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeOllamaHandler)
+        self.config = config
+        self.slots = threading.Semaphore(config.parallel)
+        self.lock = threading.Lock()
+        self.loaded_model = None
+        self.counters = {"requests": 0, "completed": 0, "failures": 0, "hangs": 0}
+        self.wait_total = 0.0
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def add_wait(self, seconds):
+        with self.lock:
+            self.wait_total += seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Ollama pour tests de charge hors-ligne")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--parallel", type=int, default=2, help="requêtes traitées simultanément (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--token-rate", type=float, default=30.0, help="tokens générés par seconde")
+    parser.add_argument("--prompt-rate", type=float, default=400.0, help="tokens de prompt évalués par seconde")
+    parser.add_argument("--prompt-latency", type=float, default=0.05, help="latence fixe par requête (s)")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="coût d'un changement de modèle (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="proportion de réponses HTTP 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="proportion de requêtes bloquées")
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--models", nargs="*", default=["mistral", "mistral:instruct", "llama3:instruct"])
+    parser.add_argument("--pdf-dir", default=None, help="dossier servi sous /pdf/<nom>")
+    parser.add_argument("--verbose", action="store_true")
+    config = parser.parse_args()
+
+    server = FakeOllamaServer((config.host, config.port), config)
+    print(f"🤖 Faux Ollama sur http://{config.host}:{config.port} "
+          f"(parallel={config.parallel}, {config.token_rate} tok/s, pannes={config.failure_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        completed = server.counters["completed"]
+        avg_wait = server.wait_total / completed if completed else 0.0
+        print(f"\n📊 {server.counters} | attente moyenne slot : {avg_wait:.2f}s")
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
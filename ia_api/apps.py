@@ -1,5 +1,24 @@
+import os
+import sys
+import threading
 from django.apps import AppConfig
 
+# Points d'entrée HTTP reconnus (exécutable ou `python -m <module>`) ; IA_WEB_SERVER=1/0 force le choix
+WEB_SERVER_COMMANDS = ("gunicorn", "uvicorn", "uwsgi", "daphne", "hypercorn")
+
+def _is_web_server() -> bool:
+    """Serveur HTTP (runserver hors process de rechargement, gunicorn, uvicorn...), pas worker, commande ni tests."""
+    forced = os.environ.get("IA_WEB_SERVER")
+    if forced is not None:
+        return forced == "1"
+    argv = getattr(sys, "argv", None) or [""]
+    command = os.path.basename(argv[0])
+    if command == "__main__.py":
+        command = os.path.basename(os.path.dirname(argv[0]))  # python -m gunicorn -> gunicorn/__main__.py
+    if command == "manage.py":
+        return "runserver" in argv and (os.environ.get("RUN_MAIN") == "true" or "--noreload" in argv)
+    return command.startswith(WEB_SERVER_COMMANDS)
+
 class IaApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ia_api'
@@ -19,3 +38,11 @@ class IaApiConfig(AppConfig):
             init_db()
         except Exception as e:
             logging.warning(f"Erreur init DB metadonnees : {e}")
+
+        # 🔥 Préchargement des modèles du chemin ask (serveur web uniquement)
+        if _is_web_server():
+            try:
+                from ia_backend.ask_engine import warm_ask_path
+                threading.Thread(target=warm_ask_path, name="ollama-warmup", daemon=True).start()
+            except Exception as e:
+                logging.warning(f"Erreur préchargement modèles Ollama : {e}")
@@ -1,10 +1,17 @@
 from django.urls import path
-from ia_backend.views import summarize_from_url, ask_from_url, get_summarize_status, latest_job
+from ia_backend.views import (
+    summarize_from_url, ask_from_url, get_summarize_status, latest_job,
+    get_summarize_progress, stream_summarize_progress, llm_metrics, ask_from_url_stream
+)
 
 urlpatterns = [
     path('summarize_from_url/', summarize_from_url),
     path('ask_from_url/', ask_from_url),
+    path('ask_from_url_stream/', ask_from_url_stream),  # 💬 réponse token par token (SSE)
     path('get_summarize_status/<str:task_id>/', get_summarize_status),  # ✅ nouveau endpoint async pour Celery
+    path('get_summarize_progress/<str:job_id>/', get_summarize_progress),
+    path('stream_summarize_progress/<str:job_id>/', stream_summarize_progress),  # 📡 SSE progression par bloc
+    path('llm_metrics/', llm_metrics),
     path('latest_job/<str:entreprise>/', latest_job),
 ]
  
\ No newline at end of file
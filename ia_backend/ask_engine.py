@@ -2,27 +2,50 @@ import os
 import json
 import logging
 import uuid
-import torch
+import threading
 import numpy as np
 import time
-from typing import List, Dict, Tuple
-from sentence_transformers import SentenceTransformer, util, CrossEncoder
+from typing import List, Dict, Tuple, Iterator
+from sentence_transformers import SentenceTransformer, CrossEncoder
 
 # --- Imports spécifiques backend IA ---
-from ia_backend.services.ollama_gateway import generate_ollama
+from ia_backend.services.ollama_gateway import (
+    generate_ollama,
+    stream_ollama,
+    warm_models,
+    LLMStreamInterrupted,
+    OLLAMA_WARMUP,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_CLASSIFICATION
+)
+from ia_backend.services.llm_telemetry import CALLER_ASK, CALLER_CLASSIFIER, CALLER_WARMUP
 from ia_backend.services.metadata_db import (
-    find_nearest_pdf_by_embedding,      # FAISS
     find_documents_by_keyword,          # FTS5 (gardé si besoin)
     find_documents_by_keyword_semantic
 )
 
 
 from ia_backend.services.chat_memory import save_interaction
+from ia_backend.services.block_store import get_block_store
+from ia_backend.services.ask_context import AskContext
+from ia_backend.services.rerank_batcher import RerankBatcher, RERANK_MAX_BATCH
+
+ANSWER_CACHE_TTL = 24 * 3600  # réponses basse température réutilisées 24h (hors reformulation)
+ANSWER_MODEL = "llama3:instruct"
+CLASSIFIER_MODEL = "mistral"
+CLASSIFIER_TEMPERATURE = 0.0  # classification déterministe : même question, même réponse (cachable)
+# Modèles du chemin ask préchargés au démarrage du serveur web, avec le num_ctx de
+# MODEL_NUM_CTX : le même que les appels ask et que le worker (mistral = fusion finale)
+INTERACTIVE_MODELS = [ANSWER_MODEL, CLASSIFIER_MODEL]
 
 # --- Initialisation logging et modèles ---
 logger = logging.getLogger(__name__)
-model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDING_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+model = SentenceTransformer(EMBEDDING_MODEL_NAME)
 reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Re-ranking partagé par les requêtes concurrentes (micro-lots + cache des scores)
+rerank_batcher = RerankBatcher(lambda pairs: reranker.predict(pairs, batch_size=RERANK_MAX_BATCH))
+ANN_CANDIDATE_FACTOR = 4  # candidats FAISS par bloc final, avant pondération qualité + re-rank
 
 
 # ---------------------------------------------------------------------------
@@ -33,15 +56,11 @@ import concurrent.futures
 from typing import Tuple, Dict
 import numpy as np
 
-# Cache pour les embeddings de questions (réduit les appels LLM)
-QUESTION_EMBEDDINGS_CACHE = lru_cache(maxsize=1000)
-
 # Modèle lightweight pour pré-classification
 FAST_CLASSIFIER = SentenceTransformer("paraphrase-MiniLM-L6-v2")
 
-# Exemples de questions pré-classifiées pour few-shot learning
-# Exemples de questions pré-classifiées pour few-shot learning
-PRECLASSIFIED_EXAMPLES = [
+# Exemples de questions pré-classifiées pour few-shot learning (repli si le fichier de données manque)
+BUILTIN_PRECLASSIFIED_EXAMPLES = [
     # Questions GÉNÉRALES
     ("Liste des documents sur la fiscalité", "générale"),
     ("Résumez les rapports financiers 2023", "générale"),
@@ -63,18 +82,86 @@ PRECLASSIFIED_EXAMPLES = [
     ("Quelle méthode pédagogique est décrite dans le document sur le MO5 ?", "précise")
 ]
 
+PRECLASSIFIED_EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), "data", "preclassified_examples.json")
+PRECLASSIFY_THRESHOLD = 0.75  # similarité min. avec l'exemple le plus proche
+
+def load_preclassified_examples(path: str = PRECLASSIFIED_EXAMPLES_PATH) -> List[Tuple[str, str]]:
+    """
+    Exemples étiquetés lus depuis le fichier de données ([{"question", "type"}, ...]) :
+    on en ajoute sans toucher au code. Repli sur la liste intégrée si absent ou invalide.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        examples = [
+            (item["question"], item["type"]) for item in data
+            if item.get("question") and item.get("type") in {"générale", "précise"}
+        ]
+        if examples:
+            return examples
+        logger.warning(f"Aucun exemple exploitable dans {path}, exemples intégrés utilisés")
+    except (OSError, json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+        logger.warning(f"Exemples de classification illisibles ({path}), exemples intégrés utilisés : {e}")
+    return list(BUILTIN_PRECLASSIFIED_EXAMPLES)
+
+PRECLASSIFIED_EXAMPLES = load_preclassified_examples()
 
-def classify_question_with_score_v2(question: str) -> Tuple[str, float]:
+def normalize_question(question: str) -> str:
+    """Clé de cache : casse, espaces et ponctuation finale ignorés (modèle non sensible à la casse)."""
+    return " ".join(question.lower().split()).rstrip(" ?!.")
+
+class ExampleIndex:
+    """
+    Embeddings normalisés des exemples, calculés une seule fois : la similarité cosinus
+    avec toutes les questions d'un lot se réduit à un produit matriciel.
+    """
+
+    def __init__(self, examples: List[Tuple[str, str]]):
+        self.examples = examples
+        self.labels = [label for _, label in examples]
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    self._matrix = FAST_CLASSIFIER.encode(
+                        [normalize_question(q) for q, _ in self.examples],
+                        normalize_embeddings=True,
+                        convert_to_numpy=True
+                    ).astype(np.float32)
+        return self._matrix
+
+    def nearest(self, question_embs: np.ndarray) -> List[Tuple[str, float]]:
+        """Exemple le plus proche de chaque question (embeddings normalisés, une ligne par question)."""
+        similarities = question_embs @ self.matrix.T
+        best = similarities.argmax(axis=1)
+        results = []
+        for row, idx in enumerate(best):
+            score = float(similarities[row, idx])
+            results.append((self.labels[idx], score) if score > PRECLASSIFY_THRESHOLD else ("inconnu", 0.0))
+        return results
+
+EXAMPLE_INDEX = ExampleIndex(PRECLASSIFIED_EXAMPLES)
+
+
+def classify_question_with_score_v2(question: str, ctx: AskContext = None) -> Tuple[str, float]:
     """
     Version optimisée avec fallback intelligent et pré-classification
     """
+    ctx = ctx or AskContext(question)
+
     # Étape 1: Pré-classification rapide avec embedding (évite 60% des appels LLM)
-    pre_class, pre_conf = fast_preclassify(question)
+    with ctx.stage("preclassify"):
+        pre_class, pre_conf = fast_preclassify(question)
     if pre_conf > 0.85:  # Seuil de confiance élevé
         return (pre_class, pre_conf)
 
     # Étape 2: Appel LLM seulement si nécessaire
-    llm_class, llm_conf = call_llm_classifier(question)
+    with ctx.stage("classify_llm"):
+        llm_class, llm_conf = call_llm_classifier(question)
     
     # Étape 3: Fusion intelligente des résultats
     final_class, final_conf = combine_results(
@@ -84,36 +171,61 @@ def classify_question_with_score_v2(question: str) -> Tuple[str, float]:
     
     return (final_class, final_conf)
 
-@QUESTION_EMBEDDINGS_CACHE
 def fast_preclassify(question: str) -> Tuple[str, float]:
     """
     Classification rapide avec similarité sémantique sur exemples connus
     """
-    question_emb = FAST_CLASSIFIER.encode(question)
-    examples_embs = [FAST_CLASSIFIER.encode(ex[0]) for ex in PRECLASSIFIED_EXAMPLES]
-    
-    similarities = util.pytorch_cos_sim(question_emb, examples_embs)[0]
-    max_idx = similarities.argmax().item()
-    
-    if similarities[max_idx] > 0.75:  # Seuil de similarité
-        return (PRECLASSIFIED_EXAMPLES[max_idx][1], float(similarities[max_idx]))
-    
-    return ("inconnu", 0.0)
+    return _fast_preclassify_normalized(normalize_question(question))
+
+@lru_cache(maxsize=1000)
+def _fast_preclassify_normalized(normalized: str) -> Tuple[str, float]:
+    question_emb = FAST_CLASSIFIER.encode([normalized], normalize_embeddings=True, convert_to_numpy=True)
+    return EXAMPLE_INDEX.nearest(question_emb.astype(np.float32))[0]
+
+def classify_many(questions: List[str], use_llm: bool = False) -> List[Tuple[str, float]]:
+    """
+    Classification d'un lot (évaluation hors-ligne) : un seul encodage pour toutes les
+    questions distinctes. use_llm=True : mêmes règles que classify_question_with_score_v2.
+    """
+    normalized = [normalize_question(q) for q in questions]
+    unique = list(dict.fromkeys(normalized))
+    if not unique:
+        return []
+    embs = FAST_CLASSIFIER.encode(unique, normalize_embeddings=True, convert_to_numpy=True, batch_size=64)
+    by_question = dict(zip(unique, EXAMPLE_INDEX.nearest(embs.astype(np.float32))))
+
+    results = []
+    for question, key in zip(questions, normalized):
+        pre_class, pre_conf = by_question[key]
+        if use_llm and pre_conf <= 0.85:
+            llm_class, llm_conf = call_llm_classifier(question)
+            results.append(combine_results(pre_class, pre_conf, llm_class, llm_conf))
+        else:
+            results.append((pre_class, pre_conf))
+    return results
 
 def call_llm_classifier(question: str) -> Tuple[str, float]:
     """
     Appel LLM optimisé avec timeout et retry
     """
     prompt = build_few_shot_prompt(question)
-    
+
     for attempt in range(2):  # 2 tentatives max
         try:
             with concurrent.futures.ThreadPoolExecutor() as executor:
+                # Préfixe few-shot identique d'un appel à l'autre : Ollama peut le retrouver dans le
+                # cache KV d'un de ses slots, sans garantie (une fusion sur mistral l'évince)
                 future = executor.submit(
                     generate_ollama,
                     prompt=prompt,
                     num_predict=80,  # Réduit pour la classification
-                    
+                    models=[CLASSIFIER_MODEL],
+                    temperature=CLASSIFIER_TEMPERATURE,
+                    priority=PRIORITY_CLASSIFICATION,
+                    cache=True,
+                    raw=True,  # le prompt porte déjà ses balises [INST]
+                    caller=CALLER_CLASSIFIER,
+                    cache_validator=is_valid_classifier_response
                 )
                 response = future.result(timeout=3.0)
                 
@@ -126,21 +238,34 @@ def call_llm_classifier(question: str) -> Tuple[str, float]:
             
     return ("précise", 0.5)  # Fallback conservateur
 
-def build_few_shot_prompt(question: str) -> str:
+def is_valid_classifier_response(response: str) -> bool:
+    """Seule une réponse exploitable est mise en cache : sinon la 2e tentative relirait la même erreur."""
+    try:
+        validate_response(json.loads(response.strip()))
+    except (ValueError, TypeError, AttributeError):
+        return False
+    return True
+
+@lru_cache(maxsize=1)
+def build_few_shot_prefix() -> str:
     """
-    Prompt avec exemples pour meilleure consistance
+    Partie statique du prompt (consignes + exemples) : identique pour toutes les
+    questions et placée en tête, Ollama peut la retrouver dans son cache de prompt.
     """
     examples_str = "\n".join(
         f"- Exemple {i+1} ({type}): {q}"
         for i, (q, type) in enumerate(PRECLASSIFIED_EXAMPLES)
     )
-    
+
     return f"""[INST]
 Tu es un classifieur de questions. Voici des exemples :
 
 {examples_str}
 
-Classifie cette nouvelle question :
+"""
+
+def build_few_shot_suffix(question: str) -> str:
+    return f"""Classifie cette nouvelle question :
 
 QUESTION: {question}
 
@@ -152,6 +277,26 @@ Réponds UNIQUEMENT en JSON valide :
 }}
 [/INST]"""
 
+def build_few_shot_prompt(question: str) -> str:
+    """
+    Prompt avec exemples pour meilleure consistance
+    """
+    return build_few_shot_prefix() + build_few_shot_suffix(question)
+
+def warm_ask_path():
+    """Préchargement du chemin ask : index des exemples, modèles, puis préfixe few-shot du classifieur."""
+    EXAMPLE_INDEX.matrix  # embeddings des exemples calculés avant la première question
+    if not OLLAMA_WARMUP:
+        return
+    warm_models(INTERACTIVE_MODELS, priority=PRIORITY_INTERACTIVE)
+    try:
+        # Évalue le préfixe une première fois : la première question le trouve dans le cache de prompt
+        # d'Ollama si aucune fusion n'est passée sur mistral entre-temps
+        generate_ollama(build_few_shot_prefix(), num_predict=1, models=[CLASSIFIER_MODEL],
+                        priority=PRIORITY_CLASSIFICATION, raw=True, caller=CALLER_WARMUP)
+    except Exception as e:
+        logger.warning(f"Préfixe du classifieur non préchargé : {e}")
+
 def combine_results(
     pre_class: str, pre_conf: float,
     llm_class: str, llm_conf: float
@@ -199,142 +344,53 @@ def validate_response(data: Dict) -> Tuple[str, float]:
 
 
 
-# ---------------------------------------------------------------   ------------
-#     Utilitaire : charger tous les blocs d’un job_id (fichier par PDF)
-# ---------------------------------------------------------------------------
-def load_all_blocks(entreprise: str, job_id: str) -> List[Tuple[str, Dict]]:
-    """
-    Charge tous les blocs de résumé depuis le cache JSON pour une entreprise et un job donnés.
-    
-    Args:
-        entreprise: Nom de l'entreprise
-        job_id: Identifiant du job
-        
-    Returns:
-        Liste de tuples (résumé, métadonnées) pour chaque bloc valide
-        
-    Raises:
-        FileNotFoundError: Si le dossier spécifié n'existe pas
-    """
-    folder_path = os.path.join("cache_json", "save_summaryblocks", entreprise, job_id)
-    logger.info(f"Chargement des blocs depuis le dossier: {folder_path}")
-    
-    if not os.path.exists(folder_path):
-        logger.error(f"Dossier introuvable: {folder_path}")
-        raise FileNotFoundError(f"Dossier introuvable : {folder_path}")
-
-    blocks: List[Tuple[str, Dict]] = []
-    valid_files = 0
-    skipped_files = 0
-    
-    for filename in sorted(os.listdir(folder_path)):
-        # Filtrage des fichiers JSON de blocs
-        if not filename.startswith("bloc_") or not filename.endswith(".json"):
-            skipped_files += 1
-            continue
-            
-        full_path = os.path.join(folder_path, filename)
-        try:
-            with open(full_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                
-            if "embedding" not in data:
-                logger.warning(f"Fichier {filename} ignoré - embedding manquant")
-                skipped_files += 1
-                continue
-
-            # Vérifie que l'embedding est bien une liste de 384 floats
-            emb = data["embedding"]
-            if isinstance(emb, str):
-                try:
-                    emb = json.loads(emb)
-                except Exception as e:
-                    logger.warning(f"{filename} - embedding JSON mal formé: {e}")
-                    skipped_files += 1
-                    continue
-
-            if not isinstance(emb, list) or len(emb) != 384:
-                logger.warning(f"{filename} - embedding invalide (type: {type(emb)}, taille: {len(emb) if isinstance(emb, list) else 'N/A'})")
-                skipped_files += 1
-                continue
-
-            # Construction des métadonnées
-            meta = {
-                "source": filename,
-                "score": data.get("score", 0),
-                "translated": data.get("translated", False),
-                "embedding": emb
-            }
-            blocks.append((data.get("summary", ""), meta))
-            valid_files += 1
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Erreur de décodage JSON dans {filename}: {str(e)}")
-            skipped_files += 1
-        except Exception as e:
-            logger.error(f"Erreur inattendue lors du traitement de {filename}: {str(e)}")
-            skipped_files += 1
-
-    logger.info(
-        f"Chargement terminé - {valid_files} blocs valides, "
-        f"{skipped_files} fichiers ignorés/erronés"
-    )
-    return blocks
-
-
-
 # ---------------------------------------------------------------------------
 #     Utilitaire : trouver les blocs les plus pertinents (pipeline IA PDF)
 # ---------------------------------------------------------------------------
-def find_relevant_blocks(
+def find_relevant_blocks_in_store(
     question: str,
-    blocks: List[Tuple[str, Dict]],
+    store,
     top_k: int = 5,
-    relevance_threshold: float = 0.4
+    relevance_threshold: float = 0.4,
+    pdf_filename: str = None,
+    ctx: AskContext = None
 ) -> List[Dict]:
     """
-    Trouve les blocs les plus pertinents pour une question donnée en combinant:
-    - Similarité sémantique (70%)
-    - Score de qualité du bloc (30%)
-    - Re-ranking croisé
-    
-    Args:
-        question: Question à laquelle répondre
-        blocks: Liste des blocs à analyser
-        top_k: Nombre maximum de résultats à retourner
-        relevance_threshold: Seuil minimal de pertinence
-        
-    Returns:
-        Liste des blocs pertinents avec leurs métadonnées
+    Blocs les plus pertinents pour la question : une seule recherche FAISS au niveau bloc
+    sur tout le job (ou sur un PDF si `pdf_filename` est donné), puis pondération par la
+    qualité et re-ranking croisé des ANN_CANDIDATE_FACTOR * top_k meilleurs candidats.
     """
-    # Phase 1: Préparation des embeddings
-    candidate_blocks = []
-    embeddings = []
-    logger.info(f"Début de recherche sur {len(blocks)} blocs - top_k={top_k}")
-    
-    for summary, meta in blocks:
-        if "embedding" in meta:
-            embeddings.append(meta["embedding"])
-            candidate_blocks.append((summary, meta))
-    
-    if not embeddings:
-        logger.warning("Aucun embedding valide trouvé - recherche annulée")
+    ctx = ctx or AskContext(question)
+    question_emb = ctx.embedding(EMBEDDING_MODEL_NAME, model.encode, normalize=True)
+    with ctx.stage("ann_search"):
+        hits = store.search(question_emb, top_k * ANN_CANDIDATE_FACTOR, pdf_filename=pdf_filename)
+    logger.info(
+        f"Recherche ANN sur {len(store)} blocs du job {store.job_id}"
+        f"{f' (PDF {pdf_filename})' if pdf_filename else ''} : {len(hits)} candidats"
+    )
+    if not hits:
         return []
 
-    # Phase 2: Calcul des similarités
-    logger.debug("Conversion des embeddings en tenseurs...")
-    block_embs = torch.tensor(np.stack(embeddings), dtype=torch.float32).to("cpu")
-    question_emb = model.encode(question, convert_to_tensor=True).to(torch.float32).to("cpu")
-    
-    logger.info("Calcul des scores de similarité...")
-    similarities = util.pytorch_cos_sim(question_emb, block_embs)[0]
-    
+    candidate_blocks = [(store.blocks[row]["summary"], store.blocks[row]) for row, _ in hits]
+    similarities = [sim for _, sim in hits]
+    return score_and_rerank(question, candidate_blocks, similarities, top_k, relevance_threshold, ctx)
+
+
+def score_and_rerank(
+    question: str,
+    candidate_blocks: List[Tuple[str, Dict]],
+    similarities: List[float],
+    top_k: int,
+    relevance_threshold: float,
+    ctx: AskContext = None
+) -> List[Dict]:
+    """Pondération similarité/qualité, seuil, top_k puis re-ranking croisé des candidats."""
     # Phase 3: Combinaison des scores
     scored_blocks = []
     debug_scores = []
     
     for i, (_, meta) in enumerate(candidate_blocks):
-        sim_score = similarities[i].item()
+        sim_score = similarities[i]
         quality_score = meta.get("score", 0)
         combined_score = 0.7 * sim_score + 0.3 * quality_score
         
@@ -364,7 +420,7 @@ def find_relevant_blocks(
     if not scored_blocks:
         logger.warning("Aucun bloc ne dépasse le seuil - utilisation des meilleurs scores")
         scored_blocks = [
-            (i, 0.7 * similarities[i].item() + 0.3 * candidate_blocks[i][1].get("score", 0))
+            (i, 0.7 * similarities[i] + 0.3 * candidate_blocks[i][1].get("score", 0))
             for i in range(len(candidate_blocks))
         ]
     
@@ -374,8 +430,9 @@ def find_relevant_blocks(
     
     # Phase 5: Re-ranking croisé
     logger.info("Application du re-ranking croisé...")
-    cross_inputs = [(question, candidate_blocks[i][0]) for i in top_indices]
-    rerank_scores = reranker.predict(cross_inputs)
+    ctx = ctx or AskContext(question)
+    with ctx.stage("rerank"):
+        rerank_scores = rerank_batcher.score(question, [candidate_blocks[i][0] for i in top_indices])
     
     # Construction des résultats finaux
     results = []
@@ -464,88 +521,71 @@ RÈGLES :
 [/INST]"""
 
 # ---------------------------------------------------------------------------
-#    FONCTION CENTRALE : Génération de la réponse IA
+#    Préparation commune : classification + recherche + prompt
 # ---------------------------------------------------------------------------
-def generate_answer(
+def prepare_answer(
     question: str,
-    blocks: List[Tuple[str, Dict]],
     job_id: str = None,
-    session_id: str = None,
-    user_id: str = None,
     entreprise: str = "Entreprise_S3_Test",
     reformule: bool = False,
-    general: bool = False
-) -> str:
+    pdf_filename: str = None,
+    ctx: AskContext = None
+) -> Dict:
+    """
+    Retourne soit {"answer": message} (rien à générer), soit
+    {"prompt", "generation", "blocks_used", "branch"} prêt pour la génération.
+    `pdf_filename` restreint la branche précise aux blocs d'un PDF du job.
+    `ctx` porte l'embedding de la question (encodé une fois) et les temps par étape.
+    """
     total_start = time.time()
+    ctx = ctx or AskContext(question, entreprise, job_id)
 
     # --- 1. Classifier la question (générale ou précise) ---
-    q_type, confiance = classify_question_with_score_v2(question)
+    q_type, confiance = classify_question_with_score_v2(question, ctx)
     logger.info(f"🧠 Type de question détecté : {q_type.upper()} (confiance={confiance})")
 
     if q_type == "générale":
         logger.info("🟡 Branche GÉNÉRALE — recherche hybride (FTS+embeddings) sur mots_cles/themes")
-        results = find_documents_by_keyword_semantic(
-            question, entreprise, job_id, encode_text_fn=model.encode
-        )
+        question_emb = ctx.embedding(EMBEDDING_MODEL_NAME, model.encode)
+        with ctx.stage("general_search"):
+            results = find_documents_by_keyword_semantic(
+                question, entreprise, job_id, encode_text_fn=model.encode, question_emb=question_emb
+            )
         if not results:
-            return "Aucun document ne correspond à cette thématique."
+            return {"answer": "Aucun document ne correspond à cette thématique."}
 
-        prompt = build_summary_prompt_from_metadata(question, results)
-        gen_start = time.time()
-        answer = generate_ollama(
-            prompt=prompt,
-            num_predict=400,
-            models=["llama3:instruct"],
-            temperature=0.4
-        ).strip()
-        gen_time = time.time() - gen_start
-        logger.info(f"⏱️ Temps génération (générale) : {gen_time:.2f}s")
-        blocks_used = [doc[0] for doc in results]  # liste des filenames
-
-    else:
-        logger.info("🔵 Branche PRÉCISE — recherche vectorielle du PDF cible")
-        question_emb = model.encode(question).tolist()
-        pdf_matches = find_nearest_pdf_by_embedding(question_emb, entreprise, job_id)
-
-        if not pdf_matches:
-            logger.warning("Aucun document pertinent trouvé via embeddings.")
-            return "Je n’ai pas trouvé de document correspondant à votre question."
-
-        # On prend uniquement le fichier avec le meilleur score
-        pdf_filename, score = pdf_matches[0]
-        logger.info(f"📂 Document sélectionné via FAISS : {pdf_filename} (score={score:.4f})")
-
-        # Charger uniquement les blocs liés à ce PDF
-        all_blocks = load_all_blocks(entreprise, job_id)
-        filtered_blocks = [
-            b for b in all_blocks if b[1].get("pdf_filename") == pdf_filename
-        ]
-
-
-        selected = find_relevant_blocks(question, filtered_blocks)
-        retrieval_time = time.time() - total_start
-        logger.info(f"ASK ⏱️ Temps sélection blocs (retrieval+rérank) : {retrieval_time:.2f}s")
-
-        if not selected:
-            logger.info("🧠 Aucun bloc pertinent — pas d'information.")
-            return "Je n’ai pas trouvé cette information dans les documents analysés."
-
-        logger.info(f"🧠 Prompt déclenché : 📄 PDF ({'reformulation' if reformule else 'standard'})")
-        prompt = build_reformulation_prompt(question, selected) if reformule else build_prompt(question, selected)
-        gen_start = time.time()
-        answer = generate_ollama(
-            prompt=prompt,
-            num_predict=550,
-            models=["llama3:instruct"],
-            temperature=0.3
-        ).strip()
-        gen_time = time.time() - gen_start
-        logger.info(f"⏱️ Temps génération (pdf) : {gen_time:.2f}s")
-        blocks_used = [b["source"] for b in selected]
-
-    total_time = time.time() - total_start
-    logger.info(f"✅ Réponse générée en {total_time:.2f}s (total)")
+        return {
+            "branch": "générale",
+            "prompt": build_summary_prompt_from_metadata(question, results),
+            "generation": {"num_predict": 400, "models": [ANSWER_MODEL], "temperature": 0.4},
+            "blocks_used": [doc[0] for doc in results],  # liste des filenames
+        }
 
+    logger.info("🔵 Branche PRÉCISE — recherche vectorielle au niveau bloc sur tout le job")
+    try:
+        store = get_block_store(entreprise, job_id)
+    except FileNotFoundError:
+        logger.warning(f"Aucun bloc enregistré pour le job {job_id}")
+        return {"answer": "Je n’ai pas trouvé de document correspondant à votre question."}
+
+    # Une seule recherche top-k sur les blocs de tous les PDF du job (filtre optionnel par PDF)
+    selected = find_relevant_blocks_in_store(question, store, pdf_filename=pdf_filename, ctx=ctx)
+    retrieval_time = time.time() - total_start
+    logger.info(f"ASK ⏱️ Temps sélection blocs (retrieval+rérank) : {retrieval_time:.2f}s")
+
+    if not selected:
+        logger.info("🧠 Aucun bloc pertinent — pas d'information.")
+        return {"answer": "Je n’ai pas trouvé cette information dans les documents analysés."}
+
+    logger.info(f"🧠 Prompt déclenché : 📄 PDF ({'reformulation' if reformule else 'standard'})")
+    return {
+        "branch": "pdf",
+        "prompt": build_reformulation_prompt(question, selected) if reformule else build_prompt(question, selected),
+        "generation": {"num_predict": 550, "models": [ANSWER_MODEL], "temperature": 0.3},
+        "blocks_used": [b["source"] for b in selected],
+    }
+
+def record_answer(question, answer, blocks_used, job_id, session_id, user_id):
     if session_id is None:
         session_id = str(uuid.uuid4())
     try:
@@ -560,8 +600,101 @@ def generate_answer(
     except Exception as e:
         logger.error(f"Erreur lors de la sauvegarde de l'interaction chat : {e}")
 
+# ---------------------------------------------------------------------------
+#    FONCTION CENTRALE : Génération de la réponse IA
+# ---------------------------------------------------------------------------
+def generate_answer(
+    question: str,
+    job_id: str = None,
+    session_id: str = None,
+    user_id: str = None,
+    entreprise: str = "Entreprise_S3_Test",
+    reformule: bool = False,
+    pdf_filename: str = None,
+    ctx: AskContext = None
+) -> str:
+    total_start = time.time()
+    ctx = ctx or AskContext(question, entreprise, job_id)
+
+    prepared = prepare_answer(
+        question, job_id=job_id, entreprise=entreprise, reformule=reformule, pdf_filename=pdf_filename, ctx=ctx
+    )
+    if "answer" in prepared:
+        return prepared["answer"]
+
+    gen_start = time.time()
+    with ctx.stage("generation"):
+        answer = generate_ollama(
+            prompt=prepared["prompt"],
+            priority=PRIORITY_INTERACTIVE,
+            tenant=entreprise,
+            cache=not reformule,  # une reformulation doit produire une réponse différente
+            cache_ttl=ANSWER_CACHE_TTL,
+            caller=CALLER_ASK,
+            **prepared["generation"]
+        ).strip()
+    gen_time = time.time() - gen_start
+    logger.info(f"⏱️ Temps génération ({prepared['branch']}) : {gen_time:.2f}s")
+
+    total_time = time.time() - total_start
+    logger.info(f"✅ Réponse générée en {total_time:.2f}s (total) — étapes : {ctx.summary()['stages_s']}")
+
+    record_answer(question, answer, prepared["blocks_used"], job_id, session_id, user_id)
     return answer
 
+def generate_answer_stream(
+    question: str,
+    job_id: str = None,
+    session_id: str = None,
+    user_id: str = None,
+    entreprise: str = "Entreprise_S3_Test",
+    reformule: bool = False,
+    pdf_filename: str = None,
+    ctx: AskContext = None
+) -> Iterator[str]:
+    """
+    Même pipeline que generate_answer, mais les tokens sont rendus dès qu'Ollama
+    les produit. L'interaction est enregistrée une fois le flux terminé ; un flux
+    coupé en cours de route (LLMStreamInterrupted) n'est ni enregistré ni caché.
+    """
+    total_start = time.time()
+    ctx = ctx or AskContext(question, entreprise, job_id)
+
+    prepared = prepare_answer(
+        question, job_id=job_id, entreprise=entreprise, reformule=reformule, pdf_filename=pdf_filename, ctx=ctx
+    )
+    if "answer" in prepared:
+        yield prepared["answer"]
+        return
+
+    parts = []
+    first_token_time = None
+    gen_start = time.time()
+    try:
+        for chunk in stream_ollama(
+            prompt=prepared["prompt"],
+            priority=PRIORITY_INTERACTIVE,
+            tenant=entreprise,
+            cache=not reformule,
+            cache_ttl=ANSWER_CACHE_TTL,
+            caller=CALLER_ASK,
+            **prepared["generation"]
+        ):
+            if first_token_time is None:
+                first_token_time = time.time() - total_start
+                ctx.timings["first_token"] = first_token_time
+                logger.info(f"⏱️ Premier token ({prepared['branch']}) : {first_token_time:.2f}s")
+            parts.append(chunk)
+            yield chunk
+    except LLMStreamInterrupted as e:
+        logger.warning(f"✂️ Réponse tronquée non enregistrée : {e}")
+        raise
+
+    answer = "".join(parts).strip()
+    ctx.timings["generation"] = time.time() - gen_start
+    logger.info(f"✅ Réponse streamée en {time.time() - total_start:.2f}s (total) — étapes : {ctx.summary()['stages_s']}")
+    record_answer(question, answer, prepared["blocks_used"], job_id, session_id, user_id)
+
 # ---------------------------------------------------------------------------
 # FIN DU MODULE ask_engine.py
 # ---------------------------------------------------------------------------
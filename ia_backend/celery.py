@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_ready
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ia_backend.settings')
 
@@ -9,3 +10,11 @@ app = Celery('ia_backend')
 app.conf.broker_url = 'redis://localhost:6379/0'
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+
+@worker_ready.connect
+def warm_ollama_models(**kwargs):
+    """Précharge les modèles du pipeline de résumé dès que le worker est prêt."""
+    from ia_backend.services.summarizer import get_batch_models
+    from ia_backend.services.ollama_gateway import warm_models_in_background, PRIORITY_BATCH
+    warm_models_in_background(get_batch_models(), priority=PRIORITY_BATCH)
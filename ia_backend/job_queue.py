@@ -2,25 +2,52 @@ import os
 import time
 import logging
 import json
+import threading
+import heapq
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from sentence_transformers import SentenceTransformer  # ✅ Pour embeddings
 
 from ia_backend.services.pdf_utils import (
-    extract_blocks_from_pdf,
-    extract_text_from_block,
-    extract_full_text
+    TextBlock,
+    chunk_pages_by_tokens,
+    extract_full_text,
+    extract_pages_text,
+    extract_pages_text_pymupdf
 )
 from ia_backend.services.summarizer import (
     summarize_block,
     summarize_global,
     evaluate_summary_score,
-    is_summary_valid  # <-- AJOUT IMPORT
+    evaluate_summary_scores,
+    is_summary_valid,  # <-- AJOUT IMPORT
+    BLOCK_MODEL,
+    BLOCK_PROMPT_VERSION,
+    get_block_token_budget,
+    get_merge_model,
+    get_merge_token_budget,
+    extract_keywords_themes
 )
-from ia_backend.services.cache_manager import save_json
+from ia_backend.services.cache_manager import save_json, load_json
+from ia_backend.services.job_checkpoint import (
+    JobCheckpoint,
+    STAGE_BLOCKS,
+    STAGE_INTERMEDIATES,
+    STAGE_FINAL,
+    STAGE_METADATA
+)
+from ia_backend.services.job_progress import (
+    JobProgress,
+    PROGRESS_INTERMEDIATES,
+    PROGRESS_FINAL,
+    PROGRESS_ENRICHMENT
+)
+from ia_backend.services.block_store import build_block_store
+from ia_backend.services.summary_cache import get_cached_summary, store_summary, get_cache_stats
 from ia_backend.services.backup_service import save_global_summary
 from ia_backend.services.job_logger import log_job_history
 from ia_backend.services.language_detection_and_translation import process_text_block
 from ia_backend.services.metadata_db import insert_metadata
-from ia_backend.services.ollama_gateway import call_llm
+from ia_backend.services.token_budget import estimate_tokens, group_by_token_budget, MERGE_SEPARATOR
 from datetime import datetime
 
 # ---------- Logging centralisé optimisé ----------
@@ -35,8 +62,14 @@ if not logger.handlers:
 
 # ---------- Paramètres industriels centralisés ----------
 BLOCK_THRESHOLD_INITIAL = 0.68
-INTERMEDIATE_GROUP_SIZE = 5 
+INTERMEDIATE_GROUP_SIZE = 5  # résumés max par fusion intermédiaire (dans la limite du budget de tokens)
+REDUCE_MAX_INFLIGHT = 3  # fusions d'un même niveau menées en parallèle
+EMBEDDING_BATCH_SIZE = 16  # résumés de blocs encodés par passe (micro-lots)
 MAX_ATTEMPTS = 4
+BLOCK_MAX_INFLIGHT = 3  # nb max de blocs résumés en parallèle (1 = séquentiel)
+BLOCK_CANDIDATES = 1  # candidats générés en parallèle par bloc (best-of-N, 1 = essais séquentiels)
+BLOCK_SCORE_BATCH_SIZE = 16  # candidats de blocs scorés ensemble (une passe BERTScore)
+ENRICHMENT_MAX_INFLIGHT = 3  # score global, embedding et mots-clés/thèmes en parallèle
 
 # ✅ Chargement du modèle d'embedding une seule fois
 embedding_model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
@@ -57,134 +90,433 @@ def save_txt(path, content):
     with open(path, "w", encoding="utf-8") as f:
         f.write(content)
 
-# ---------- Pipeline complet ----------
-def process_job(job: Job):
-    start_total = time.time()
-
-    logger.info(f"\n🚀 Démarrage traitement job {job.job_id} (priorité : {job.priority})")
-
-    full_pdf_text = extract_full_text(job.pdf_path)
-    logger.info(f"📄 Extraction full text : {len(full_pdf_text)} caractères extraits")
-
-    full_text_path = f"temp_cache/{job.folder_name}_full_text.txt"
-    save_txt(full_text_path, full_pdf_text)
-
-    blocks = extract_blocks_from_pdf(job.pdf_path)
-    total_pages = sum(len(page) for page in blocks)
-    logger.info(f"🧩 Découpage dynamique | Total pages approx : {total_pages}")
+# ---------- Candidats de résumé (best-of-N) ----------
+def generate_block_candidate(text: str, stop_event: threading.Event, tenant: str = None):
+    """
+    Génère et traduit si besoin un candidat ; le scoring se fait par lots (voir summarize_blocks).
+    Retourne (résumé, traduit), ou None si un autre candidat a déjà été accepté entre-temps.
+    """
+    if stop_event.is_set():
+        return None
+    summary = summarize_block(text, tenant=tenant)
+    if stop_event.is_set():
+        return None  # inutile de traduire : le bloc est déjà satisfait
+    return process_text_block(summary)
+
+class BlockAttempts:
+    """Essais d'un bloc : candidats lancés ou en attente de score, meilleur résultat, verdict."""
+
+    def __init__(self, idx: int, block: TextBlock):
+        self.idx = idx
+        self.block = block
+        self.text = block.text if block.text.strip() else "(Bloc vide ou inexploitable.)"
+        self.stop_event = threading.Event()
+        self.started = 0
+        self.outstanding = 0  # candidats en file, en génération ou en attente de score
+        self.best_summary = ""
+        self.best_score = 0
+        self.translated = False
+        self.accepted = False
+        self.finalized = False
+
+    def consider(self, summary: str, score: float, translated: bool, attempt: int) -> bool:
+        """Prend en compte un candidat scoré ; True s'il est accepté (structuré ET au-dessus du seuil)."""
+        if is_summary_valid(summary) and score >= BLOCK_THRESHOLD_INITIAL:
+            logger.info(f"✅ Bloc {self.idx + 1} : résumé structuré et au-dessus du seuil trouvé à l'essai {attempt} (score={score:.3f})")
+            self.best_summary, self.best_score, self.translated = summary, score, translated
+            self.accepted = True
+            self.stop_event.set()  # les candidats encore en génération ne seront pas traduits
+            return True
+        if score > self.best_score:
+            self.best_summary, self.best_score, self.translated = summary, score, translated
+        logger.warning(f"Bloc {self.idx + 1} : résumé rejeté (non structuré ou score trop bas) essai {attempt} (score={score:.3f})")
+        return False
+
+    @property
+    def exhausted(self) -> bool:
+        return self.started >= MAX_ATTEMPTS and self.outstanding == 0
+
+def finalize_block(state: BlockAttempts):
+    """Résultat définitif d'un bloc : (résumé, score, traduit), ou None si aucun résumé exploitable."""
+    state.finalized = True
+    if not state.best_summary.strip():
+        logger.error(f"Bloc {state.idx + 1} ignoré : aucun résumé généré.")
+        return None
+
+    if state.accepted:
+        store_summary(state.text, BLOCK_PROMPT_VERSION, BLOCK_MODEL, state.best_summary, state.best_score, state.translated)
+    else:
+        # Meilleur essai gardé pour ce job, mais pas mis en cache : il sera retenté au prochain passage
+        logger.warning(f"Bloc {state.idx + 1}: Pas de résumé structuré et/ou au-dessus du seuil, mais on garde le meilleur essai (score={state.best_score:.3f})")
+
+    logger.info(f"\n✅ Bloc {state.idx + 1} retenu : score={state.best_score:.3f}")
+    return state.best_summary, state.best_score, state.translated
+
+# ---------- Écriture des blocs (embeddings par lot) ----------
+def save_block_batch(job: Job, json_dir: str, pending_blocks, checkpoint: JobCheckpoint):
+    """
+    Encode les résumés d'un micro-lot en une seule passe puis écrit chaque
+    bloc_XX.json une seule fois, vecteur compris, avant de le checkpointer.
+    """
+    if not pending_blocks:
+        return
+
+    start = time.time()
+    embeddings = embedding_model.encode(
+        [summary for _, _, summary, _, _ in pending_blocks],
+        batch_size=EMBEDDING_BATCH_SIZE
+    )
+    logger.info(f"🧮 Embeddings : {len(pending_blocks)} blocs encodés en {time.time() - start:.2f}s")
+
+    for (idx, pages, best_summary, best_score, translated), embedding in zip(pending_blocks, embeddings):
+        save_json(json_dir, idx, {
+            "bloc": idx + 1,
+            "pages": [p + 1 for p in pages],
+            "summary": best_summary,
+            "source_pdf": job.pdf_url,
+            "pdf_filename": os.path.basename(job.pdf_path),
+            "score": best_score,
+            "translated": translated,
+            "embedding": embedding.tolist()
+        })
+        checkpoint.mark_block_done(idx)
+
+# ---------- Étape blocs : génération parallèle, scoring par lots ----------
+def summarize_blocks(job: Job, blocks, json_dir: str, checkpoint: JobCheckpoint, progress: JobProgress,
+                     max_inflight: int = None, candidates: int = None):
+    """
+    Résume les blocs : au plus `max_inflight` candidats générés en parallèle (dont `candidates`
+    par bloc), scorés par lots de BLOCK_SCORE_BATCH_SIZE en une passe (evaluate_summary_scores)
+    pendant que les suivants se génèrent. Un bloc est retenu au premier candidat structuré et
+    au-dessus du seuil (ses autres essais sont abandonnés) ; après MAX_ATTEMPTS, le meilleur.
+    Les bloc_XX.json sont écrits dans l'ordre. Retourne [(numéro de bloc, résumé)].
+    """
+    inflight = max(1, min(max_inflight or BLOCK_MAX_INFLIGHT, len(blocks) or 1))
+    candidates = max(1, min(candidates or BLOCK_CANDIDATES, MAX_ATTEMPTS))
+
+    # Étape blocs déjà close : les blocs sans résumé restent ignorés pour ne pas décaler les fusions
+    blocks_stage_done = checkpoint.is_stage_done(STAGE_BLOCKS)
+    states = {
+        idx: BlockAttempts(idx, block)
+        for idx, block in enumerate(blocks)
+        if not blocks_stage_done and not (checkpoint.is_block_done(idx) and load_json(json_dir, idx))
+    }
+    progress.start_blocks(len(blocks), already_done=len(blocks) - len(states))
+    logger.info(f"🧵 Résumé des blocs : {len(states)}/{len(blocks)} blocs à calculer, {inflight} candidats en parallèle")
 
+    results = {}  # idx -> (résumé, score, traduit) ou None, en attente d'écriture dans l'ordre
     summaries = []
+    pending_blocks = []
+    next_idx = 0
+
+    def write_ready():
+        """Écrit les blocs terminés dans l'ordre, embeddings par micro-lots."""
+        nonlocal next_idx, pending_blocks
+        while next_idx < len(blocks) and (next_idx not in states or next_idx in results):
+            idx = next_idx
+            next_idx += 1
+            if idx not in states:
+                done_block = load_json(json_dir, idx)
+                if done_block:
+                    summaries.append((idx + 1, done_block["summary"]))
+                continue
+            result = results.pop(idx)
+            if result is None:
+                continue
+            best_summary, best_score, translated = result
+            summaries.append((idx + 1, best_summary))
+            pending_blocks.append((idx, blocks[idx].pages, best_summary, best_score, translated))
+            if len(pending_blocks) >= EMBEDDING_BATCH_SIZE:
+                save_block_batch(job, json_dir, pending_blocks, checkpoint)
+                pending_blocks = []
+
+    def settle(state: BlockAttempts):
+        """Relance des essais si besoin, ou clôt le bloc (accepté ou essais épuisés)."""
+        if state.finalized:
+            return
+        if state.accepted or state.exhausted:
+            results[state.idx] = finalize_block(state)
+            progress.block_done()
+            return
+        while state.outstanding < candidates and state.started < MAX_ATTEMPTS:
+            state.started += 1
+            state.outstanding += 1
+            heapq.heappush(queue, (state.idx, state.started))  # blocs les plus anciens d'abord
+
+    queue = []  # (idx, essai) à lancer
+    running = {}  # future -> (idx, essai)
+    to_score = []  # (idx, essai, résumé, traduit)
+
+    def score_pending():
+        """Score en une passe les candidats en attente ; retourne les blocs concernés."""
+        nonlocal to_score
+        batch, to_score = to_score, []
+        live = [c for c in batch if not states[c[0]].accepted]  # bloc accepté entre-temps : inutile
+        scores = evaluate_summary_scores([(states[idx].text, summary, None) for idx, _, summary, _ in live])
+        if len(live) > 1:
+            logger.info(f"🧮 Scoring groupé : {len(live)} candidats en une passe")
+        for (idx, attempt, summary, translated), score in zip(live, scores):
+            if not states[idx].accepted:
+                states[idx].consider(summary, score, translated, attempt)
+        for idx, _, _, _ in batch:
+            states[idx].outstanding -= 1
+        return {idx for idx, _, _, _ in batch}
+
+    executor = ThreadPoolExecutor(max_workers=inflight, thread_name_prefix=f"bloc-{job.job_id[:8]}")
+    try:
+        for idx, state in states.items():
+            # ♻️ Cache adressé par contenu : même texte + même prompt + même modèle → pas d'appel LLM
+            cached = get_cached_summary(state.text, BLOCK_PROMPT_VERSION, BLOCK_MODEL)
+            if cached:
+                logger.info(f"♻️ Bloc {idx+1} : résumé récupéré depuis le cache (score={cached['score']:.3f})")
+                state.finalized = True
+                results[idx] = (cached["summary"], cached["score"], cached["translated"])
+                progress.block_done(computed=False)
+            else:
+                logger.info(f"📊 Bloc {idx+1} — pages {state.block.pages[0] + 1}-{state.block.pages[-1] + 1}, {len(state.text)} caractères (~{state.block.tokens} tokens)")
+                settle(state)
+        write_ready()
+
+        while queue or running or to_score:
+            while queue and len(running) < inflight:
+                idx, attempt = heapq.heappop(queue)
+                state = states[idx]
+                if state.accepted:
+                    state.outstanding -= 1  # essai devenu inutile
+                    continue
+                running[executor.submit(generate_block_candidate, state.text, state.stop_event, job.entreprise)] = (idx, attempt)
+
+            # Les LLM restent occupés : on ne score que par lots pleins, sauf en fin d'étape
+            if to_score and (len(to_score) >= BLOCK_SCORE_BATCH_SIZE or not queue or not running):
+                touched = score_pending()
+            else:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                touched = set()
+                for future in done:
+                    idx, attempt = running.pop(future)
+                    result = future.result()
+                    if result is None or states[idx].accepted:
+                        states[idx].outstanding -= 1
+                        touched.add(idx)
+                    else:
+                        summary, translated = result
+                        to_score.append((idx, attempt, summary, translated))
+
+            for idx in sorted(touched):
+                settle(states[idx])
+            write_ready()
+    except BaseException:
+        # ⛔ Ollama injoignable, échec du scoring, arrêt du worker... : on abandonne les essais en
+        # attente (sans attendre les appels LLM en cours) et on garde les blocs déjà terminés
+        for state in states.values():
+            state.stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        if to_score:
+            try:
+                # Candidats déjà générés : scorés pour garder les blocs qu'ils valident
+                for idx in score_pending():
+                    if states[idx].accepted and not states[idx].finalized:
+                        results[idx] = finalize_block(states[idx])
+            except Exception as e:
+                logger.error(f"Candidats générés non scorés : {e}")
+        finished = [
+            (idx, blocks[idx].pages, *result) for idx, result in sorted(results.items()) if result is not None
+        ]
+        try:
+            save_block_batch(job, json_dir, pending_blocks + finished, checkpoint)
+        except Exception as e:
+            logger.error(f"Blocs déjà résumés non enregistrés : {e}")
+        raise
+
+    executor.shutdown(wait=True)
+    save_block_batch(job, json_dir, pending_blocks, checkpoint)
+    return summaries
+
+# ---------- Arbre de fusion hiérarchique ----------
+def merge_group(job: Job, level: int, group_idx: int, group):
+    logger.info(f"\n🔄 Fusion niveau {level} lot {group_idx + 1} ({len(group)} résumés)")
+
+    intermediate_summary = summarize_global(group, is_final=False, tenant=job.entreprise)
+    processed_summary, translated = process_text_block(intermediate_summary)
+
+    # Niveau 1 : emplacement historique ; niveaux suivants dans niveau_XX/
+    inter_json_dir = f"cache_json/save_summaryintermediates/Entreprise_{job.entreprise}/{job.folder_name}"
+    if level > 1:
+        inter_json_dir = os.path.join(inter_json_dir, f"niveau_{level:02d}")
+    os.makedirs(inter_json_dir, exist_ok=True)
+    save_json(inter_json_dir, group_idx, {
+        "intermediate_block": group_idx + 1,
+        "level": level,
+        "summary": processed_summary
+    })
+    return processed_summary
+
+def plan_merge_groups(summaries, max_tokens: int, max_size: int = INTERMEDIATE_GROUP_SIZE):
+    """
+    Lots d'un niveau de fusion. Si le budget ne permet aucun regroupement (résumés trop
+    longs), on fusionne par paires pour que chaque niveau réduise le nombre de résumés.
+    """
+    groups = group_by_token_budget(summaries, max_tokens, max_size)
+    if len(summaries) > 1 and len(groups) == len(summaries):
+        logger.warning(f"⚠️ Résumés plus longs que le budget de fusion ({max_tokens} tokens) : fusion par paires")
+        groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+    return groups
+
+def reduce_summaries(job: Job, summaries, checkpoint: JobCheckpoint, progress: JobProgress, max_inflight: int = None):
+    """
+    Réduction en arbre : tant que l'ensemble dépasse le budget de la fusion finale
+    (fenêtre - prompt - génération), on ajoute un niveau qui fusionne en parallèle des lots
+    d'au plus INTERMEDIATE_GROUP_SIZE résumés tenant dans la fenêtre de la fusion intermédiaire.
+    Un document qui tient déjà dans le budget final n'a aucun niveau intermédiaire.
+    Chaque niveau est persisté et checkpointé.
+    """
+    inflight = max(1, max_inflight or REDUCE_MAX_INFLIGHT)
+    group_budget = get_merge_token_budget(is_final=False)
+    final_budget = get_merge_token_budget(is_final=True)
+    current = summaries
+    level = 1
+
+    while len(current) > 1:
+        total_tokens = estimate_tokens(MERGE_SEPARATOR.join(current))
+        logger.info(f"🌳 Fusion : {len(current)} résumés, ~{total_tokens} tokens (budget final {final_budget})")
+        if total_tokens <= final_budget:
+            break
+
+        groups = plan_merge_groups(current, group_budget)
+        progress.set_stage(PROGRESS_INTERMEDIATES, total=len(groups), level=level)
+        merged = [checkpoint.get_intermediate(group_idx, level=level) for group_idx in range(len(groups))]
+
+        with ThreadPoolExecutor(max_workers=min(inflight, len(groups) or 1), thread_name_prefix=f"fusion-{level}") as executor:
+            futures = {
+                group_idx: executor.submit(merge_group, job, level, group_idx, group)
+                for group_idx, group in enumerate(groups)
+                if merged[group_idx] is None
+            }
+            for _ in range(len(groups) - len(futures)):
+                progress.step_done()
+
+            # Résultats consommés dans l'ordre des lots → ordre déterministe pour le niveau suivant
+            for group_idx in sorted(futures):
+                merged[group_idx] = futures[group_idx].result()
+                checkpoint.set_intermediate(group_idx, merged[group_idx], level=level)
+                progress.step_done()
+
+        current = merged
+        level += 1
+
+    return current
+
+# ---------- Enrichissement concurrent ----------
+def enrich_summary(job: Job, final_summary: str, full_pdf_text: str, intermediates):
+    """
+    Étape d'enrichissement du résumé final : score global, embedding et extraction
+    mots-clés/thèmes (un seul appel LLM JSON) lancés en parallèle.
+    Retourne (score_global, embedding, mots_cles, themes).
+    """
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=ENRICHMENT_MAX_INFLIGHT, thread_name_prefix="enrich") as executor:
+        keywords_future = executor.submit(extract_keywords_themes, final_summary, job.entreprise)
+        embedding_future = executor.submit(embedding_model.encode, final_summary)
+        score_future = executor.submit(evaluate_summary_score, full_pdf_text, final_summary, partial_summaries=intermediates)
+
+        mots_cles, themes = keywords_future.result()  # LLMUnavailableError → retry de l'étape métadonnées
+        summary_embedding = embedding_future.result().tolist()
+        global_score = score_future.result()
+
+    logger.info(f"🏷️ Enrichissement en {time.time() - start:.2f}s : {len(mots_cles)} mots-clés, {len(themes)} thèmes")
+    return global_score, summary_embedding, mots_cles, themes
 
-    for idx, block_indexes in enumerate(blocks):
-        logger.info(f"\n⏳ Bloc {idx + 1} en cours...")
-
-        text = extract_text_from_block(block_indexes, job.pdf_path)
-        if not text.strip():
-            text = "(Bloc vide ou inexploitable.)"
+# ---------- Pipeline complet ----------
+def process_job(job: Job, max_inflight: int = None):
+    start_total = time.time()
 
-        logger.info(f"📊 Bloc {idx+1} — Longueur brute : {len(text.strip())} caractères")
+    logger.info(f"\n🚀 Démarrage traitement job {job.job_id} (priorité : {job.priority})")
 
-        if len(text) > 8000:
-            logger.info(f"✂️ Bloc {idx+1} pré-tronqué à 8000 avant IA")
-            text = text[:8000]
+    # 💾 Checkpoint durable : un retry Celery reprend à la dernière unité terminée
+    checkpoint = JobCheckpoint(job.entreprise, job.job_id)
+    if checkpoint.resumed:
+        logger.info(
+            f"🔁 Reprise du job {job.job_id} (tentative {checkpoint.data['attempts']}) : "
+            f"{len(checkpoint.data['blocks_done'])} blocs, {len(checkpoint.data['intermediates'])} intermédiaires déjà faits"
+        )
 
-        best_score = 0
-        best_summary = ""
-        translated = False
+    # 📡 Progression publiée pour le suivi client (SSE)
+    progress = JobProgress(job.job_id, job.entreprise)
 
-        for attempt in range(1, MAX_ATTEMPTS + 1):
-            summary = summarize_block(text)
-            processed_summary, translated = process_text_block(summary)
-            score = evaluate_summary_score(text, processed_summary)
+    # ✅ Une seule passe PDFMiner : les pages servent au texte complet ET aux blocs
+    start_extract = time.time()
+    pages_text = extract_pages_text(job.pdf_path) or extract_pages_text_pymupdf(job.pdf_path)  # repli PyMuPDF
+    full_pdf_text = extract_full_text(job.pdf_path, pages_text=pages_text)
+    logger.info(f"📄 Extraction full text : {len(full_pdf_text)} caractères extraits ({len(pages_text)} pages en {time.time() - start_extract:.2f}s)")
 
-            # 👇 On n'accepte que structuré ET score >= threshold
-            if is_summary_valid(processed_summary) and score >= BLOCK_THRESHOLD_INITIAL:
-                logger.info(f"✅ Résumé structuré et au-dessus du seuil trouvé à l'essai {attempt} (score={score:.3f})")
-                best_score = score
-                best_summary = processed_summary
-                break  # satisfait, on arrête la boucle
-            else:
-                if score > best_score:
-                    best_score = score
-                    best_summary = processed_summary
-                logger.warning(f"Résumé rejeté (non structuré ou score trop bas) essai {attempt} (score={score:.3f})")
+    full_text_path = f"temp_cache/{job.folder_name}_full_text.txt"
+    save_txt(full_text_path, full_pdf_text)
 
-        if not best_summary.strip():
-            logger.error(f"Bloc {idx+1} ignoré : aucun résumé généré.")
-            continue
+    # 🧩 Blocs remplis jusqu'au budget de tokens du modèle, sans couper de phrase
+    token_budget = get_block_token_budget(BLOCK_MODEL)
+    blocks = chunk_pages_by_tokens(pages_text, token_budget)
+    total_pages = len(pages_text)
+    logger.info(f"🧩 Découpage par budget ({token_budget} tokens/bloc) | {total_pages} pages → {len(blocks)} blocs")
 
-        if not (is_summary_valid(best_summary) and best_score >= BLOCK_THRESHOLD_INITIAL):
-            logger.warning(f"Bloc {idx+1}: Pas de résumé structuré et/ou au-dessus du seuil, mais on garde le meilleur essai (score={best_score:.3f})")
+    json_dir = f"cache_json/save_summaryblocks/{job.entreprise}/{job.job_id}"
 
-        logger.info(f"\n✅ Bloc {idx+1} retenu : score={best_score:.3f}")
+    # Fan-out borné : candidats générés en parallèle, scorés par lots, résultats
+    # réassemblés dans l'ordre des blocs → bloc_XX.json écrits dans l'ordre.
+    summaries = summarize_blocks(job, blocks, json_dir, checkpoint, progress, max_inflight=max_inflight)
 
-        embedding = embedding_model.encode(best_summary).tolist()
+    checkpoint.mark_stage_done(STAGE_BLOCKS)
 
-        json_dir = f"cache_json/save_summaryblocks/{job.entreprise}/{job.job_id}"
-        save_json(json_dir, idx, {
-            "bloc": idx + 1,
-            "summary": best_summary,
-            "source_pdf": job.pdf_url,
-            "pdf_filename": os.path.basename(job.pdf_path),
-            "score": best_score,
-            "translated": translated,
-            "embedding": embedding
-        })
+    # 🗄️ Magasin de blocs (matrice d'embeddings + table) prêt avant la première question
+    try:
+        build_block_store(job.entreprise, job.job_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Magasin de blocs non construit (sera construit au premier ask) : {e}")
 
-        summaries.append((idx + 1, best_summary))
+    cache_stats = get_cache_stats()
+    logger.info(f"♻️ Cache résumés (cumul worker) : {cache_stats['hits']} hits / {cache_stats['misses']} misses (hit rate={cache_stats['hit_rate']:.0%})")
 
     summaries.sort()
     joined = [s for _, s in summaries]
 
-    intermediates = []
-    for i in range(0, len(joined), INTERMEDIATE_GROUP_SIZE):
-        group = joined[i:i+INTERMEDIATE_GROUP_SIZE]
-        logger.info(f"\n🔄 Fusion intermédiaire lot {i//INTERMEDIATE_GROUP_SIZE + 1} ({len(group)} résumés)")
-
-        intermediate_summary = summarize_global(group, is_final=False)
-        processed_summary, translated = process_text_block(intermediate_summary)
-
-        inter_json_dir = f"cache_json/save_summaryintermediates/Entreprise_{job.entreprise}/{job.folder_name}"
-        os.makedirs(inter_json_dir, exist_ok=True)
-        save_json(inter_json_dir, i//INTERMEDIATE_GROUP_SIZE, {
-            "intermediate_block": i//INTERMEDIATE_GROUP_SIZE + 1,
-            "summary": processed_summary
-        })
-
-        intermediates.append(processed_summary)
-
-    logger.info(f"\n🔍 Fusion finale sur {len(intermediates)} intermédiaires...")
+    intermediates = reduce_summaries(job, joined, checkpoint, progress)
 
-    final_summary_raw = summarize_global(intermediates, is_final=True)
+    checkpoint.mark_stage_done(STAGE_INTERMEDIATES)
+    progress.set_stage(PROGRESS_FINAL)
 
-    # ✅ Traduction automatique vers FR si besoin
-    final_summary, translated = process_text_block(final_summary_raw)
-    if translated:
-        logger.info("🌐 Résumé final traduit automatiquement en français.")
+    if checkpoint.final_summary is not None:
+        logger.info("🔁 Résumé final repris depuis le checkpoint.")
+        final_summary = checkpoint.final_summary
+    else:
+        logger.info(f"\n🔍 Fusion finale sur {len(intermediates)} intermédiaires...")
 
-    global_score = evaluate_summary_score(full_pdf_text, final_summary, partial_summaries=intermediates)
-    logger.info(f"📊 Score global (info only) = {global_score:.3f}")
+        final_summary_raw = summarize_global(intermediates, is_final=True, tenant=job.entreprise)
 
+        # ✅ Traduction automatique vers FR si besoin
+        final_summary, translated = process_text_block(final_summary_raw)
+        if translated:
+            logger.info("🌐 Résumé final traduit automatiquement en français.")
+        checkpoint.set_final_summary(final_summary)
 
-    save_global_summary(job.entreprise, job.folder_name, final_summary, job_id=job.job_id)
-    log_job_history(job.job_id, job.entreprise, job.pdf_url, "terminé", "mistral", start_total)
+    if not checkpoint.is_stage_done(STAGE_FINAL):
+        save_global_summary(job.entreprise, job.folder_name, final_summary, job_id=job.job_id)
+        log_job_history(job.job_id, job.entreprise, job.pdf_url, "terminé", get_merge_model(is_final=True), start_total)
+        checkpoint.mark_stage_done(STAGE_FINAL)
 
     logger.info(f"\n✅ Traitement finalisé pour job {job.job_id}")
 
-    # Génération de l'embedding du résumé global
-    summary_embedding = embedding_model.encode(final_summary).tolist()
+    if checkpoint.is_stage_done(STAGE_METADATA):
+        logger.info("🔁 Métadonnées déjà enregistrées (checkpoint).")
+        progress.finish()
+        return {
+            "summary": final_summary,
+            "mode": "hierarchical_v5"
+        }
 
-    # Génération automatique des mots-clés et thèmes via LLM
-    try:
-        mots_cles_raw = call_llm(f"Donne 5 mots-clés importants pour ce document:\n{final_summary}")
-        themes_raw = call_llm(f"Quels sont les grands thèmes abordés dans ce document ?\n{final_summary}")
+    progress.set_stage(PROGRESS_ENRICHMENT)
 
-        mots_cles = [w.strip() for w in mots_cles_raw.split(",")]
-        themes = [t.strip() for t in themes_raw.split(",")]
-    except Exception as e:
-        logger.warning(f"⚠️ Erreur extraction mots-clés/themes : {e}")
-        mots_cles = []
-        themes = []
+    # ⚡ Score global, embedding et mots-clés/thèmes sont indépendants : menés en parallèle
+    global_score, summary_embedding, mots_cles, themes = enrich_summary(job, final_summary, full_pdf_text, intermediates)
+    logger.info(f"📊 Score global (info only) = {global_score:.3f}")
 
     # Construction des métadonnées à insérer
     metadata = {
@@ -203,10 +535,12 @@ def process_job(job: Job):
     # Insertion dans la base SQLite
     try:
         insert_metadata(metadata)
+        checkpoint.mark_stage_done(STAGE_METADATA)
         logger.info(f"✅ Métadonnées enregistrées dans la base pour {metadata['filename']}")
     except Exception as e:
         logger.error(f"❌ Erreur lors de l'insertion des métadonnées : {e}")
 
+    progress.finish()
     return {
         "summary": final_summary,
         "mode": "hierarchical_v5"
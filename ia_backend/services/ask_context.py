@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# Contexte d'une requête ask : chaque modèle d'embedding n'encode la question qu'une fois
+# (classification, recherche précise, recherche générale réutilisent le même vecteur),
+# et chaque étape (classification, recherche, re-rank, génération) est chronométrée.
+
+
+class AskContext:
+    def __init__(self, question: str, entreprise: Optional[str] = None, job_id: Optional[str] = None):
+        self.question = question
+        self.entreprise = entreprise
+        self.job_id = job_id
+        self.started_at = time.time()
+        self.timings: Dict[str, float] = {}
+        self.encodes = 0
+        self._embeddings: Dict[Tuple[str, str], np.ndarray] = {}
+
+    def embedding(self, model_name: str, encode_fn: Callable, text: Optional[str] = None,
+                  normalize: bool = False) -> np.ndarray:
+        """
+        Embedding float32 de `text` (la question par défaut) pour `model_name`, calculé au plus
+        une fois par requête. La version normalisée est dérivée du vecteur en cache.
+        """
+        text = self.question if text is None else text
+        key = (model_name, text)
+        emb = self._embeddings.get(key)
+        if emb is None:
+            with self.stage(f"encode:{model_name}"):
+                emb = np.asarray(encode_fn(text), dtype=np.float32)
+            self._embeddings[key] = emb
+            self.encodes += 1
+        if normalize:
+            norm = np.linalg.norm(emb)
+            return emb / norm if norm else emb
+        return emb
+
+    @contextmanager
+    def stage(self, name: str):
+        """Chronomètre une étape ; une étape répétée cumule ses durées."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.time() - start
+
+    def summary(self) -> dict:
+        return {
+            "total_s": round(time.time() - self.started_at, 4),
+            "stages_s": {name: round(seconds, 4) for name, seconds in self.timings.items()},
+            "encodes": self.encodes,
+        }
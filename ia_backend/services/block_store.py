@@ -0,0 +1,268 @@
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+# Magasin de blocs résident par job : matrice float32 contiguë des embeddings (memmap .npy)
+# + table de métadonnées compacte, construits une fois à partir des bloc_XX.json :
+# cache_json/block_store/<entreprise>/<job_id>/{embeddings.npy, blocks.json}
+# En mémoire : LRU de magasins par (entreprise, job_id), invalidé par la signature
+# (nom, taille, mtime) des fichiers de blocs quand le job les réécrit.
+# Chaque magasin porte aussi un index FAISS (produit scalaire sur vecteurs normalisés = cosinus)
+# construit à la première recherche : une seule recherche top-k sur tous les blocs du job.
+
+logger = logging.getLogger(__name__)
+
+BLOCKS_ROOT = os.path.join("cache_json", "save_summaryblocks")
+STORE_ROOT = os.path.join("cache_json", "block_store")
+EMBEDDING_DIM = 384
+BLOCK_STORE_MAX_JOBS = 32       # magasins gardés en mémoire (LRU)
+SIGNATURE_CHECK_INTERVAL = 2.0  # secondes entre deux vérifications des fichiers d'un job
+
+BLOCK_FILE = re.compile(r"^bloc_(\d+)\.json$")
+
+
+def get_blocks_dir(entreprise: str, job_id: str) -> str:
+    return os.path.join(BLOCKS_ROOT, entreprise, job_id)
+
+def get_store_dir(entreprise: str, job_id: str) -> str:
+    return os.path.join(STORE_ROOT, entreprise, job_id)
+
+def _block_files(blocks_dir: str) -> List[os.DirEntry]:
+    entries = [e for e in os.scandir(blocks_dir) if e.is_file() and BLOCK_FILE.match(e.name)]
+    entries.sort(key=lambda e: int(BLOCK_FILE.match(e.name).group(1)))
+    return entries
+
+def compute_signature(blocks_dir: str) -> str:
+    """Empreinte des fichiers de blocs (sans les lire) : change dès qu'un bloc est écrit."""
+    digest = hashlib.sha256()
+    for entry in _block_files(blocks_dir):
+        stat = entry.stat()
+        digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class BlockStore:
+    """Blocs d'un job : `embeddings[i]` correspond à `blocks[i]` (métadonnées sans embedding)."""
+
+    def __init__(self, entreprise: str, job_id: str, signature: str, embeddings: np.ndarray, blocks: List[Dict]):
+        self.entreprise = entreprise
+        self.job_id = job_id
+        self.signature = signature
+        self.embeddings = embeddings
+        self.blocks = blocks
+        self.checked_at = time.time()
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def rows_for_pdf(self, pdf_filename: str) -> List[int]:
+        return [i for i, block in enumerate(self.blocks) if block.get("pdf_filename") == pdf_filename]
+
+    @property
+    def index(self) -> faiss.IndexFlatIP:
+        """Index bloc par bloc (id FAISS = ligne du magasin), construit une fois par magasin."""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    vectors = np.array(self.embeddings, dtype=np.float32)  # copie : le memmap est en lecture seule
+                    faiss.normalize_L2(vectors)
+                    index = faiss.IndexFlatIP(EMBEDDING_DIM)
+                    index.add(vectors)
+                    self._index = index
+        return self._index
+
+    def search(self, query_emb, top_k: int, pdf_filename: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (ligne, similarité cosinus) sur tous les blocs du job, ou seulement
+        sur ceux de `pdf_filename`. Les blocs sans pdf_filename (jobs antérieurs, un seul PDF)
+        restent candidats si aucun bloc ne porte ce nom.
+        """
+        if not len(self):
+            return []
+        params = None
+        candidates = len(self)
+        if pdf_filename:
+            rows = self.rows_for_pdf(pdf_filename) or self.rows_for_pdf(None)
+            if not rows:
+                return []
+            candidates = len(rows)
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.asarray(rows, dtype=np.int64)))
+
+        query = np.array(query_emb, dtype=np.float32).reshape(1, EMBEDDING_DIM)
+        faiss.normalize_L2(query)
+        k = min(top_k, candidates)
+        scores, ids = self.index.search(query, k, params=params)
+        return [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i != -1]
+
+
+def _parse_blocks(blocks_dir: str) -> Tuple[np.ndarray, List[Dict]]:
+    """Lecture unique des bloc_XX.json : embeddings valides empilés, métadonnées à part."""
+    vectors = []
+    blocks = []
+    skipped = 0
+    for entry in _block_files(blocks_dir):
+        try:
+            with open(entry.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            emb = data.get("embedding")
+            if isinstance(emb, str):
+                emb = json.loads(emb)
+            if not isinstance(emb, list) or len(emb) != EMBEDDING_DIM:
+                logger.warning(f"{entry.name} - embedding manquant ou invalide, bloc ignoré")
+                skipped += 1
+                continue
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Bloc illisible {entry.name} : {e}")
+            skipped += 1
+            continue
+
+        vectors.append(emb)
+        blocks.append({
+            "source": entry.name,
+            "bloc": data.get("bloc"),
+            "summary": data.get("summary", ""),
+            "score": data.get("score", 0),
+            "translated": data.get("translated", False),
+            "pdf_filename": data.get("pdf_filename"),
+            "pages": data.get("pages", []),
+        })
+
+    embeddings = np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    if skipped:
+        logger.info(f"{skipped} fichiers de blocs ignorés dans {blocks_dir}")
+    return embeddings, blocks
+
+def _replace_atomically(path: str, write):
+    """
+    `write(fichier binaire)` dans un temporaire unique du même dossier, puis renommage :
+    deux process qui reconstruisent le même magasin n'écrivent jamais dans le même fichier.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=f"-{os.path.basename(path)}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _write_store(store_dir: str, signature: str, embeddings: np.ndarray, blocks: List[Dict]):
+    """Écriture atomique : embeddings d'abord, puis la table (qui porte la signature)."""
+    os.makedirs(store_dir, exist_ok=True)
+    table = json.dumps({"signature": signature, "count": len(blocks), "blocks": blocks}, ensure_ascii=False)
+    _replace_atomically(os.path.join(store_dir, "embeddings.npy"), lambda f: np.save(f, embeddings))
+    _replace_atomically(os.path.join(store_dir, "blocks.json"), lambda f: f.write(table.encode("utf-8")))
+
+def _read_store(store_dir: str, signature: str) -> Optional[Tuple[np.ndarray, List[Dict]]]:
+    meta_path = os.path.join(store_dir, "blocks.json")
+    emb_path = os.path.join(store_dir, "embeddings.npy")
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+        if table.get("signature") != signature:
+            return None
+        if not table["count"]:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32), []
+        embeddings = np.load(emb_path, mmap_mode="r")
+    except (OSError, ValueError, json.JSONDecodeError):
+        return None
+    if embeddings.shape != (table["count"], EMBEDDING_DIM):
+        return None
+    return embeddings, table["blocks"]
+
+def build_block_store(entreprise: str, job_id: str, signature: Optional[str] = None) -> BlockStore:
+    """Construit (ou recharge depuis le disque si à jour) le magasin d'un job."""
+    blocks_dir = get_blocks_dir(entreprise, job_id)
+    if not os.path.isdir(blocks_dir):
+        raise FileNotFoundError(f"Dossier introuvable : {blocks_dir}")
+
+    signature = signature or compute_signature(blocks_dir)
+    store_dir = get_store_dir(entreprise, job_id)
+    loaded = _read_store(store_dir, signature)
+    if loaded is None:
+        start = time.time()
+        embeddings, blocks = _parse_blocks(blocks_dir)
+        try:
+            _write_store(store_dir, signature, embeddings, blocks)
+            loaded = _read_store(store_dir, signature) or (embeddings, blocks)
+        except OSError as e:
+            logger.warning(f"Magasin de blocs non persisté pour {job_id} : {e}")
+            loaded = (embeddings, blocks)
+        logger.info(f"🗄️ Magasin de blocs construit pour {job_id} : {len(blocks)} blocs en {time.time() - start:.2f}s")
+
+    embeddings, blocks = loaded
+    return BlockStore(entreprise, job_id, signature, embeddings, blocks)
+
+
+class BlockStoreCache:
+    """LRU en mémoire des magasins de blocs, revalidés au plus toutes les SIGNATURE_CHECK_INTERVAL s."""
+
+    def __init__(self, max_jobs: int = BLOCK_STORE_MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "loads": 0, "invalidations": 0}
+
+    def get(self, entreprise: str, job_id: str) -> BlockStore:
+        key = (entreprise, job_id)
+        with self._lock:
+            store = self._stores.get(key)
+            if store is not None:
+                self._stores.move_to_end(key)
+
+        if store is not None:
+            if time.time() - store.checked_at < SIGNATURE_CHECK_INTERVAL:
+                self._stats["hits"] += 1
+                return store
+            blocks_dir = get_blocks_dir(entreprise, job_id)
+            if not os.path.isdir(blocks_dir):
+                self.invalidate(entreprise, job_id)
+                raise FileNotFoundError(f"Dossier introuvable : {blocks_dir}")
+            signature = compute_signature(blocks_dir)
+            if signature == store.signature:
+                store.checked_at = time.time()
+                self._stats["hits"] += 1
+                return store
+            self._stats["invalidations"] += 1
+            logger.info(f"♻️ Blocs du job {job_id} modifiés : magasin rechargé")
+            store = build_block_store(entreprise, job_id, signature)
+        else:
+            store = build_block_store(entreprise, job_id)
+
+        with self._lock:
+            self._stats["loads"] += 1
+            self._stores[key] = store
+            self._stores.move_to_end(key)
+            while len(self._stores) > self.max_jobs:
+                self._stores.popitem(last=False)
+        return store
+
+    def invalidate(self, entreprise: str, job_id: str):
+        with self._lock:
+            self._stores.pop((entreprise, job_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, jobs=len(self._stores))
+
+
+# Cache partagé du process (web)
+block_stores = BlockStoreCache()
+
+def get_block_store(entreprise: str, job_id: str) -> BlockStore:
+    return block_stores.get(entreprise, job_id)
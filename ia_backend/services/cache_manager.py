@@ -7,6 +7,14 @@ def save_json(folder_path, bloc_index, data):
     with open(os.path.join(folder_path, filename), "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
+def load_json(folder_path, bloc_index):
+    path = os.path.join(folder_path, f"bloc_{bloc_index+1:02d}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
 def load_all_json(folder_path):
     summaries = []
     for f in sorted(os.listdir(folder_path)):
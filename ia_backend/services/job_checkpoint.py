@@ -0,0 +1,90 @@
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Optional
+
+# Checkpoint durable d'un job, par étape (blocs, intermédiaires, final, métadonnées) :
+# cache_json/checkpoints/<entreprise>/<job_id>.json
+# Un retry Celery (même job_id) reprend à la dernière unité terminée.
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.path.join("cache_json", "checkpoints")
+
+STAGE_BLOCKS = "blocks"
+STAGE_INTERMEDIATES = "intermediates"
+STAGE_FINAL = "final"
+STAGE_METADATA = "metadata"
+
+def get_checkpoint_path(entreprise, job_id):
+    return os.path.join(CHECKPOINT_DIR, entreprise, f"{job_id}.json")
+
+class JobCheckpoint:
+    def __init__(self, entreprise, job_id):
+        self.path = get_checkpoint_path(entreprise, job_id)
+        self.data = self._load() or {
+            "job_id": job_id,
+            "entreprise": entreprise,
+            "stages": {},
+            "blocks_done": [],
+            "intermediates": {},
+            "final_summary": None,
+            "attempts": 0,
+        }
+        self.resumed = self.data["attempts"] > 0
+        self.data["attempts"] += 1
+        self.save()
+
+    def _load(self) -> Optional[dict]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Checkpoint illisible {self.path}, reprise depuis zéro : {e}")
+            return None
+
+    def save(self):
+        """Écriture atomique (fichier temporaire + rename) pour survivre à un crash worker."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.data["updated_at"] = datetime.utcnow().isoformat()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    # --- Étapes ---
+    def is_stage_done(self, stage) -> bool:
+        return self.data["stages"].get(stage) == "terminé"
+
+    def mark_stage_done(self, stage):
+        self.data["stages"][stage] = "terminé"
+        self.save()
+
+    # --- Blocs ---
+    def is_block_done(self, idx) -> bool:
+        return idx in self.data["blocks_done"]
+
+    def mark_block_done(self, idx):
+        if idx not in self.data["blocks_done"]:
+            self.data["blocks_done"].append(idx)
+            self.save()
+
+    # --- Fusions intermédiaires (clé "niveau:lot") ---
+    def get_intermediate(self, idx, level=1) -> Optional[str]:
+        return self.data["intermediates"].get(f"{level}:{idx}")
+
+    def set_intermediate(self, idx, summary, level=1):
+        self.data["intermediates"][f"{level}:{idx}"] = summary
+        self.save()
+
+    # --- Résumé final ---
+    @property
+    def final_summary(self) -> Optional[str]:
+        return self.data.get("final_summary")
+
+    def set_final_summary(self, summary):
+        self.data["final_summary"] = summary
+        self.save()
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import threading
+import logging
+from datetime import datetime
+from typing import Optional
+
+# Progression structurée d'un job (étape, blocs faits/total, ETA) publiée dans
+# cache_json/progress/<job_id>.json : le worker écrit, la vue SSE relit.
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_DIR = os.path.join("cache_json", "progress")
+
+PROGRESS_QUEUED = "en_attente"
+PROGRESS_EXTRACTION = "extraction"
+PROGRESS_BLOCKS = "blocs"
+PROGRESS_INTERMEDIATES = "intermediaires"
+PROGRESS_FINAL = "final"
+PROGRESS_ENRICHMENT = "enrichissement"
+PROGRESS_DONE = "terminé"
+PROGRESS_RETRY = "retry"
+PROGRESS_FAILED = "échec"
+
+FINAL_PROGRESS_STAGES = {PROGRESS_DONE, PROGRESS_FAILED}
+
+def get_progress_path(job_id):
+    return os.path.join(PROGRESS_DIR, f"{job_id}.json")
+
+def read_progress(job_id) -> Optional[dict]:
+    try:
+        with open(get_progress_path(job_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def publish_progress(job_id, payload: dict):
+    """Écriture atomique : un lecteur SSE ne voit jamais un fichier à moitié écrit."""
+    os.makedirs(PROGRESS_DIR, exist_ok=True)
+    path = get_progress_path(job_id)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Publication progression impossible pour {job_id} : {e}")
+
+def mark_job_status(job_id, stage, error=None):
+    """Met à jour l'étape d'un job depuis l'extérieur du pipeline (tâche Celery : retry/échec)."""
+    payload = read_progress(job_id) or {"job_id": job_id}
+    payload["stage"] = stage
+    payload["updated_at"] = datetime.utcnow().isoformat()
+    if error:
+        payload["error"] = error
+    publish_progress(job_id, payload)
+
+class JobProgress:
+    """
+    Suivi de progression d'un job, appelé depuis process_job (et ses threads de blocs).
+    L'ETA est calculée à partir de la latence mesurée par bloc.
+    """
+
+    def __init__(self, job_id, entreprise):
+        self.job_id = job_id
+        self.entreprise = entreprise
+        self.started_at = time.time()
+        self.stage = PROGRESS_EXTRACTION
+        self.blocks_total = 0
+        self.blocks_done = 0
+        self.blocks_computed = 0
+        self.blocks_started_at = None
+        self.stage_done = 0
+        self.stage_total = 0
+        self.level = None
+        self._lock = threading.Lock()
+        self.publish()
+
+    def set_stage(self, stage, total=0, level=None):
+        with self._lock:
+            self.stage = stage
+            self.stage_done = 0
+            self.stage_total = total
+            self.level = level
+        self.publish()
+
+    def start_blocks(self, total, already_done=0):
+        with self._lock:
+            self.stage = PROGRESS_BLOCKS
+            self.blocks_total = total
+            self.blocks_done = already_done
+            self.blocks_started_at = time.time()
+        self.publish()
+
+    def block_done(self, computed=True):
+        with self._lock:
+            self.blocks_done += 1
+            if computed:
+                self.blocks_computed += 1
+        self.publish()
+
+    def step_done(self):
+        with self._lock:
+            self.stage_done += 1
+        self.publish()
+
+    def _eta_seconds(self):
+        if self.stage != PROGRESS_BLOCKS or not self.blocks_computed or self.blocks_started_at is None:
+            return None
+        # Latence observée « murale » (blocs en parallèle inclus) par bloc réellement calculé
+        per_block = (time.time() - self.blocks_started_at) / self.blocks_computed
+        remaining = max(self.blocks_total - self.blocks_done, 0)
+        return round(per_block * remaining, 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            per_block = None
+            if self.blocks_computed and self.blocks_started_at is not None:
+                per_block = round((time.time() - self.blocks_started_at) / self.blocks_computed, 2)
+            return {
+                "job_id": self.job_id,
+                "entreprise": self.entreprise,
+                "stage": self.stage,
+                "blocks_done": self.blocks_done,
+                "blocks_total": self.blocks_total,
+                "stage_done": self.stage_done,
+                "stage_total": self.stage_total,
+                "level": self.level,
+                "seconds_per_block": per_block,
+                "eta_seconds": self._eta_seconds(),
+                "elapsed": round(time.time() - self.started_at, 1),
+                "updated_at": datetime.utcnow().isoformat(),
+            }
+
+    def publish(self):
+        publish_progress(self.job_id, self.snapshot())
+
+    def finish(self):
+        self.set_stage(PROGRESS_DONE)
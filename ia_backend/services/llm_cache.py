@@ -0,0 +1,131 @@
+import sqlite3
+import hashlib
+import json
+import threading
+import time
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict
+
+from .sqlite_cache import connect, init_schema, evict_lru
+
+# Cache des réponses LLM pour prompts déterministes, clé = (modèle, hash du prompt, options).
+# Deux niveaux : LRU en mémoire (process) puis SQLite sur disque (partagé web/worker),
+# avec TTL et éviction par taille.
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = Path(__file__).resolve().parent.parent / "llm_response_cache.db"
+MEMORY_MAX_ENTRIES = 512
+DISK_MAX_ENTRIES = 50000
+DEFAULT_TTL = 7 * 24 * 3600  # secondes
+
+def make_cache_key(model: str, prompt: str, options: dict) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    raw = json.dumps({"model": model, "prompt": prompt_hash, "options": options}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    def __init__(self, db_path=DB_PATH, memory_max=MEMORY_MAX_ENTRIES, disk_max=DISK_MAX_ENTRIES):
+        self.db_path = db_path
+        self.memory_max = memory_max
+        self.disk_max = disk_max
+        self._memory = OrderedDict()  # key -> (valeur, expire_at)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._init_db()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _init_db(self):
+        init_schema(self.db_path, [
+            """
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                expire_at REAL,
+                last_access REAL
+            );
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_response_cache(last_access)",
+        ], "Cache LLM disque")
+
+    def _remember(self, key, value, expire_at):
+        self._memory[key] = (value, expire_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expire_at = entry
+                if expire_at >= now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT response, expire_at FROM llm_response_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] >= now:
+                    conn.execute("UPDATE llm_response_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+                    conn.commit()
+                elif row is not None:
+                    conn.execute("DELETE FROM llm_response_cache WHERE cache_key = ?", (key,))
+                    conn.commit()
+                    row = None
+        except sqlite3.Error as e:
+            logger.warning(f"Cache LLM disque indisponible (lecture) : {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, row[0], row[1])
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None):
+        if not value:
+            return
+        now = time.time()
+        expire_at = now + (ttl or DEFAULT_TTL)
+        with self._lock:
+            self._remember(key, value, expire_at)
+            self._stats["writes"] += 1
+
+        try:
+            with self._connect() as conn:
+                conn.execute("""
+                INSERT OR REPLACE INTO llm_response_cache (cache_key, response, expire_at, last_access)
+                VALUES (?, ?, ?, ?)
+                """, (key, value, expire_at, now))
+                conn.execute("DELETE FROM llm_response_cache WHERE expire_at < ?", (now,))
+                overflow = evict_lru(conn, "llm_response_cache", self.disk_max)
+                if overflow:
+                    with self._lock:
+                        self._stats["evictions"] += overflow
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache LLM disque indisponible (écriture) : {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+# Cache partagé par la passerelle
+response_cache = LLMResponseCache()
@@ -0,0 +1,249 @@
+import random
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Résilience des appels Ollama :
+# - disjoncteur par (endpoint, modèle) : après N échecs consécutifs, les appels échouent
+#   immédiatement pendant un délai, puis un seul appel « sonde » teste le retour du service
+# - timeout adaptatif : moyenne/écart lissés (EWMA) des latences observées, doublé après un timeout
+# - backoff exponentiel avec jitter entre deux tentatives
+# - LLMUnavailableError : signal d'échec rapide exploitable par les appelants (retry job, HTTP 503)
+# - LLMStreamInterrupted : flux coupé après des fragments déjà transmis (réponse tronquée)
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURE_THRESHOLD = 5    # échecs consécutifs avant ouverture
+BREAKER_OPEN_SECONDS = 30.0      # durée d'ouverture avant l'appel sonde
+BREAKER_MAX_OPEN_SECONDS = 300.0 # l'ouverture double à chaque sonde ratée, dans cette limite
+BREAKER_PROBE_TIMEOUT = 900.0    # sonde sans verdict au-delà : considérée perdue, une autre peut partir
+
+TIMEOUT_MIN_SAMPLES = 5          # observations avant de quitter le timeout par défaut
+TIMEOUT_ALPHA = 0.125            # poids de la dernière latence dans la moyenne
+TIMEOUT_BETA = 0.25              # poids du dernier écart dans l'écart moyen
+TIMEOUT_DEVIATIONS = 4           # timeout = moyenne + 4 écarts
+TIMEOUT_MULTIPLIER_FLOOR = 2.0   # ... et au moins 2x la moyenne
+TIMEOUT_MIN_SECONDS = 30.0
+TIMEOUT_MAX_BACKOFF = 8          # multiplicateur max après timeouts consécutifs (borné par le plafond)
+
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class LLMUnavailableError(RuntimeError):
+    """Aucun modèle joignable : disjoncteurs ouverts ou erreurs de transport sur tous les modèles."""
+
+    def __init__(self, models: List[str], retry_after: float = BREAKER_OPEN_SECONDS):
+        self.models = list(models)
+        self.retry_after = retry_after
+        super().__init__(f"LLM indisponible ({', '.join(self.models)}), réessayer dans {retry_after:.0f}s")
+
+
+class LLMStreamInterrupted(RuntimeError):
+    """Flux interrompu après émission : `partial` est tronqué et ne doit être ni caché ni enregistré."""
+
+    def __init__(self, model: str, partial: str, cause: Exception):
+        self.model = model
+        self.partial = partial
+        super().__init__(f"Flux {model} interrompu après {len(partial)} caractères : {cause}")
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """Backoff exponentiel « full jitter » : délai aléatoire dans [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        probe_timeout: float = BREAKER_PROBE_TIMEOUT
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_inflight = False
+        self.probe_started_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0, "abandoned": 0}
+
+    def allow(self) -> bool:
+        """True si un appel peut partir ; en demi-ouverture, un seul appel sonde à la fois."""
+        with self._lock:
+            now = time.time()
+            if self.state == STATE_OPEN and now - self.opened_at >= self.open_seconds:
+                self.state = STATE_HALF_OPEN
+                self.probe_inflight = False
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_HALF_OPEN and self.probe_inflight and now - self.probe_started_at >= self.probe_timeout:
+                logger.warning(f"⏳ Sonde du disjoncteur {self.name} sans verdict depuis {self.probe_timeout:.0f}s : remplacée")
+                self.probe_inflight = False
+            if self.state == STATE_HALF_OPEN and not self.probe_inflight:
+                self.probe_inflight = True
+                self.probe_started_at = now
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    @contextmanager
+    def call(self, is_failure: Callable[[Exception], bool]):
+        """
+        Encadre un appel autorisé par allow() : un verdict est toujours rendu, y compris si
+        l'appel est abandonné (GeneratorExit d'un flux non consommé, interruption).
+        Les exceptions pour lesquelles is_failure est faux (erreur de la requête, réponse
+        illisible) ne disent rien de la santé du service : la sonde est seulement libérée.
+        """
+        try:
+            yield
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.release_probe()
+            raise
+        except BaseException:
+            self.record_abandoned()
+            raise
+        self.record_success()
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            if self.state != STATE_CLOSED:
+                logger.info(f"🟢 Disjoncteur {self.name} refermé")
+            self.state = STATE_CLOSED
+            self.failures = 0
+            self.probe_inflight = False
+            self.open_seconds = self.base_open_seconds
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self.failures += 1
+            if self.state == STATE_HALF_OPEN:
+                self.open_seconds = min(self.open_seconds * 2, BREAKER_MAX_OPEN_SECONDS)
+                self._open()
+            elif self.state == STATE_CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def release_probe(self):
+        """Appel terminé sans verdict sur le service : une nouvelle sonde pourra partir."""
+        with self._lock:
+            self.probe_inflight = False
+
+    def record_abandoned(self):
+        """
+        Appel interrompu avant sa fin. Une sonde abandonnée compte comme ratée (le service
+        n'a pas fait ses preuves) ; en état fermé, une déconnexion client n'est pas un échec d'Ollama.
+        """
+        with self._lock:
+            self._stats["abandoned"] += 1
+            if self.state == STATE_HALF_OPEN:
+                self.failures += 1
+                self.open_seconds = min(self.open_seconds * 2, BREAKER_MAX_OPEN_SECONDS)
+                self._open()
+
+    def _open(self):
+        self.state = STATE_OPEN
+        self.opened_at = time.time()
+        self.probe_inflight = False
+        self._stats["opened"] += 1
+        logger.warning(f"🔴 Disjoncteur {self.name} ouvert pour {self.open_seconds:.0f}s ({self.failures} échecs)")
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state != STATE_OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.time() - self.opened_at))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._stats, state=self.state, consecutive_failures=self.failures, open_seconds=self.open_seconds)
+
+
+class AdaptiveTimeout:
+    """
+    Timeout de lecture par clé (modèle + budget de génération), estimé comme pour le RTO TCP :
+    moyenne lissée + TIMEOUT_DEVIATIONS écarts, borné entre TIMEOUT_MIN_SECONDS et `ceiling`.
+    """
+
+    def __init__(self, default: float, ceiling: Optional[float] = None):
+        self.default = default
+        self.ceiling = ceiling or default
+        self._lock = threading.Lock()
+        self._estimates: Dict[str, dict] = {}
+
+    def observe(self, key: str, latency: float):
+        with self._lock:
+            est = self._estimates.get(key)
+            if est is None:
+                self._estimates[key] = {"mean": latency, "dev": latency / 2, "samples": 1, "backoff": 1}
+                return
+            est["dev"] = (1 - TIMEOUT_BETA) * est["dev"] + TIMEOUT_BETA * abs(latency - est["mean"])
+            est["mean"] = (1 - TIMEOUT_ALPHA) * est["mean"] + TIMEOUT_ALPHA * latency
+            est["samples"] += 1
+            est["backoff"] = 1  # une réponse obtenue : retour à l'estimation
+
+    def record_timeout(self, key: str):
+        """
+        Timeout de lecture : la latence réelle n'est pas observée, l'estimation ne se
+        corrigerait jamais seule. Le timeout de la clé double (comme le RTO de TCP)
+        jusqu'à la prochaine réponse.
+        """
+        with self._lock:
+            est = self._estimates.get(key)
+            if est is not None:
+                est["backoff"] = min(est["backoff"] * 2, TIMEOUT_MAX_BACKOFF)
+
+    def timeout(self, key: str) -> float:
+        with self._lock:
+            est = self._estimates.get(key)
+            if est is None or est["samples"] < TIMEOUT_MIN_SAMPLES:
+                return self.default
+            value = max(est["mean"] + TIMEOUT_DEVIATIONS * est["dev"], est["mean"] * TIMEOUT_MULTIPLIER_FLOOR)
+            value = max(TIMEOUT_MIN_SECONDS, value) * est["backoff"]
+        return min(self.ceiling, value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            keys = list(self._estimates)
+        return {
+            key: {
+                "mean": round(self._estimates[key]["mean"], 3),
+                "samples": self._estimates[key]["samples"],
+                "backoff": self._estimates[key]["backoff"],
+                "timeout": round(self.timeout(key), 1),
+            }
+            for key in keys
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(endpoint: str, model: str) -> CircuitBreaker:
+    name = f"{endpoint}|{model}"
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+def breakers_snapshot() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
@@ -0,0 +1,244 @@
+import threading
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Ordonnanceur des appels Ollama :
+# - classes de priorité (ask interactif > classification > résumé batch)
+# - plafond de concurrence global et par modèle
+# - partage équitable entre entreprises (tenant le moins servi en premier)
+# - signal inter-process (Redis) : quand un ask est en cours côté web,
+#   les workers Celery réduisent leur concurrence batch.
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_CLASSIFICATION = 1
+PRIORITY_BATCH = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_CLASSIFICATION: "classification",
+    PRIORITY_BATCH: "batch",
+}
+
+OLLAMA_MAX_INFLIGHT = 4          # appels simultanés max vers Ollama (par process)
+INTERACTIVE_RESERVED_SLOTS = 1   # slots jamais occupés par le batch
+BATCH_SLOTS_UNDER_PRESSURE = 1   # batch max par process quand un ask est en cours ailleurs
+MODEL_CONCURRENCY = {
+    "mistral:instruct": 3,
+    "mistral": 1,
+    "llama3:instruct": 2,
+}
+DEFAULT_MODEL_CONCURRENCY = 1
+
+PRESSURE_KEY = "llm:interactive_inflight"
+PRESSURE_TTL = 120               # secondes : un process mort ne bloque pas le batch indéfiniment
+PRESSURE_REFRESH = 0.5           # secondes entre deux lectures du compteur Redis
+DISPATCH_POLL = 0.5              # ré-évaluation périodique des attentes (pression externe)
+
+
+class _Waiter:
+    __slots__ = ("priority", "model", "tenant", "seq", "enqueued_at", "event")
+
+    def __init__(self, priority, model, tenant, seq):
+        self.priority = priority
+        self.model = model
+        self.tenant = tenant or "anonyme"
+        self.seq = seq
+        self.enqueued_at = time.time()
+        self.event = threading.Event()
+
+
+class InteractivePressure:
+    """Compteur partagé (Redis) des appels interactifs en cours, tous process confondus."""
+
+    def __init__(self):
+        self._client = None
+        self._disabled = False
+        self._cached_value = 0
+        self._cached_at = 0.0
+
+    def _get_client(self):
+        if self._client is None and not self._disabled:
+            try:
+                import redis
+                from django.conf import settings
+                url = getattr(settings, "CELERY_BROKER_URL", "redis://redis:6379/0")
+                self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+            except Exception as e:
+                logger.warning(f"Signal de pression interactive désactivé (Redis indisponible) : {e}")
+                self._disabled = True
+        return self._client
+
+    def _safe(self, fn, default=None):
+        client = self._get_client()
+        if client is None:
+            return default
+        try:
+            return fn(client)
+        except Exception as e:
+            logger.debug(f"Redis pression interactive : {e}")
+            return default
+
+    def incr(self):
+        def _incr(client):
+            pipe = client.pipeline()
+            pipe.incr(PRESSURE_KEY)
+            pipe.expire(PRESSURE_KEY, PRESSURE_TTL)
+            pipe.execute()
+        self._safe(_incr)
+
+    def decr(self):
+        def _decr(client):
+            if client.decr(PRESSURE_KEY) < 0:
+                client.set(PRESSURE_KEY, 0, ex=PRESSURE_TTL)
+        self._safe(_decr)
+
+    def value(self) -> int:
+        now = time.time()
+        if now - self._cached_at >= PRESSURE_REFRESH:
+            raw = self._safe(lambda client: client.get(PRESSURE_KEY))
+            self._cached_value = int(raw) if raw else 0
+            self._cached_at = now
+        return self._cached_value
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_inflight: int = OLLAMA_MAX_INFLIGHT,
+        model_limits: Optional[Dict[str, int]] = None,
+        reserved_interactive: int = INTERACTIVE_RESERVED_SLOTS,
+    ):
+        self.max_inflight = max_inflight
+        self.model_limits = dict(model_limits if model_limits is not None else MODEL_CONCURRENCY)
+        self.reserved_interactive = reserved_interactive
+        self.pressure = InteractivePressure()
+
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiters = []
+        self._inflight_total = 0
+        self._inflight_model: Dict[str, int] = {}
+        self._inflight_tenant: Dict[str, int] = {}
+        self._inflight_priority: Dict[int, int] = {}
+        self._stats = {name: {"granted": 0, "wait_total": 0.0, "wait_max": 0.0} for name in PRIORITY_NAMES.values()}
+
+    # --- Politique d'admission ---
+    def _model_limit(self, model):
+        return self.model_limits.get(model, DEFAULT_MODEL_CONCURRENCY)
+
+    def _eligible(self, waiter: _Waiter, pressure: int) -> bool:
+        if self._inflight_total >= self.max_inflight:
+            return False
+        if self._inflight_model.get(waiter.model, 0) >= self._model_limit(waiter.model):
+            return False
+        if waiter.priority == PRIORITY_BATCH:
+            batch_inflight = self._inflight_priority.get(PRIORITY_BATCH, 0)
+            if self._inflight_total >= self.max_inflight - self.reserved_interactive:
+                return False
+            if pressure > 0 and batch_inflight >= BATCH_SLOTS_UNDER_PRESSURE:
+                return False
+        return True
+
+    def _dispatch(self, pressure: int):
+        """
+        Accorde des slots tant que possible : priorité, puis tenant le moins servi, puis FIFO.
+        `pressure` est lu par l'appelant AVANT de prendre le verrou : un Redis lent
+        ne doit pas bloquer tous les acquire/release du process.
+        """
+        while True:
+            candidates = [w for w in self._waiters if self._eligible(w, pressure)]
+            if not candidates:
+                return
+            waiter = min(candidates, key=lambda w: (w.priority, self._inflight_tenant.get(w.tenant, 0), w.seq))
+            self._waiters.remove(waiter)
+            self._grant(waiter)
+
+    def _grant(self, waiter: _Waiter):
+        self._inflight_total += 1
+        self._inflight_model[waiter.model] = self._inflight_model.get(waiter.model, 0) + 1
+        self._inflight_tenant[waiter.tenant] = self._inflight_tenant.get(waiter.tenant, 0) + 1
+        self._inflight_priority[waiter.priority] = self._inflight_priority.get(waiter.priority, 0) + 1
+
+        wait = time.time() - waiter.enqueued_at
+        stats = self._stats[PRIORITY_NAMES[waiter.priority]]
+        stats["granted"] += 1
+        stats["wait_total"] += wait
+        stats["wait_max"] = max(stats["wait_max"], wait)
+        waiter.event.set()
+
+    # --- API ---
+    def acquire(self, model: str, priority: int = PRIORITY_BATCH, tenant: Optional[str] = None) -> float:
+        """Bloque jusqu'à obtention d'un slot ; retourne le temps d'attente en file (s)."""
+        waiter = _Waiter(priority, model, tenant, next(self._seq))
+        pressure = self.pressure.value()
+        with self._lock:
+            self._waiters.append(waiter)
+            self._dispatch(pressure)
+
+        while not waiter.event.wait(DISPATCH_POLL):
+            pressure = self.pressure.value()
+            with self._lock:
+                self._dispatch(pressure)  # la pression externe a pu retomber
+
+        if priority == PRIORITY_INTERACTIVE:
+            self.pressure.incr()
+        return time.time() - waiter.enqueued_at
+
+    def release(self, model: str, priority: int = PRIORITY_BATCH, tenant: Optional[str] = None):
+        tenant = tenant or "anonyme"
+        if priority == PRIORITY_INTERACTIVE:
+            self.pressure.decr()
+        pressure = self.pressure.value()
+        with self._lock:
+            self._inflight_total -= 1
+            self._inflight_model[model] -= 1
+            self._inflight_tenant[tenant] -= 1
+            if not self._inflight_tenant[tenant]:
+                del self._inflight_tenant[tenant]
+            self._inflight_priority[priority] -= 1
+            self._dispatch(pressure)
+
+    @contextmanager
+    def slot(self, model: str, priority: int = PRIORITY_BATCH, tenant: Optional[str] = None):
+        wait = self.acquire(model, priority, tenant)
+        try:
+            yield wait
+        finally:
+            self.release(model, priority, tenant)
+
+    def metrics(self) -> dict:
+        pressure = self.pressure.value()
+        with self._lock:
+            queue_depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            queue_by_model: Dict[str, int] = {}
+            for w in self._waiters:
+                queue_depth[PRIORITY_NAMES[w.priority]] += 1
+                queue_by_model[w.model] = queue_by_model.get(w.model, 0) + 1
+
+            waits = {
+                name: {
+                    "granted": s["granted"],
+                    "wait_avg": round(s["wait_total"] / s["granted"], 3) if s["granted"] else 0.0,
+                    "wait_max": round(s["wait_max"], 3),
+                }
+                for name, s in self._stats.items()
+            }
+            return {
+                "inflight": self._inflight_total,
+                "max_inflight": self.max_inflight,
+                "inflight_by_model": dict(self._inflight_model),
+                "inflight_by_tenant": dict(self._inflight_tenant),
+                "queue_depth": queue_depth,
+                "queue_depth_by_model": queue_by_model,
+                "interactive_pressure": pressure,
+                "waits": waits,
+            }
+
+
+# Ordonnanceur partagé par tous les appels du process
+scheduler = LLMScheduler()
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import socket
+import atexit
+import bisect
+import threading
+import logging
+from typing import Dict, List, Optional
+
+# Télémétrie par appel LLM, à partir des champs renvoyés par Ollama
+# (eval_count, eval_duration, prompt_eval_count, prompt_eval_duration, load_duration)
+# et de l'attente dans l'ordonnanceur. Agrégée en histogrammes par (appelant, modèle, entreprise),
+# puis écrite périodiquement dans cache_json/llm_metrics/<hôte>-<pid>.json :
+# la vue llm_metrics fusionne les fichiers des process web et worker.
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_DIR = os.path.join("cache_json", "llm_metrics")
+TELEMETRY_FLUSH_INTERVAL = 30        # secondes entre deux écritures
+TELEMETRY_MAX_AGE = 7 * 24 * 3600    # fichiers de process arrêtés ignorés au-delà
+LOAD_THRESHOLD = 0.5                 # secondes de load_duration comptées comme un (re)chargement
+
+CALLER_BLOCK = "block_summary"
+CALLER_INTERMEDIATE = "intermediate"
+CALLER_FINAL = "final"
+CALLER_ENRICHMENT = "enrichment"
+CALLER_CLASSIFIER = "classifier"
+CALLER_ASK = "ask"
+CALLER_IMPROVE = "improve"
+CALLER_WARMUP = "warmup"
+CALLER_OTHER = "other"
+
+SECONDS_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600]
+TOKENS_BUCKETS = [16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192]
+RATE_BUCKETS = [1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200]
+
+METRIC_BUCKETS = {
+    "tokens_per_s": RATE_BUCKETS,
+    "prompt_tokens_per_s": [10, 25, 50, 100, 250, 500, 1000, 2500, 5000],
+    "prompt_tokens": TOKENS_BUCKETS,
+    "output_tokens": TOKENS_BUCKETS,
+    "queue_wait_s": SECONDS_BUCKETS,
+    "load_s": SECONDS_BUCKETS,
+    "prompt_eval_s": SECONDS_BUCKETS,
+    "generation_s": SECONDS_BUCKETS,
+    "total_s": SECONDS_BUCKETS,
+}
+
+NS = 1e9
+
+
+class Histogram:
+    """Histogramme à bornes fixes (fusionnable entre process) : compteurs, somme, min, max."""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, data: dict):
+        if data.get("bounds") != self.bounds:
+            return  # bornes modifiées entre deux versions : on ignore l'ancien fichier
+        self.counts = [a + b for a, b in zip(self.counts, data["counts"])]
+        self.count += data["count"]
+        self.total += data["sum"]
+        for attr, pick in (("min", min), ("max", max)):
+            other = data.get(attr)
+            if other is not None:
+                current = getattr(self, attr)
+                setattr(self, attr, other if current is None else pick(current, other))
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximation : borne haute du seau contenant le quantile, plafonnée au max observé."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {"bounds": self.bounds, "counts": self.counts, "count": self.count,
+                "sum": round(self.total, 4), "min": self.min, "max": self.max}
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max, 3) if self.max is not None else None,
+        }
+
+
+class _Series:
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.loads = 0
+        self.histograms = {name: Histogram(bounds) for name, bounds in METRIC_BUCKETS.items()}
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "cache_hits": self.cache_hits, "loads": self.loads,
+                "histograms": {name: h.to_dict() for name, h in self.histograms.items()}}
+
+    def merge(self, data: dict):
+        self.calls += data.get("calls", 0)
+        self.cache_hits += data.get("cache_hits", 0)
+        self.loads += data.get("loads", 0)
+        for name, hist in data.get("histograms", {}).items():
+            if name in self.histograms:
+                self.histograms[name].merge(hist)
+
+    def summary(self) -> dict:
+        result = {"calls": self.calls, "cache_hits": self.cache_hits, "loads": self.loads}
+        result.update({name: h.summary() for name, h in self.histograms.items()})
+        return result
+
+
+def _series_key(caller, model, tenant) -> str:
+    return f"{caller or CALLER_OTHER}|{model}|{tenant or 'anonyme'}"
+
+
+class LLMTelemetry:
+    def __init__(self, directory: str = TELEMETRY_DIR, flush_interval: float = TELEMETRY_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.path = os.path.join(directory, f"{socket.gethostname()}-{os.getpid()}.json")
+        self.started_at = time.time()
+        self._series: Dict[str, _Series] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+
+    def _get_series(self, caller, model, tenant) -> _Series:
+        key = _series_key(caller, model, tenant)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+        return series
+
+    def record(self, caller: Optional[str], model: str, tenant: Optional[str], data: dict,
+               queue_wait: float = 0.0, latency: Optional[float] = None):
+        """Enregistre un appel terminé à partir de la réponse finale d'Ollama (champs en nanosecondes)."""
+        eval_count = data.get("eval_count") or 0
+        eval_s = (data.get("eval_duration") or 0) / NS
+        prompt_count = data.get("prompt_eval_count") or 0
+        prompt_s = (data.get("prompt_eval_duration") or 0) / NS
+        load_s = (data.get("load_duration") or 0) / NS
+        total_s = (data.get("total_duration") or 0) / NS or latency
+
+        with self._lock:
+            series = self._get_series(caller, model, tenant)
+            series.calls += 1
+            h = series.histograms
+            h["queue_wait_s"].observe(queue_wait)
+            h["output_tokens"].observe(eval_count)
+            h["prompt_tokens"].observe(prompt_count)
+            h["generation_s"].observe(eval_s)
+            h["prompt_eval_s"].observe(prompt_s)
+            h["load_s"].observe(load_s)
+            if load_s >= LOAD_THRESHOLD:
+                series.loads += 1
+            if total_s:
+                h["total_s"].observe(total_s)
+            if eval_count and eval_s:
+                h["tokens_per_s"].observe(eval_count / eval_s)
+            if prompt_count and prompt_s:
+                h["prompt_tokens_per_s"].observe(prompt_count / prompt_s)
+        self._maybe_flush()
+
+    def record_cache_hit(self, caller: Optional[str], model: str, tenant: Optional[str]):
+        with self._lock:
+            self._get_series(caller, model, tenant).cache_hits += 1
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Écriture atomique des agrégats cumulés du process."""
+        with self._lock:
+            self._last_flush = time.time()
+            payload = {
+                "pid": os.getpid(),
+                "host": socket.gethostname(),
+                "started_at": self.started_at,
+                "updated_at": self._last_flush,
+                "series": {key: series.to_dict() for key, series in self._series.items()},
+            }
+        if not payload["series"]:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Télémétrie LLM non écrite : {e}")
+
+
+def collect_telemetry(directory: str = TELEMETRY_DIR, max_age: float = TELEMETRY_MAX_AGE) -> dict:
+    """
+    Fusionne les fichiers de tous les process (web, workers) : vues par appelant,
+    par modèle, par entreprise et par série complète (appelant|modèle|entreprise).
+    """
+    merged: Dict[str, _Series] = {}
+    processes = 0
+    now = time.time()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                    payload = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if now - payload.get("updated_at", 0) > max_age:
+                continue
+            processes += 1
+            for key, data in payload.get("series", {}).items():
+                merged.setdefault(key, _Series()).merge(data)
+
+    views = {"by_caller": {}, "by_model": {}, "by_tenant": {}}
+    for key, series in merged.items():
+        caller, model, tenant = key.split("|", 2)
+        for view, label in (("by_caller", caller), ("by_model", model), ("by_tenant", tenant)):
+            views[view].setdefault(label, _Series()).merge(series.to_dict())
+
+    return {
+        "processes": processes,
+        "by_caller": {k: s.summary() for k, s in views["by_caller"].items()},
+        "by_model": {k: s.summary() for k, s in views["by_model"].items()},
+        "by_tenant": {k: s.summary() for k, s in views["by_tenant"].items()},
+        "series": {k: s.summary() for k, s in merged.items()},
+    }
+
+
+# Télémétrie partagée par la passerelle du process
+telemetry = LLMTelemetry()
+atexit.register(telemetry.flush)
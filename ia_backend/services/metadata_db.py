@@ -230,8 +230,11 @@ def find_nearest_pdf_by_embedding(question_embedding: List[float], entreprise: s
         return None
 
 
-def find_documents_by_keyword_semantic(question: str, entreprise: str, job_id: str, encode_text_fn, top_k: int = 5) -> List[Tuple[str, str]]:
-    """Recherche combinée par mots-clés et similarité sémantique."""
+def find_documents_by_keyword_semantic(question: str, entreprise: str, job_id: str, encode_text_fn, top_k: int = 5, question_emb=None) -> List[Tuple[str, str]]:
+    """
+    Recherche combinée par mots-clés et similarité sémantique.
+    `question_emb` : embedding de la question déjà calculé par l'appelant (sinon encodé ici).
+    """
     logger.info(f"Recherche combinée pour '{question}' dans {entreprise}/{job_id}")
     
     # Recherche full-text d'abord
@@ -246,21 +249,25 @@ def find_documents_by_keyword_semantic(question: str, entreprise: str, job_id: s
             WHERE entreprise = ? AND job_id = ?
             """, (entreprise, job_id))
 
-            # Encodage sémantique de la question
-            question_emb = encode_text_fn(question)
-            logger.debug(f"Embedding sémantique généré - dimension: {len(question_emb)}")
+            # Encodage sémantique de la question (une seule fois par requête)
+            if question_emb is None:
+                question_emb = encode_text_fn(question)
+            logger.debug(f"Embedding sémantique - dimension: {len(question_emb)}")
 
-            scored = []
+            documents = []
             for filename, mots_cles, themes in cur.fetchall():
                 text = ((mots_cles or "") + " " + (themes or "")).strip()
-                if not text:
-                    continue
-                
-                # Calcul de similarité cosinus
-                text_emb = encode_text_fn(text)
-                score = cos_sim(text_emb, question_emb)[0][0].item()
-                scored.append((filename, text[:200], score))
-                logger.debug(f"Similarité avec {filename}: {score:.4f} - texte: {text[:60]}...")
+                if text:
+                    documents.append((filename, text))
+
+            scored = []
+            if documents:
+                # Un seul encodage par lot pour tous les documents du job
+                text_embs = encode_text_fn([text for _, text in documents])
+                scores = cos_sim(text_embs, question_emb)[:, 0].tolist()
+                for (filename, text), score in zip(documents, scores):
+                    scored.append((filename, text[:200], score))
+                    logger.debug(f"Similarité avec {filename}: {score:.4f} - texte: {text[:60]}...")
 
             top_semantic = sorted(scored, key=lambda x: x[2], reverse=True)[:top_k]
             logger.debug(f"Top {len(top_semantic)} résultats sémantiques")
@@ -1,79 +1,549 @@
+import os
 import threading
-import queue
+import asyncio
+import weakref
 import requests
-from typing import List, Optional
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from typing import Callable, List, Optional, Iterator
+import json
 import logging
 import time
 
+from .llm_cache import response_cache, make_cache_key
+from .llm_scheduler import (
+    scheduler,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_CLASSIFICATION,
+    PRIORITY_BATCH
+)
+from .llm_telemetry import telemetry, collect_telemetry, CALLER_WARMUP
+from .llm_resilience import (
+    AdaptiveTimeout,
+    LLMUnavailableError,
+    LLMStreamInterrupted,
+    BREAKER_OPEN_SECONDS,
+    backoff_delay,
+    breakers_snapshot,
+    get_breaker
+)
+
 logger = logging.getLogger(__name__)
 
-OLLAMA_MAX_WORKERS = 2
 DEFAULT_MODELS = ["mistral"]
 
-ollama_queue = queue.Queue()
+# Fenêtre de contexte par modèle, la même pour tous les appelants et tous les process
+# (web, workers, préchargement) : Ollama recharge le modèle dès que num_ctx change.
+MODEL_NUM_CTX = {
+    "mistral:instruct": 4096,  # blocs et fusions intermédiaires
+    "mistral": 8192,           # fusion finale (plusieurs intermédiaires + 1500 tokens générés), enrichissement, classifieur
+    "llama3:instruct": 8192,   # réponses ask (question + blocs de contexte)
+}
+DEFAULT_NUM_CTX = 4096
 
-def ollama_worker():
-    while True:
-        try:
-            task, result_queue = ollama_queue.get()
-            result = task()
-            result_queue.put(result)
-        except requests.exceptions.RequestException as e:
-            print(f"🌐 Erreur réseau Ollama: {str(e)}")
-            result_queue.put("Erreur réseau")
-        except Exception as e:
-            print(f"⚠️ Erreur worker: {str(e)}")
-            result_queue.put("Erreur interne")
-        finally:
-            ollama_queue.task_done()
+# --------- Connexion HTTP à Ollama ---------
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://ollama:11434")  # surchargé pour le faux serveur de charge
+OLLAMA_GENERATE_URL = f"{OLLAMA_BASE_URL}/api/generate"
+OLLAMA_CONNECT_TIMEOUT = 5.0   # secondes pour établir la connexion
+OLLAMA_READ_TIMEOUT = 600.0    # secondes max sans réponse (un Ollama bloqué ne fige plus le worker)
+OLLAMA_POOL_SIZE = 16          # connexions keep-alive conservées vers Ollama
+OLLAMA_RETRIES = 1             # nouvelle tentative sur le même modèle (transport/5xx), après backoff
+ASYNC_ACQUIRE_WORKERS = 64     # threads d'attente de slot pour le client asyncio (acquire est bloquant)
+
+# Durée de maintien en mémoire demandée à Ollama, par classe d'appel :
+# les modèles du chemin interactif restent chargés plus longtemps que ceux du batch.
+KEEP_ALIVE_BY_PRIORITY = {
+    PRIORITY_INTERACTIVE: "60m",
+    PRIORITY_CLASSIFICATION: "60m",
+    PRIORITY_BATCH: "20m",
+}
+DEFAULT_KEEP_ALIVE = "5m"
+OLLAMA_WARMUP = os.environ.get("OLLAMA_WARMUP", "1") != "0"  # désactivable (tests, commandes manage.py)
+
+# Timeout de lecture appris sur les latences observées, plafonné à OLLAMA_READ_TIMEOUT
+read_timeouts = AdaptiveTimeout(default=OLLAMA_READ_TIMEOUT)
+
+_session = None
+_session_lock = threading.Lock()
+_async_sessions = weakref.WeakKeyDictionary()  # une session aiohttp par boucle asyncio
+_acquire_executor = ThreadPoolExecutor(max_workers=ASYNC_ACQUIRE_WORKERS, thread_name_prefix="ollama-acquire")
+
+def get_session() -> requests.Session:
+    """Session HTTP partagée (pool de connexions keep-alive, thread-safe)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+async def get_async_session() -> aiohttp.ClientSession:
+    """Session aiohttp de la boucle courante (pool de connexions keep-alive)."""
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=OLLAMA_POOL_SIZE, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(sock_connect=OLLAMA_CONNECT_TIMEOUT, sock_read=OLLAMA_READ_TIMEOUT)
+        )
+        _async_sessions[loop] = session
+    return session
+
+def get_num_ctx(model: str) -> int:
+    return MODEL_NUM_CTX.get(model, DEFAULT_NUM_CTX)
+
+def build_options(num_predict: int, temperature: float, top_k: int, num_ctx: Optional[int] = None) -> dict:
+    options = {
+        "num_predict": num_predict,
+        "temperature": temperature,
+        "top_k": top_k
+    }
+    if num_ctx:
+        options["num_ctx"] = num_ctx  # sinon fenêtre par défaut du modèle côté Ollama
+    return options
+
+def extract_response_text(json_response: dict) -> Optional[str]:
+    response_text = json_response.get("response")
+    if not response_text or not isinstance(response_text, str):
+        logger.warning(f"Ollama a renvoyé une réponse vide ou invalide : {json_response}")
+        return None
+    return response_text.strip()
+
+def get_keep_alive(priority: int) -> str:
+    return KEEP_ALIVE_BY_PRIORITY.get(priority, DEFAULT_KEEP_ALIVE)
+
+def _timeout_key(model: str, num_predict: int) -> str:
+    """Latences comparables : même modèle et même budget de génération."""
+    return f"{model}:{num_predict}"
+
+def build_request_extras(options: dict, raw: bool = False, response_format: Optional[str] = None):
+    """Champs `raw`/`format` du payload, et options de la clé de cache qui les incluent."""
+    payload_extra = {}
+    key_options = options
+    if raw:
+        payload_extra["raw"] = True
+        key_options = dict(options, raw=True)
+    if response_format:
+        payload_extra["format"] = response_format
+        key_options = dict(key_options, format=response_format)
+    return payload_extra, key_options
+
+def _is_retryable(exc: Exception) -> bool:
+    """Erreurs de transport et 5xx : une nouvelle tentative a une chance d'aboutir (pas un timeout)."""
+    if isinstance(exc, (requests.Timeout, asyncio.TimeoutError)):
+        return False
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code >= 500
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status >= 500
+    return isinstance(exc, (requests.ConnectionError, aiohttp.ClientConnectionError))
+
+def _is_service_failure(exc: Exception) -> bool:
+    """
+    Échecs imputables à Ollama, comptés par le disjoncteur : transport, timeout, 5xx,
+    erreur signalée dans le flux. Un 4xx ou un JSON illisible relève de la requête.
+    """
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is None or exc.response.status_code >= 500
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status >= 500
+    if isinstance(exc, ValueError):
+        return False
+    return isinstance(exc, (
+        requests.ConnectionError, requests.Timeout, aiohttp.ClientConnectionError, asyncio.TimeoutError, RuntimeError
+    ))
+
+def _is_read_timeout(exc: Exception) -> bool:
+    """Timeout de lecture, y compris en cours de flux (requests le remonte alors en ConnectionError)."""
+    if isinstance(exc, (requests.ReadTimeout, aiohttp.SocketTimeoutError)):
+        return True
+    return isinstance(exc, requests.ConnectionError) and bool(exc.args) and isinstance(exc.args[0], ReadTimeoutError)
+
+def _unavailable(models: List[str]) -> LLMUnavailableError:
+    waits = [get_breaker(OLLAMA_BASE_URL, model).retry_after() for model in models]
+    waits = [w for w in waits if w > 0]
+    logger.error(f"⛔ Aucun modèle joignable parmi {models}")
+    return LLMUnavailableError(models, retry_after=min(waits) if waits else BREAKER_OPEN_SECONDS)
 
 def generate_ollama(
     prompt: str,
     num_predict: int = 800,
     models: Optional[List[str]] = None,
     temperature: float = 0.7,
-    top_k: int = 40
+    top_k: int = 40,
+    num_ctx: Optional[int] = None,
+    priority: int = PRIORITY_BATCH,
+    tenant: Optional[str] = None,
+    cache: bool = False,
+    cache_ttl: Optional[int] = None,
+    raw: bool = False,
+    caller: Optional[str] = None,
+    response_format: Optional[str] = None,
+    cache_validator: Optional[Callable[[str], bool]] = None
 ) -> str:
+    """
+    Génère une réponse Ollama en passant par l'ordonnanceur :
+    priority = PRIORITY_INTERACTIVE (ask) / PRIORITY_CLASSIFICATION / PRIORITY_BATCH (résumés),
+    tenant = entreprise (partage équitable entre entreprises).
+    cache=True : réponse servie/enregistrée dans le cache LLM (prompts déterministes).
+    raw=True : prompt envoyé sans template du modèle (prompt portant déjà ses balises [INST]).
+    caller = étiquette de télémétrie (bloc, intermédiaire, final, classifieur, ask...).
+    response_format="json" : sortie contrainte à du JSON valide (champ `format` d'Ollama).
+    num_ctx=None : fenêtre du modèle dans MODEL_NUM_CTX (celle du préchargement).
+    cache_validator : la réponse n'est mise en cache que si cache_validator(réponse) est vrai
+    (une sortie inexploitable n'est pas resservie aux tentatives suivantes).
+    Chaîne vide si les modèles répondent sans contenu exploitable ou refusent la requête
+    (4xx, JSON illisible) ; LLMUnavailableError seulement si aucun modèle n'est joignable
+    (disjoncteur ouvert, transport, timeout, 5xx).
+    """
     models = models or DEFAULT_MODELS
+    answered = False
 
     for model in models:
-        try:
-            response = requests.post(
-                "http://ollama:11434/api/generate",
-                json={
-                    "model": model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "num_predict": num_predict,
-                        "temperature": temperature,
-                        "top_k": top_k
-                    }
-                },
-            )
-            response.raise_for_status()
-            json_response = response.json()
-            response_text = json_response.get("response")
-
-            if not response_text or not isinstance(response_text, str):
-                logger.warning(f"Ollama a renvoyé une réponse vide ou invalide : {json_response}")
-                continue
-
-            return response_text.strip()
+        options = build_options(num_predict, temperature, top_k, num_ctx or get_num_ctx(model))
+        payload_extra, key_options = build_request_extras(options, raw, response_format)
+        cache_key = make_cache_key(model, prompt, key_options) if cache else None
+        if cache_key:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                telemetry.record_cache_hit(caller, model, tenant)
+                return cached
 
-        except Exception as e:
-            logger.warning(f"Échec modèle {model}: {str(e)}")
-            continue
+        breaker = get_breaker(OLLAMA_BASE_URL, model)
+        timeout_key = _timeout_key(model, num_predict)
+        for attempt in range(OLLAMA_RETRIES + 1):
+            if not breaker.allow():
+                logger.warning(f"⛔ Modèle {model} court-circuité (disjoncteur ouvert)")
+                break
+            try:
+                with breaker.call(_is_service_failure):
+                    with scheduler.slot(model, priority, tenant) as queue_wait:
+                        start = time.time()
+                        response = get_session().post(
+                            OLLAMA_GENERATE_URL,
+                            json={
+                                "model": model,
+                                "prompt": prompt,
+                                "stream": False,
+                                "keep_alive": get_keep_alive(priority),
+                                "options": options,
+                                **payload_extra
+                            },
+                            timeout=(OLLAMA_CONNECT_TIMEOUT, read_timeouts.timeout(timeout_key)),
+                        )
+                        latency = time.time() - start
+                    response.raise_for_status()
+                    data = response.json()
+            except Exception as e:
+                if _is_read_timeout(e):
+                    read_timeouts.record_timeout(timeout_key)
+                logger.warning(f"Échec modèle {model} (essai {attempt + 1}): {str(e)}")
+                if not _is_service_failure(e):
+                    answered = True  # modèle joint, requête refusée (4xx, JSON illisible) : pas une panne
+                    break
+                if attempt < OLLAMA_RETRIES and _is_retryable(e):
+                    time.sleep(backoff_delay(attempt))
+                    continue
+                break
+
+            read_timeouts.observe(timeout_key, latency)
+            telemetry.record(caller, model, tenant, data, queue_wait=queue_wait, latency=latency)
+            answered = True
+            response_text = extract_response_text(data)
+            if response_text is None:
+                break
+
+            if cache_key and (cache_validator is None or cache_validator(response_text)):
+                response_cache.set(cache_key, response_text, cache_ttl)
+            return response_text
 
+    if not answered:
+        raise _unavailable(models)
     logger.error("Tous les modèles ont échoué")
     return ""
 
-def call_llm(prompt: str, model: Optional[str] = "mistral") -> str:
+def stream_ollama(
+    prompt: str,
+    num_predict: int = 800,
+    models: Optional[List[str]] = None,
+    temperature: float = 0.7,
+    top_k: int = 40,
+    num_ctx: Optional[int] = None,
+    priority: int = PRIORITY_BATCH,
+    tenant: Optional[str] = None,
+    cache: bool = False,
+    cache_ttl: Optional[int] = None,
+    caller: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Génération en streaming : rend les fragments de texte du flux NDJSON d'Ollama
+    au fil de l'eau. Repli sur le modèle suivant tant que rien n'a été émis ;
+    le slot de l'ordonnanceur est tenu pendant tout le flux.
+    Flux vide si les modèles refusent la requête (4xx, JSON illisible) ;
+    LLMUnavailableError (avant tout fragment) si aucun modèle n'est joignable,
+    LLMStreamInterrupted si le flux est coupé après des fragments déjà rendus.
+    """
+    models = models or DEFAULT_MODELS
+    answered = False
+
+    for model in models:
+        options = build_options(num_predict, temperature, top_k, num_ctx or get_num_ctx(model))
+        cache_key = make_cache_key(model, prompt, options) if cache else None
+        if cache_key:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                telemetry.record_cache_hit(caller, model, tenant)
+                yield cached
+                return
+
+        breaker = get_breaker(OLLAMA_BASE_URL, model)
+        timeout_key = _timeout_key(model, num_predict)
+        for attempt in range(OLLAMA_RETRIES + 1):
+            if not breaker.allow():
+                logger.warning(f"⛔ Modèle {model} court-circuité (disjoncteur ouvert)")
+                break
+
+            emitted = False
+            parts = []
+            final_data = {}
+            try:
+                # flux abandonné par le consommateur (GeneratorExit) : verdict rendu par breaker.call
+                with breaker.call(_is_service_failure), scheduler.slot(model, priority, tenant) as queue_wait:
+                    start = time.time()
+                    with get_session().post(
+                        OLLAMA_GENERATE_URL,
+                        json={
+                            "model": model,
+                            "prompt": prompt,
+                            "stream": True,
+                            "keep_alive": get_keep_alive(priority),
+                            "options": options
+                        },
+                        timeout=(OLLAMA_CONNECT_TIMEOUT, read_timeouts.timeout(timeout_key)),
+                        stream=True,
+                    ) as response:
+                        response.raise_for_status()
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            data = json.loads(line)
+                            if data.get("error"):
+                                raise RuntimeError(data["error"])
+                            chunk = data.get("response")
+                            if chunk:
+                                emitted = True
+                                parts.append(chunk)
+                                yield chunk
+                            if data.get("done"):
+                                final_data = data  # statistiques de l'appel sur le dernier message
+                                break
+            except Exception as e:
+                if _is_read_timeout(e):
+                    read_timeouts.record_timeout(timeout_key)
+                logger.warning(f"Échec modèle {model} (stream, essai {attempt + 1}): {str(e)}")
+                if emitted:
+                    # fragments déjà transmis : ni repli ni cache, l'appelant doit signaler la troncature
+                    raise LLMStreamInterrupted(model, "".join(parts), e) from e
+                if not _is_service_failure(e):
+                    answered = True  # modèle joint, requête refusée (4xx, JSON illisible) : pas une panne
+                    break
+                if attempt < OLLAMA_RETRIES and _is_retryable(e):
+                    time.sleep(backoff_delay(attempt))
+                    continue
+                break
+
+            telemetry.record(caller, model, tenant, final_data, queue_wait=queue_wait, latency=time.time() - start)
+            answered = True
+            if emitted:
+                if cache_key:
+                    response_cache.set(cache_key, "".join(parts).strip(), cache_ttl)
+                return
+            logger.warning(f"Flux Ollama vide pour le modèle {model}")
+            break
+
+    if not answered:
+        raise _unavailable(models)
+    logger.error("Tous les modèles ont échoué (stream)")
+
+def _release_when_granted(model: str, priority: int, tenant: Optional[str]):
+    """Callback d'un acquire abandonné : le slot obtenu après l'annulation est rendu aussitôt."""
+    def callback(future):
+        if not future.cancelled() and future.exception() is None:
+            scheduler.release(model, priority, tenant)
+    return callback
+
+async def _acquire_slot(model: str, priority: int, tenant: Optional[str]) -> float:
+    """
+    scheduler.acquire bloque : l'attente tourne dans un thread dédié. Si la coroutine est
+    annulée pendant l'attente, le thread va quand même jusqu'au slot, qui est alors rendu.
+    """
+    pending = _acquire_executor.submit(scheduler.acquire, model, priority, tenant)
+    try:
+        return await asyncio.wrap_future(pending)
+    except asyncio.CancelledError:
+        pending.add_done_callback(_release_when_granted(model, priority, tenant))
+        raise
+
+async def agenerate_ollama(
+    prompt: str,
+    num_predict: int = 800,
+    models: Optional[List[str]] = None,
+    temperature: float = 0.7,
+    top_k: int = 40,
+    num_ctx: Optional[int] = None,
+    priority: int = PRIORITY_BATCH,
+    tenant: Optional[str] = None,
+    cache: bool = False,
+    cache_ttl: Optional[int] = None,
+    raw: bool = False,
+    caller: Optional[str] = None,
+    response_format: Optional[str] = None,
+    cache_validator: Optional[Callable[[str], bool]] = None
+) -> str:
+    """
+    Variante asyncio de generate_ollama (mêmes paramètres, même repli sur les modèles,
+    mêmes disjoncteurs) : plusieurs générations concurrentes depuis un seul thread.
+    Annulation (CancelledError) à tout moment : le slot de l'ordonnanceur est rendu
+    et le disjoncteur reçoit son verdict, la sonde n'est jamais bloquée.
+    """
+    models = models or DEFAULT_MODELS
+    session = await get_async_session()
+    loop = asyncio.get_running_loop()
+    answered = False
+
+    for model in models:
+        options = build_options(num_predict, temperature, top_k, num_ctx or get_num_ctx(model))
+        payload_extra, key_options = build_request_extras(options, raw, response_format)
+        cache_key = make_cache_key(model, prompt, key_options) if cache else None
+        if cache_key:
+            cached = await loop.run_in_executor(None, response_cache.get, cache_key)
+            if cached is not None:
+                telemetry.record_cache_hit(caller, model, tenant)
+                return cached
+
+        breaker = get_breaker(OLLAMA_BASE_URL, model)
+        timeout_key = _timeout_key(model, num_predict)
+        for attempt in range(OLLAMA_RETRIES + 1):
+            if not breaker.allow():
+                logger.warning(f"⛔ Modèle {model} court-circuité (disjoncteur ouvert)")
+                break
+            try:
+                # CancelledError (BaseException) : verdict rendu par breaker.call, slot rendu par le finally
+                with breaker.call(_is_service_failure):
+                    queue_wait = await _acquire_slot(model, priority, tenant)
+                    try:
+                        start = time.time()
+                        async with session.post(
+                            OLLAMA_GENERATE_URL,
+                            json={
+                                "model": model,
+                                "prompt": prompt,
+                                "stream": False,
+                                "keep_alive": get_keep_alive(priority),
+                                "options": options,
+                                **payload_extra
+                            },
+                            timeout=aiohttp.ClientTimeout(
+                                sock_connect=OLLAMA_CONNECT_TIMEOUT,
+                                sock_read=read_timeouts.timeout(timeout_key)
+                            ),
+                        ) as response:
+                            response.raise_for_status()
+                            data = await response.json(content_type=None)
+                        latency = time.time() - start
+                    finally:
+                        scheduler.release(model, priority, tenant)
+            except Exception as e:
+                if _is_read_timeout(e):
+                    read_timeouts.record_timeout(timeout_key)
+                logger.warning(f"Échec modèle {model} (async, essai {attempt + 1}): {str(e)}")
+                if not _is_service_failure(e):
+                    answered = True  # modèle joint, requête refusée (4xx, JSON illisible) : pas une panne
+                    break
+                if attempt < OLLAMA_RETRIES and _is_retryable(e):
+                    await asyncio.sleep(backoff_delay(attempt))
+                    continue
+                break
+
+            read_timeouts.observe(timeout_key, latency)
+            telemetry.record(caller, model, tenant, data, queue_wait=queue_wait, latency=latency)
+            answered = True
+            response_text = extract_response_text(data)
+            if response_text is None:
+                break
+
+            if cache_key and (cache_validator is None or cache_validator(response_text)):
+                await loop.run_in_executor(None, response_cache.set, cache_key, response_text, cache_ttl)
+            return response_text
+
+    if not answered:
+        raise _unavailable(models)
+    logger.error("Tous les modèles ont échoué (async)")
+    return ""
+
+def warm_models(models: List[str], priority: int = PRIORITY_BATCH):
+    """
+    Précharge les modèles dans Ollama (prompt vide = chargement seul) avec le num_ctx
+    qu'ils utiliseront ensuite (MODEL_NUM_CTX) : sinon le premier vrai appel paierait un rechargement.
+    """
+    for model in models:
+        num_ctx = get_num_ctx(model)
+        breaker = get_breaker(OLLAMA_BASE_URL, model)
+        if not breaker.allow():
+            logger.warning(f"⛔ Préchargement de {model} ignoré (disjoncteur ouvert)")
+            continue
+        payload = {
+            "model": model,
+            "prompt": "",
+            "stream": False,
+            "keep_alive": get_keep_alive(priority),
+            "options": {"num_ctx": num_ctx}
+        }
+        start = time.time()
+        try:
+            with breaker.call(_is_service_failure):
+                response = get_session().post(
+                    OLLAMA_GENERATE_URL,
+                    json=payload,
+                    timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT),
+                )
+                response.raise_for_status()
+                data = response.json()
+            telemetry.record(CALLER_WARMUP, model, None, data, latency=time.time() - start)
+            logger.info(f"🔥 Modèle {model} préchargé en {time.time() - start:.1f}s (num_ctx={num_ctx}, keep_alive={payload['keep_alive']})")
+        except Exception as e:
+            logger.warning(f"Préchargement du modèle {model} impossible : {e}")
+
+def warm_models_in_background(models: List[str], priority: int = PRIORITY_BATCH) -> Optional[threading.Thread]:
+    """Préchargement dans un thread démon : le démarrage du process n'attend pas Ollama."""
+    if not OLLAMA_WARMUP or not models:
+        return None
+    thread = threading.Thread(target=warm_models, args=(models, priority), name="ollama-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def call_llm(prompt: str, model: Optional[str] = "mistral", priority: int = PRIORITY_BATCH, tenant: Optional[str] = None, cache: bool = False, caller: Optional[str] = None) -> str:
     """
     Wrapper simple pour générer une réponse avec un seul modèle.
     """
-    return generate_ollama(prompt=prompt, models=[model])
+    return generate_ollama(prompt=prompt, models=[model], priority=priority, tenant=tenant, cache=cache, caller=caller)
+
+def get_gateway_metrics() -> dict:
+    """Métriques de l'ordonnanceur (file, slots, attentes), du cache, des disjoncteurs et des timeouts."""
+    return {
+        "scheduler": scheduler.metrics(),
+        "cache": response_cache.stats(),
+        "breakers": breakers_snapshot(),
+        "timeouts": read_timeouts.snapshot(),
+    }
 
-# Démarrage des workers
-for _ in range(OLLAMA_MAX_WORKERS):
-    threading.Thread(target=ollama_worker, daemon=True).start()
+def get_telemetry_metrics() -> dict:
+    """Télémétrie par appel fusionnée sur tous les process (web + workers)."""
+    telemetry.flush()  # inclut les appels récents du process courant
+    return collect_telemetry()
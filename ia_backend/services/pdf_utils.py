@@ -1,12 +1,15 @@
 import os
+import re
 import fitz  # PyMuPDF
-from pdfminer.high_level import extract_text
-from pdfminer.layout import LAParams
+from pdfminer.high_level import extract_text, extract_pages
+from pdfminer.layout import LAParams, LTTextContainer
 from functools import lru_cache
 from dataclasses import dataclass
-from typing import List, Tuple, Dict, Union, Optional
+from typing import List, Tuple, Dict, Union, Optional, Iterator
 import logging
 
+from .token_budget import estimate_tokens, CHARS_PER_TOKEN
+
 # ---------- Logging centralisé ----------
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -20,31 +23,112 @@ if not logger.handlers:
 # ---------- Configuration centralisée ----------
 @dataclass
 class PDFConfig:
-    PAGES_PER_CHUNK: int = 1  # par défaut 1 page
     CACHE_SIZE: int = 100
     MIN_TEXT_LENGTH: int = 10
-    DYNAMIC_THRESHOLD: int = 80  # seuil pour passer en découpage dynamique
 
-# ---------- Découpage dynamique ----------
-def determine_dynamic_chunk_size(total_pages: int) -> int:
-    return 1 if total_pages <= PDFConfig.DYNAMIC_THRESHOLD else 5
+# ---------- Bloc de texte (découpage par budget de tokens) ----------
+@dataclass
+class TextBlock:
+    pages: List[int]  # index des pages (0-based) couvertes par le bloc
+    text: str
+    tokens: int
 
-def extract_blocks_from_pdf(pdf_path: str, chunk_size: Optional[int] = None, return_pages_only: bool = False) -> List[List[int]]:
-    try:
-        with fitz.open(pdf_path) as doc:
-            total_pages = doc.page_count
-            if return_pages_only:
-                return total_pages
+SENTENCE_END = re.compile(r'[.!?…:;»")\]]\s*$')
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?…])\s+(?=[A-ZÀ-ÖØ-Þ0-9«"(\-•])')
+PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
 
-            if chunk_size is None:
-                chunk_size = determine_dynamic_chunk_size(total_pages)
+def _paragraph_units(pages_text: List[str], max_tokens: int) -> List[Tuple[List[int], str]]:
+    """
+    Paragraphes du document dans l'ordre, avec leurs pages. Un paragraphe qui ne se
+    termine pas par une ponctuation finale (phrase coupée en bas de page, par exemple)
+    est fusionné avec le suivant : une frontière d'unité est une fin de phrase, sauf
+    quand l'unité en cours atteint déjà max_tokens (tableaux, listes sans ponctuation).
+    """
+    units = []
+    pending_pages, pending_text = [], ""
+    for page_idx, page_text in enumerate(pages_text):
+        for paragraph in PARAGRAPH_SPLIT.split(page_text or ""):
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+            if page_idx not in pending_pages:
+                pending_pages.append(page_idx)
+            pending_text = f"{pending_text} {paragraph}" if pending_text else paragraph
+            if SENTENCE_END.search(pending_text) or estimate_tokens(pending_text) >= max_tokens:
+                units.append((pending_pages, pending_text))
+                pending_pages, pending_text = [], ""
+    if pending_text:
+        units.append((pending_pages, pending_text))
+    return units
 
-            blocks = [list(range(i, min(i + chunk_size, total_pages))) for i in range(0, total_pages, chunk_size)]
-            return blocks
+def split_by_token_window(text: str, max_tokens: int) -> List[str]:
+    """
+    Coupe un texte sans fin de phrase exploitable en fenêtres de max_tokens, entre deux
+    mots (un « mot » plus long que la fenêtre est coupé lui-même).
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    pieces = []
+    words, length = [], 0
+    for word in text.split():
+        while len(word) > max_chars:
+            if words:
+                pieces.append(" ".join(words))
+                words, length = [], 0
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        added = len(word) + (1 if words else 0)
+        if words and length + added > max_chars:
+            pieces.append(" ".join(words))
+            words, length, added = [], 0, len(word)
+        if word:
+            words.append(word)
+            length += added
+    if words:
+        pieces.append(" ".join(words))
+    return pieces
 
-    except Exception as e:
-        logger.error(f"Erreur lors du découpage PDF : {e}")
-        return []
+def chunk_pages_by_tokens(pages_text: List[str], max_tokens: int) -> List[TextBlock]:
+    """
+    Regroupe paragraphes (ou phrases d'un paragraphe trop long) jusqu'à max_tokens
+    par bloc, sans couper de phrase. Une phrase plus longue que le budget (ou un texte
+    sans ponctuation : tableau, liste) est coupée sur une fenêtre de tokens :
+    aucun bloc ne dépasse max_tokens.
+    """
+    units = []  # (pages, texte, n° de paragraphe)
+    for paragraph_idx, (pages, paragraph) in enumerate(_paragraph_units(pages_text, max_tokens)):
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append((pages, paragraph, paragraph_idx))
+            continue
+        for sentence in SENTENCE_SPLIT.split(paragraph):
+            if not sentence.strip():
+                continue
+            if estimate_tokens(sentence) <= max_tokens:
+                units.append((pages, sentence, paragraph_idx))
+            else:
+                units.extend((pages, piece, paragraph_idx) for piece in split_by_token_window(sentence, max_tokens))
+
+    blocks: List[TextBlock] = []
+    current_pages, current_text, current_tokens, last_paragraph = [], "", 0, None
+    for pages, unit_text, paragraph_idx in units:
+        # Phrases d'un même paragraphe jointes par une espace, paragraphes par une ligne vide
+        separator = (" " if paragraph_idx == last_paragraph else "\n\n") if current_text else ""
+        candidate = current_text + separator + unit_text
+        candidate_tokens = estimate_tokens(candidate)
+        if current_text and candidate_tokens > max_tokens:
+            blocks.append(TextBlock(current_pages, current_text, current_tokens))
+            current_pages = []
+            candidate, candidate_tokens = unit_text, estimate_tokens(unit_text)
+        current_text, current_tokens = candidate, candidate_tokens
+        last_paragraph = paragraph_idx
+        current_pages.extend(p for p in pages if p not in current_pages)
+    if current_text:
+        blocks.append(TextBlock(current_pages, current_text, current_tokens))
+
+    return blocks
+
+def estimate_block_count(pdf_path: str, max_tokens: int) -> int:
+    """Nombre de blocs attendu (priorité du job), via l'extraction rapide PyMuPDF."""
+    return len(chunk_pages_by_tokens(extract_pages_text_pymupdf(pdf_path), max_tokens))
 
 # ---------- Extraction texte hybride ----------
 @lru_cache(maxsize=PDFConfig.CACHE_SIZE)
@@ -57,19 +141,58 @@ def extract_text_pymupdf(pdf_path: str, page_num: int) -> str:
         logger.error(f"Erreur extraction texte page {page_num}: {e}")
         return ""
 
-def extract_text_from_block(block_indices: List[int], pdf_path: str) -> str:
-    laparams = LAParams()
-    output = ""
-    for i in sorted(block_indices):
+# ---------- Extraction PDFMiner en une seule passe ----------
+def iter_pages_text(pdf_path: str, laparams: Optional[LAParams] = None) -> Iterator[str]:
+    """
+    Ouvre et parse le PDF une seule fois et renvoie le texte de chaque page,
+    dans l'ordre. Une page illisible donne une chaîne vide.
+    """
+    laparams = laparams or LAParams()
+    for page_layout in extract_pages(pdf_path, laparams=laparams):
         try:
-            text = extract_text(pdf_path, page_numbers=[i], laparams=laparams)
-            if text:
-                output += text + "\n"
+            text = "".join(
+                element.get_text() for element in page_layout
+                if isinstance(element, LTTextContainer)
+            )
+            yield text.strip()
         except Exception as e:
-            logger.warning(f"Erreur extraction PDFMiner page {i}: {e}")
-    return output.strip()
+            logger.warning(f"Erreur extraction PDFMiner page {page_layout.pageid}: {e}")
+            yield ""
+
+def extract_pages_text(pdf_path: str) -> List[str]:
+    """
+    Texte de toutes les pages (index = numéro de page), extrait en une passe.
+    Sert à la fois au texte complet et au texte des blocs.
+    """
+    try:
+        return list(iter_pages_text(pdf_path))
+    except Exception as e:
+        logger.error(f"Erreur extraction pages PDF : {e}")
+        return []
+
+def join_pages_text(pages_text: List[str], page_indices: Optional[List[int]] = None) -> str:
+    """
+    Reconstruit un texte à partir des pages déjà extraites
+    (toutes les pages si page_indices est None).
+    """
+    if page_indices is None:
+        page_indices = range(len(pages_text))
+    parts = [pages_text[i] for i in sorted(page_indices) if 0 <= i < len(pages_text) and pages_text[i]]
+    return "\n".join(parts).strip()
+
+def extract_pages_text_pymupdf(pdf_path: str) -> List[str]:
+    """Texte de toutes les pages via PyMuPDF (rapide, sert d'estimation et de repli)."""
+    try:
+        with fitz.open(pdf_path) as doc:
+            return [(page.get_text("text") or "").strip() for page in doc]
+    except Exception as e:
+        logger.error(f"Erreur extraction PyMuPDF : {e}")
+        return []
+
+def extract_full_text(pdf_path: str, pages_text: Optional[List[str]] = None) -> str:
+    if pages_text is not None:
+        return join_pages_text(pages_text)
 
-def extract_full_text(pdf_path: str) -> str:
     laparams = LAParams()
     try:
         text = extract_text(pdf_path, laparams=laparams)
@@ -0,0 +1,139 @@
+import queue
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, List, Sequence, Tuple
+
+# Re-ranking croisé mutualisé entre requêtes : les paires (question, bloc) des requêtes
+# concurrentes sont regroupées pendant quelques millisecondes puis scorées en un seul
+# predict du CrossEncoder (un seul thread appelle le modèle). Les scores sont gardés
+# dans un LRU par (hash de la question, hash du texte du bloc).
+
+logger = logging.getLogger(__name__)
+
+RERANK_BATCH_WINDOW = 0.004   # secondes d'attente max pour compléter un lot
+RERANK_MAX_BATCH = 64         # paires max par predict
+RERANK_CACHE_SIZE = 20000     # scores (question, bloc) gardés en mémoire
+
+PairKey = Tuple[str, str]
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class _Request:
+    def __init__(self, keys: List[PairKey], pairs: List[Tuple[str, str]]):
+        self.keys = keys
+        self.pairs = pairs
+        self.future = Future()
+
+
+class RerankBatcher:
+    def __init__(self, predict_fn: Callable, window: float = RERANK_BATCH_WINDOW,
+                 max_batch: int = RERANK_MAX_BATCH, cache_size: int = RERANK_CACHE_SIZE):
+        self.predict_fn = predict_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._queue = queue.Queue()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stats = {"requests": 0, "pairs": 0, "cache_hits": 0, "batches": 0, "batched_pairs": 0, "largest_batch": 0}
+
+    def score(self, question: str, texts: Sequence[str]) -> List[float]:
+        """Scores CrossEncoder de (question, texte) pour chaque texte, dans l'ordre donné."""
+        if not texts:
+            return []
+        question_hash = _hash(question)
+        keys = [(question_hash, _hash(text)) for text in texts]
+        scores = [None] * len(texts)
+        missing = []
+        with self._cache_lock:
+            self._stats["requests"] += 1
+            self._stats["pairs"] += len(texts)
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    scores[i] = cached
+            self._stats["cache_hits"] += len(texts) - len(missing)
+
+        if missing:
+            request = _Request([keys[i] for i in missing], [(question, texts[i]) for i in missing])
+            self._ensure_thread()
+            self._queue.put(request)
+            for i, score in zip(missing, request.future.result()):
+                scores[i] = score
+        return scores
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[_Request]:
+        """Premier lot en attente, complété pendant `window` secondes ou jusqu'à `max_batch` paires."""
+        batch = [self._queue.get()]
+        size = len(batch[0].pairs)
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.pairs)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Paires identiques entre requêtes (même question, même bloc) scorées une seule fois
+            unique = OrderedDict()
+            for request in batch:
+                for key, pair in zip(request.keys, request.pairs):
+                    unique.setdefault(key, pair)
+
+            try:
+                raw_scores = self.predict_fn(list(unique.values()))
+                by_key = {key: float(score) for key, score in zip(unique, raw_scores)}
+            except Exception as e:
+                logger.error(f"Erreur re-ranking (lot de {len(unique)} paires) : {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            with self._cache_lock:
+                self._stats["batches"] += 1
+                self._stats["batched_pairs"] += len(unique)
+                self._stats["largest_batch"] = max(self._stats["largest_batch"], len(unique))
+                for key, score in by_key.items():
+                    self._cache[key] = score
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+            if len(batch) > 1:
+                logger.debug(f"🔀 Re-ranking groupé : {len(batch)} requêtes, {len(unique)} paires")
+            for request in batch:
+                request.future.set_result([by_key[key] for key in request.keys])
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            stats = dict(self._stats, cached_scores=len(self._cache), queued=self._queue.qsize())
+        stats["avg_batch"] = round(stats["batched_pairs"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
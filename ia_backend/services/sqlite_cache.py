@@ -0,0 +1,57 @@
+import sqlite3
+import logging
+from typing import List
+
+# Utilitaires communs aux caches SQLite partagés web/worker (résumés de blocs, réponses LLM) :
+# connexion avec timeout, création du schéma en WAL, éviction LRU par taille.
+
+logger = logging.getLogger(__name__)
+
+SQLITE_TIMEOUT = 10  # secondes d'attente sur un verrou (threads et process concurrents)
+
+
+def connect(db_path) -> sqlite3.Connection:
+    return sqlite3.connect(db_path, timeout=SQLITE_TIMEOUT)
+
+
+def init_schema(db_path, statements: List[str], label: str) -> bool:
+    """
+    Crée tables/index (instructions idempotentes) en mode WAL. Un disque indisponible
+    n'empêche pas l'import du module : le cache fonctionne alors en échec silencieux.
+    """
+    try:
+        with connect(db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in statements:
+                conn.execute(statement)
+            conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.warning(f"{label} indisponible : {e}")
+        return False
+
+
+def add_column_if_missing(db_path, table: str, column: str, definition: str, label: str):
+    """Migration légère d'un cache existant (colonne ajoutée avec sa valeur par défaut)."""
+    try:
+        with connect(db_path) as conn:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"{label} : migration de {table}.{column} impossible : {e}")
+
+
+def evict_lru(conn: sqlite3.Connection, table: str, max_entries: int) -> int:
+    """Supprime les entrées au dernier accès le plus ancien au-delà de max_entries ; retourne leur nombre."""
+    total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    overflow = total - max_entries
+    if overflow <= 0:
+        return 0
+    conn.execute(f"""
+    DELETE FROM {table} WHERE cache_key IN (
+        SELECT cache_key FROM {table} ORDER BY last_access ASC LIMIT ?
+    )
+    """, (overflow,))
+    return overflow
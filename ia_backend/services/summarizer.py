@@ -1,9 +1,16 @@
-from .ollama_gateway import generate_ollama
-from bert_score import score as bert_score
+from .ollama_gateway import generate_ollama, get_num_ctx, LLMUnavailableError, PRIORITY_BATCH
+from .token_budget import context_budget, MERGE_SEPARATOR
+from .llm_telemetry import CALLER_BLOCK, CALLER_INTERMEDIATE, CALLER_FINAL, CALLER_IMPROVE, CALLER_ENRICHMENT
+from bert_score import BERTScorer
 from keybert import KeyBERT
-from typing import List, Optional
+from functools import lru_cache
+from typing import List, Optional, Tuple
 import numpy as np
+import hashlib
+import json
+import re
 import logging
+import threading
 import time
 
 # Initialisation du logger
@@ -18,6 +25,23 @@ KEYWORD_WEIGHT = 0.3
 FULL_WEIGHT = 0.6
 PARTIAL_WEIGHT = 0.4
 MIN_TEXT_LENGTH = 50
+BERTSCORE_MODEL = "distilbert-base-multilingual-cased"
+BERTSCORE_BATCH_SIZE = 16
+BERTSCORE_BATCH_WINDOW = 0.01  # secondes d'attente pour regrouper les scores demandés par les threads concurrents
+
+BLOCK_MODEL = "mistral:instruct"
+BLOCK_NUM_PREDICT = 650
+BLOCK_PROMPT_MARGIN = 150  # marge de sécurité sur l'estimation de tokens
+INTERMEDIATE_NUM_PREDICT = 1200
+FINAL_NUM_PREDICT = 1500
+# Fenêtre de contexte : get_num_ctx(modèle) (MODEL_NUM_CTX de la passerelle), partagée avec le
+# préchargement et le chemin ask ; les budgets de tokens ci-dessous en sont dérivés.
+
+# Modèles de fusion. SINGLE_MERGE_MODEL=True : la fusion finale reste sur le modèle
+# intermédiaire (= modèle bloc), donc aucun changement de modèle côté Ollama pendant un job.
+INTERMEDIATE_MODEL = "mistral:instruct"
+FINAL_MODEL = "mistral"
+SINGLE_MERGE_MODEL = False
 
 # --------- Prompt Templates ---------
 BLOCK_PROMPT = """[INST] Tu es un expert en synthèse de documents techniques. Rédige un résumé concis en français qui :
@@ -34,6 +58,9 @@ Texte à résumer :
 {text}
 [/INST]"""
 
+# Version du prompt bloc (dérivée du texte) : toute modification invalide le cache de résumés
+BLOCK_PROMPT_VERSION = hashlib.sha256(BLOCK_PROMPT.encode("utf-8")).hexdigest()[:12]
+
 INTERMEDIATE_PROMPT = """[INST] Tu es un expert en fusion de résumés techniques. Combine ces extraits en :
 1. Éliminant les redondances
 2. Structurant par thématique
@@ -56,8 +83,50 @@ Voici les résumés intermédiaires à synthétiser :
 {text}
 [/INST]"""
 
+ENRICHMENT_PROMPT = """[INST] Tu analyses le résumé d'un document professionnel.
+Donne les 5 mots-clés les plus importants et les grands thèmes abordés (3 à 5).
+Réponds UNIQUEMENT en JSON valide, sans texte autour :
+{{"mots_cles": ["...", "..."], "themes": ["...", "..."]}}
+
+Résumé du document :
+{text}
+[/INST]"""
+ENRICHMENT_NUM_PREDICT = 200
+MAX_KEYWORDS = 5
+MAX_THEMES = 5
+
+# --------- Budget de tokens par bloc ---------
+def get_block_token_budget(model: str = BLOCK_MODEL) -> int:
+    """
+    Tokens de texte source qu'un bloc peut contenir pour `model` :
+    fenêtre de contexte - prompt - génération - marge.
+    """
+    num_ctx = get_num_ctx(model)
+    return context_budget(num_ctx, BLOCK_PROMPT, BLOCK_NUM_PREDICT, BLOCK_PROMPT_MARGIN)
+
+def get_merge_num_ctx(is_final: bool = False) -> int:
+    return get_num_ctx(get_merge_model(is_final))
+
+def get_merge_token_budget(is_final: bool = False) -> int:
+    """Tokens de résumés qu'une fusion (intermédiaire ou finale) peut recevoir, calculé comme pour les blocs."""
+    return context_budget(
+        get_merge_num_ctx(is_final),
+        FINAL_PROMPT if is_final else INTERMEDIATE_PROMPT,
+        FINAL_NUM_PREDICT if is_final else INTERMEDIATE_NUM_PREDICT,
+        BLOCK_PROMPT_MARGIN
+    )
+
+def get_merge_model(is_final: bool = False) -> str:
+    if is_final and not SINGLE_MERGE_MODEL:
+        return FINAL_MODEL
+    return INTERMEDIATE_MODEL
+
+def get_batch_models() -> List[str]:
+    """Modèles du pipeline de résumé (blocs, fusions), à précharger avec leur num_ctx."""
+    return list(dict.fromkeys((BLOCK_MODEL, get_merge_model(False), get_merge_model(True))))
+
 # --------- Résumés Bloc ---------
-def summarize_block(text: str) -> str:
+def summarize_block(text: str, tenant: Optional[str] = None) -> str:
     try:
         if not text or len(text.split()) < MIN_TEXT_LENGTH:
             logger.warning(f"Texte trop court ou vide - {len(text.split())} mots")
@@ -70,9 +139,13 @@ def summarize_block(text: str) -> str:
 
         result = generate_ollama(
             prompt=BLOCK_PROMPT.format(text=text),
-            num_predict=650,
-            models=["mistral:instruct"],
-            temperature=0.3
+            num_predict=BLOCK_NUM_PREDICT,
+            models=[BLOCK_MODEL],
+            temperature=0.3,
+            num_ctx=get_num_ctx(BLOCK_MODEL),
+            priority=PRIORITY_BATCH,
+            tenant=tenant,
+            caller=CALLER_BLOCK
         )
 
         if not result or not isinstance(result, str):
@@ -85,6 +158,8 @@ def summarize_block(text: str) -> str:
         logger.info(f"Résumé généré en {time.time()-start_time:.2f}s - {len(result)} caractères")
         return result
 
+    except LLMUnavailableError:
+        raise  # Ollama injoignable : le job échoue vite et repart du checkpoint au retry
     except Exception as e:
         logger.error("Échec summarize_block", exc_info=True)
         return ""
@@ -105,14 +180,14 @@ def is_summary_valid(summary: str) -> bool:
     return all(checks)
 
 # --------- Fusion globale ---------
-def summarize_global(summary_list: List[str], is_final: bool = False) -> str:
+def summarize_global(summary_list: List[str], is_final: bool = False, tenant: Optional[str] = None) -> str:
     try:
         if not isinstance(summary_list, (list, tuple)):
             logger.error(f"Type invalide pour summary_list: {type(summary_list)}. Attendu: list")
             return ""
 
         safe_summary_list = [str(item) if item else "" for item in summary_list]
-        joined = "\n---\n".join(safe_summary_list)
+        joined = MERGE_SEPARATOR.join(safe_summary_list)
 
         if not joined.strip():
             logger.warning("Aucun texte valide à fusionner après conversion")
@@ -121,50 +196,237 @@ def summarize_global(summary_list: List[str], is_final: bool = False) -> str:
         prompt_template = FINAL_PROMPT if is_final else INTERMEDIATE_PROMPT
         prompt = prompt_template.format(text=joined)
 
-        model_to_use = "mistral" if is_final else "mistral:instruct"
-        num_predict = 1500 if is_final else 1200
+        model_to_use = get_merge_model(is_final)
+        num_predict = FINAL_NUM_PREDICT if is_final else INTERMEDIATE_NUM_PREDICT
         logger.info(f"Fusion de {len(safe_summary_list)} résumés - Longueur totale: {len(prompt)} caractères")
 
         result = generate_ollama(
             prompt=prompt,
             num_predict=num_predict,
             models=[model_to_use],
-            top_k=30
+            top_k=30,
+            num_ctx=get_merge_num_ctx(is_final),  # même fenêtre que le préchargement : pas de rechargement du modèle
+            priority=PRIORITY_BATCH,
+            tenant=tenant,
+            caller=CALLER_FINAL if is_final else CALLER_INTERMEDIATE
         )
 
         return result if result else ""
 
+    except LLMUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Erreur critique dans summarize_global: {str(e)}", exc_info=True)
         return ""
 
+# --------- Mots-clés et thèmes (enrichissement) ---------
+JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+LABELLED_LINE = re.compile(r"^\W*(mots[- ]cl[ée]s|th[èe]mes)\W*:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+def _clean_terms(values, limit: int) -> List[str]:
+    """Liste normalisée : chaînes nettoyées, sans doublon (casse ignorée), ordre conservé."""
+    if isinstance(values, str):
+        values = re.split(r"[,;\n]", values)
+    if not isinstance(values, (list, tuple)):
+        return []
+    terms, seen = [], set()
+    for value in values:
+        term = str(value).strip().strip("-•*\"'. ").strip()
+        if term and term.lower() not in seen:
+            seen.add(term.lower())
+            terms.append(term)
+    return terms[:limit]
+
+def parse_keywords_themes(raw: str) -> Tuple[List[str], List[str]]:
+    """
+    Parse déterministe de la réponse d'enrichissement : objet JSON
+    {"mots_cles": [...], "themes": [...]} ; à défaut, lignes « Mots-clés : a, b » / « Thèmes : ... ».
+    """
+    if not raw:
+        return [], []
+
+    match = JSON_OBJECT.search(raw)
+    if match:
+        try:
+            data = json.loads(match.group(0))
+            if isinstance(data, dict):
+                keywords = data.get("mots_cles", data.get("mots-clés", data.get("keywords", [])))
+                themes = data.get("themes", data.get("thèmes", []))
+                return _clean_terms(keywords, MAX_KEYWORDS), _clean_terms(themes, MAX_THEMES)
+        except json.JSONDecodeError:
+            pass
+
+    keywords, themes = [], []
+    for label, values in LABELLED_LINE.findall(raw):
+        if label.lower().startswith("mots"):
+            keywords = _clean_terms(values, MAX_KEYWORDS)
+        else:
+            themes = _clean_terms(values, MAX_THEMES)
+    return keywords, themes
+
+def extract_keywords_themes(summary: str, tenant: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """Mots-clés et thèmes du résumé final en un seul appel LLM à sortie JSON."""
+    try:
+        raw = generate_ollama(
+            prompt=ENRICHMENT_PROMPT.format(text=summary),
+            num_predict=ENRICHMENT_NUM_PREDICT,
+            models=[get_merge_model(is_final=True)],  # modèle déjà chargé par la fusion finale
+            temperature=0.0,
+            num_ctx=get_merge_num_ctx(is_final=True),  # même fenêtre que la fusion finale : pas de rechargement
+            priority=PRIORITY_BATCH,
+            tenant=tenant,
+            cache=True,
+            caller=CALLER_ENRICHMENT,
+            response_format="json"
+        )
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        logger.warning(f"Erreur extraction mots-clés/thèmes : {e}")
+        return [], []
+    return parse_keywords_themes(raw)
+
 # --------- Scoring optimisé ---------
+class _ScoreRequest:
+    def __init__(self, pairs: List[Tuple[str, str]]):
+        self.pairs = pairs
+        self.scores = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchBertScorer:
+    """
+    Scorer BERTScore résident : le modèle est chargé une seule fois par process
+    et chaque appel score un lot de paires (référence, hypothèse) en une passe.
+    Les candidats de blocs arrivent déjà par lots (evaluate_summary_scores depuis process_job) ;
+    les appels concurrents restants (jobs parallèles, enrichissement) sont regroupés :
+    le premier appelant attend `window` secondes, puis score toutes les paires déposées
+    entre-temps en une seule passe (une passe à la fois).
+    """
+
+    def __init__(self, model_type: str = BERTSCORE_MODEL, lang: str = "fr", batch_size: int = BERTSCORE_BATCH_SIZE,
+                 window: float = BERTSCORE_BATCH_WINDOW):
+        self.model_type = model_type
+        self.lang = lang
+        self.batch_size = batch_size
+        self.window = window
+        self._scorer = None
+        self._lock = threading.Lock()
+        self._pending: List[_ScoreRequest] = []
+        self._pending_lock = threading.Lock()
+        self._collecting = False
+        self._run_lock = threading.Lock()
+
+    def _get_scorer(self) -> BERTScorer:
+        if self._scorer is None:
+            with self._lock:
+                if self._scorer is None:
+                    start = time.time()
+                    self._scorer = BERTScorer(model_type=self.model_type, lang=self.lang, batch_size=self.batch_size)
+                    logger.info(f"BERTScorer {self.model_type} chargé en {time.time() - start:.2f}s")
+        return self._scorer
+
+    def score_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """Retourne le F1 BERTScore de chaque paire (référence, hypothèse)."""
+        if not pairs:
+            return []
+        request = _ScoreRequest(list(pairs))
+        with self._pending_lock:
+            self._pending.append(request)
+            leader = not self._collecting
+            self._collecting = True
+
+        if leader:
+            time.sleep(self.window)
+            with self._run_lock:
+                # Tout ce qui a été déposé pendant l'attente (ou la passe précédente) part ensemble
+                with self._pending_lock:
+                    batch, self._pending = self._pending, []
+                    self._collecting = False
+                self._score_batch(batch)
+
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.scores
+
+    def _score_batch(self, batch: List[_ScoreRequest]):
+        pairs = [pair for request in batch for pair in request.pairs]
+        try:
+            P, R, F1 = self._get_scorer().score(
+                [hyp for _, hyp in pairs], [ref for ref, _ in pairs], batch_size=self.batch_size
+            )
+            values = [float(f) for f in F1]
+        except Exception as e:
+            for request in batch:
+                request.error = e
+                request.done.set()
+            return
+
+        if len(batch) > 1:
+            logger.debug(f"BERTScore groupé : {len(batch)} appels, {len(pairs)} paires en une passe")
+        offset = 0
+        for request in batch:
+            request.scores = values[offset:offset + len(request.pairs)]
+            offset += len(request.pairs)
+            request.done.set()
+
+bert_scorer = BatchBertScorer()
+
 def compute_bertscore(ref: str, hyp: str) -> float:
-    P, R, F1 = bert_score([hyp], [ref], lang="fr", model_type="distilbert-base-multilingual-cased")
-    return float(F1.mean())
+    return bert_scorer.score_pairs([(ref, hyp)])[0]
+
+@lru_cache(maxsize=256)
+def _extract_keyword_set(text: str, top_k: int = 12) -> frozenset:
+    # Les textes de référence (bloc, texte complet) sont réévalués à chaque essai : on mémorise
+    return frozenset(kw[0] for kw in kw_model.extract_keywords(text, top_n=top_k) if kw[1] > 0.2)
 
 def compute_keyword_overlap(ref: str, hyp: str, top_k: int = 12) -> float:
-    ref_kw = {kw[0] for kw in kw_model.extract_keywords(ref, top_n=top_k) if kw[1] > 0.2}
-    hyp_kw = {kw[0] for kw in kw_model.extract_keywords(hyp, top_n=top_k) if kw[1] > 0.2}
+    ref_kw = _extract_keyword_set(ref, top_k)
+    hyp_kw = _extract_keyword_set(hyp, top_k)
     return len(ref_kw & hyp_kw) / max(len(ref_kw), 1)
 
-def evaluate_summary_score(reference_text: str, summary_text: str, partial_summaries: Optional[List[str]] = None) -> float:
-    if not reference_text or not summary_text or len(summary_text.split()) < 10:
-        return 0.0
-
-    bert_full = compute_bertscore(reference_text, summary_text)
-    kw_full = compute_keyword_overlap(reference_text, summary_text)
-    score_full = (BERT_WEIGHT * bert_full) + (KEYWORD_WEIGHT * kw_full)
-
-    if partial_summaries:
-        partial_concat = "\n".join(ps for ps in partial_summaries if ps)
-        bert_partial = compute_bertscore(partial_concat, summary_text)
-        kw_partial = compute_keyword_overlap(partial_concat, summary_text)
-        score_partial = (BERT_WEIGHT * bert_partial) + (KEYWORD_WEIGHT * kw_partial)
-    else:
-        score_partial = score_full
+def evaluate_summary_scores(items: List[Tuple[str, str, Optional[List[str]]]]) -> List[float]:
+    """
+    Version lot de evaluate_summary_score : items = [(référence, résumé, résumés_partiels)].
+    Toutes les paires BERTScore (complètes et partielles) partent dans une seule passe.
+    """
+    scores = [0.0] * len(items)
+    pairs = []
+    plan = []  # (index item, position paire full, position paire partielle ou None, concat partielle)
+
+    for i, (reference_text, summary_text, partial_summaries) in enumerate(items):
+        if not reference_text or not summary_text or len(summary_text.split()) < 10:
+            continue
+        full_pos = len(pairs)
+        pairs.append((reference_text, summary_text))
+        partial_pos, partial_concat = None, None
+        if partial_summaries:
+            partial_concat = "\n".join(ps for ps in partial_summaries if ps)
+            partial_pos = len(pairs)
+            pairs.append((partial_concat, summary_text))
+        plan.append((i, full_pos, partial_pos, partial_concat))
+
+    bert_values = bert_scorer.score_pairs(pairs)
+
+    for i, full_pos, partial_pos, partial_concat in plan:
+        reference_text, summary_text, _ = items[i]
+        kw_full = compute_keyword_overlap(reference_text, summary_text)
+        score_full = (BERT_WEIGHT * bert_values[full_pos]) + (KEYWORD_WEIGHT * kw_full)
+
+        if partial_pos is not None:
+            kw_partial = compute_keyword_overlap(partial_concat, summary_text)
+            score_partial = (BERT_WEIGHT * bert_values[partial_pos]) + (KEYWORD_WEIGHT * kw_partial)
+        else:
+            score_partial = score_full
+
+        scores[i] = round((FULL_WEIGHT * score_full) + (PARTIAL_WEIGHT * score_partial), 4)
+
+    return scores
 
-    return round((FULL_WEIGHT * score_full) + (PARTIAL_WEIGHT * score_partial), 4)
+def evaluate_summary_score(reference_text: str, summary_text: str, partial_summaries: Optional[List[str]] = None) -> float:
+    return evaluate_summary_scores([(reference_text, summary_text, partial_summaries)])[0]
 
 # --------- Post-traitement amélioration ---------
 def improve_summary(original_text: str, current_summary: str) -> str:
@@ -185,7 +447,7 @@ Nouveau résumé amélioré :[/INST]"""
         prompt=prompt,
         num_predict=750,
         models=["mistral:instruct"],
-        
+        caller=CALLER_IMPROVE
     )
 
 # --------- Vérification de couverture de mots-clés ---------
@@ -0,0 +1,110 @@
+import sqlite3
+import hashlib
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Optional, Dict
+
+from .sqlite_cache import connect, init_schema, add_column_if_missing, evict_lru
+
+# Cache de résumés de blocs adressé par contenu :
+# clé = sha256(texte du bloc) + version du prompt + modèle.
+# Un même PDF sous une autre URL (ou une révision partageant des pages)
+# réutilise directement les résumés déjà produits.
+# Seuls les résumés acceptés (structurés et au-dessus du seuil) sont servis : un résumé
+# de repli médiocre n'est jamais réutilisé, le bloc sera de nouveau résumé.
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = Path(__file__).resolve().parent.parent / "block_summary_cache.db"
+MAX_ENTRIES = 20000  # au-delà, éviction LRU (dernier accès le plus ancien)
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+def get_connection():
+    """Connexion SQLite avec timeout (accès concurrent des threads de blocs)."""
+    return connect(DB_PATH)
+
+def init_cache():
+    init_schema(DB_PATH, [
+        """
+        CREATE TABLE IF NOT EXISTS block_summary_cache (
+            cache_key TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            score REAL,
+            translated INTEGER,
+            accepted INTEGER NOT NULL DEFAULT 0,
+            created_at REAL,
+            last_access REAL
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_block_cache_access ON block_summary_cache(last_access)",
+    ], "Cache résumés")
+    # Entrées antérieures au drapeau : considérées non acceptées, donc ignorées puis remplacées
+    add_column_if_missing(DB_PATH, "block_summary_cache", "accepted", "INTEGER NOT NULL DEFAULT 0", "Cache résumés")
+
+def make_cache_key(text: str, prompt_version: str, model: str) -> str:
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{text_hash}:{prompt_version}:{model}"
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+def get_cached_summary(text: str, prompt_version: str, model: str) -> Optional[Dict]:
+    """Retourne {"summary", "score", "translated"} si le bloc a déjà un résumé accepté, sinon None."""
+    key = make_cache_key(text, prompt_version, model)
+    try:
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT summary, score, translated FROM block_summary_cache WHERE cache_key = ? AND accepted = 1",
+                (key,)
+            ).fetchone()
+            if row is None:
+                _count("misses")
+                return None
+            conn.execute("UPDATE block_summary_cache SET last_access = ? WHERE cache_key = ?", (time.time(), key))
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Cache résumés indisponible (lecture) : {e}")
+        _count("misses")
+        return None
+
+    _count("hits")
+    summary, score, translated = row
+    return {"summary": summary, "score": score or 0.0, "translated": bool(translated)}
+
+def store_summary(text: str, prompt_version: str, model: str, summary: str, score: float, translated: bool):
+    """À n'appeler que pour un résumé accepté : il sera resservi tel quel pour ce texte."""
+    if not summary or not summary.strip():
+        return
+    key = make_cache_key(text, prompt_version, model)
+    now = time.time()
+    try:
+        with get_connection() as conn:
+            conn.execute("""
+            INSERT OR REPLACE INTO block_summary_cache
+            (cache_key, summary, score, translated, accepted, created_at, last_access)
+            VALUES (?, ?, ?, ?, 1, ?, ?)
+            """, (key, summary, float(score), int(bool(translated)), now, now))
+
+            overflow = evict_lru(conn, "block_summary_cache", MAX_ENTRIES)
+            if overflow:
+                with _lock:
+                    _stats["evictions"] += overflow
+            conn.commit()
+        _count("writes")
+    except sqlite3.Error as e:
+        logger.warning(f"Cache résumés indisponible (écriture) : {e}")
+
+def get_cache_stats() -> Dict:
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+# Création de la table au chargement du module
+init_cache()
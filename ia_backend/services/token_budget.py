@@ -0,0 +1,46 @@
+from typing import List
+
+# Budgets de tokens des appels Ollama (sans tokenizer) : estimation par caractères,
+# place disponible dans une fenêtre de contexte, regroupement de textes sous un budget.
+
+# Approximation prudente : le tokenizer Mistral compte ~3 caractères par token sur du français
+# (4 sous-estimait les blocs, qui dépassaient alors la fenêtre une fois la génération ajoutée)
+CHARS_PER_TOKEN = 3
+MIN_TOKEN_BUDGET = 256
+MERGE_SEPARATOR = "\n---\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation rapide du nombre de tokens d'un texte (sans tokenizer)."""
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def context_budget(num_ctx: int, prompt_template: str, num_predict: int, margin: int) -> int:
+    """
+    Tokens de texte injectable dans `prompt_template` ({text}) pour une fenêtre `num_ctx` :
+    fenêtre - prompt vide - génération - marge.
+    """
+    prompt_tokens = estimate_tokens(prompt_template.format(text=""))
+    return max(MIN_TOKEN_BUDGET, num_ctx - prompt_tokens - num_predict - margin)
+
+
+def group_by_token_budget(texts: List[str], max_tokens: int, max_size: int) -> List[List[str]]:
+    """
+    Lots consécutifs d'au plus `max_size` textes dont la concaténation (séparateur compris)
+    tient dans `max_tokens`. Un texte seul plus long que le budget forme son propre lot.
+    """
+    separator_tokens = estimate_tokens(MERGE_SEPARATOR)
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text) + (separator_tokens if current else 0)
+        if current and (len(current) >= max_size or current_tokens + tokens > max_tokens):
+            groups.append(current)
+            current, current_tokens = [], 0
+            tokens = estimate_tokens(text)
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
@@ -1,5 +1,10 @@
 from celery import shared_task
 from .job_queue import process_job, Job
+from .services.job_progress import mark_job_status, PROGRESS_RETRY, PROGRESS_FAILED
+from .services.llm_resilience import LLMUnavailableError, backoff_delay
+
+OUTAGE_RETRY_BASE = 30   # secondes : premier délai de retry quand Ollama est injoignable
+OUTAGE_RETRY_CAP = 600
 
 @shared_task(bind=True)
 def process_job_task(self, job_data):
@@ -7,6 +12,7 @@ def process_job_task(self, job_data):
     Tâche Celery IA principale (version prod scalable).
     - bind=True => accès aux retries, logs, etc.
     - Retourne directement le résumé final à Celery
+    - Un retry reprend le job là où il s'était arrêté (checkpoint par étape)
     """
     try:
         # Reconstruction de l'objet Job
@@ -23,4 +29,15 @@ def process_job_task(self, job_data):
 
     except Exception as e:
         # log d'erreur + retry automatique
-        self.retry(exc=e, countdown=10, max_retries=3)
+        job_id = job_data.get("job_id")
+        if self.request.retries >= 3:
+            mark_job_status(job_id, PROGRESS_FAILED, error=str(e))
+        else:
+            mark_job_status(job_id, PROGRESS_RETRY, error=str(e))
+
+        countdown = 10
+        if isinstance(e, LLMUnavailableError):
+            # Panne Ollama : on attend au moins la réouverture du disjoncteur, avec jitter
+            # pour que les jobs en échec ne repartent pas tous en même temps
+            countdown = e.retry_after + backoff_delay(self.request.retries, base=OUTAGE_RETRY_BASE, cap=OUTAGE_RETRY_CAP)
+        self.retry(exc=e, countdown=countdown, max_retries=3)
@@ -0,0 +1,193 @@
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from ia_backend import job_queue
+from ia_backend.job_queue import Job, plan_merge_groups, reduce_summaries, summarize_blocks
+from ia_backend.services.pdf_utils import TextBlock
+from ia_backend.services.token_budget import CHARS_PER_TOKEN, MERGE_SEPARATOR, estimate_tokens
+
+
+class FakeCheckpoint:
+    def __init__(self, done=()):
+        self.done = set(done)
+        self.stages = set()
+        self.intermediates = {}
+
+    def get_intermediate(self, idx, level=1):
+        return self.intermediates.get((level, idx))
+
+    def set_intermediate(self, idx, summary, level=1):
+        self.intermediates[(level, idx)] = summary
+
+    def is_stage_done(self, stage):
+        return stage in self.stages
+
+    def is_block_done(self, idx):
+        return idx in self.done
+
+    def mark_block_done(self, idx):
+        self.done.add(idx)
+
+
+class FakeProgress:
+    def __init__(self):
+        self.blocks_done = 0
+
+    def start_blocks(self, total, already_done=0):
+        self.blocks_done = already_done
+
+    def block_done(self, computed=True):
+        self.blocks_done += 1
+
+    def set_stage(self, stage, total=0, level=None):
+        pass
+
+    def step_done(self):
+        pass
+
+
+class FakeLLM:
+    """summarize_block simulé : `good_at[texte]` = numéro d'essai qui produit un résumé acceptable."""
+
+    def __init__(self, good_at=None, fail_on=None):
+        self.good_at = good_at or {}
+        self.fail_on = fail_on
+        self.attempts = {}
+        self._lock = threading.Lock()
+
+    def summarize_block(self, text, tenant=None):
+        if text == self.fail_on:
+            raise RuntimeError("LLM en panne")
+        with self._lock:
+            attempt = self.attempts[text] = self.attempts.get(text, 0) + 1
+        quality = "ok" if attempt == self.good_at.get(text, 1) else "ko"
+        return f"{quality} {text} essai {attempt}"
+
+
+def make_blocks(count):
+    return [TextBlock(pages=[i], text=f"bloc{i}", tokens=10) for i in range(count)]
+
+
+class SummarizeBlocksTests(TestCase):
+    def run_blocks(self, blocks, llm, done=(), saved_json=None, max_inflight=3):
+        self.written = []
+        self.score_batches = []
+        saved_json = saved_json or {}
+
+        def save_block_batch(job, json_dir, pending_blocks, checkpoint):
+            for idx, _, summary, _, _ in pending_blocks:
+                self.written.append((idx, summary))
+                checkpoint.mark_block_done(idx)
+
+        def evaluate_summary_scores(items):
+            self.score_batches.append(len(items))
+            return [0.9 if summary.startswith("ok") else 0.1 + 0.01 * len(summary) for _, summary, _ in items]
+
+        job = Job(1, "job-test", "Entreprise_Test", "doc.pdf", "http://doc.pdf", "doc")
+        self.progress = FakeProgress()
+        with patch.object(job_queue, "summarize_block", llm.summarize_block), \
+                patch.object(job_queue, "process_text_block", lambda text: (text, False)), \
+                patch.object(job_queue, "is_summary_valid", lambda summary: summary.startswith("ok")), \
+                patch.object(job_queue, "evaluate_summary_scores", evaluate_summary_scores), \
+                patch.object(job_queue, "save_block_batch", save_block_batch), \
+                patch.object(job_queue, "get_cached_summary", lambda *args: None), \
+                patch.object(job_queue, "store_summary", lambda *args: None), \
+                patch.object(job_queue, "load_json", lambda json_dir, idx: saved_json.get(idx)):
+            return summarize_blocks(job, blocks, "json", FakeCheckpoint(done), self.progress, max_inflight=max_inflight)
+
+    def test_blocks_are_written_in_order(self):
+        summaries = self.run_blocks(make_blocks(40), FakeLLM())
+        self.assertEqual([n for n, _ in summaries], list(range(1, 41)))
+        self.assertEqual([idx for idx, _ in self.written], list(range(40)))
+        self.assertEqual(self.progress.blocks_done, 40)
+
+    def test_candidates_are_scored_in_batches(self):
+        self.run_blocks(make_blocks(40), FakeLLM())
+        self.assertEqual(sum(self.score_batches), 40)
+        self.assertGreaterEqual(max(self.score_batches), job_queue.BLOCK_SCORE_BATCH_SIZE)
+
+    def test_rejected_block_is_retried_until_accepted(self):
+        llm = FakeLLM(good_at={"bloc1": 3})
+        summaries = dict(self.run_blocks(make_blocks(3), llm))
+        self.assertEqual(llm.attempts["bloc1"], 3)
+        self.assertEqual(summaries[2], "ok bloc1 essai 3")
+        self.assertEqual(llm.attempts["bloc0"], 1)
+
+    def test_best_attempt_is_kept_when_none_is_accepted(self):
+        llm = FakeLLM(good_at={"bloc0": 99})
+        summaries = dict(self.run_blocks(make_blocks(1), llm))
+        self.assertEqual(llm.attempts["bloc0"], job_queue.MAX_ATTEMPTS)
+        self.assertTrue(summaries[1].startswith("ko bloc0"))
+
+    def test_resumed_blocks_are_not_recomputed(self):
+        llm = FakeLLM()
+        saved = {0: {"summary": "repris 0"}, 1: {"summary": "repris 1"}}
+        summaries = self.run_blocks(make_blocks(4), llm, done={0, 1}, saved_json=saved)
+        self.assertEqual(summaries[:2], [(1, "repris 0"), (2, "repris 1")])
+        self.assertNotIn("bloc0", llm.attempts)
+        self.assertEqual([idx for idx, _ in self.written], [2, 3])
+
+    def test_failure_keeps_finished_blocks_and_reraises(self):
+        llm = FakeLLM(fail_on="bloc5")
+        with self.assertRaises(RuntimeError):
+            self.run_blocks(make_blocks(30), llm, max_inflight=1)
+        written = [idx for idx, _ in self.written]
+        self.assertEqual(written, list(range(5)))
+        self.assertNotIn("bloc29", llm.attempts)  # blocs en file abandonnés
+
+
+def text_of(tokens: int) -> str:
+    return "x" * (tokens * CHARS_PER_TOKEN)
+
+
+class ReduceSummariesTests(TestCase):
+    """Arbre de fusion réel (reduce_summaries), fusions LLM simulées."""
+
+    def reduce(self, count, summary_tokens, merged_tokens, group_budget, final_budget, checkpoint=None):
+        self.merged_groups = []
+
+        def merge_group(job, level, group_idx, group):
+            self.merged_groups.append((level, len(group), estimate_tokens(MERGE_SEPARATOR.join(group))))
+            return text_of(merged_tokens)
+
+        budgets = {False: group_budget, True: final_budget}
+        job = Job(1, "job-test", "Entreprise_Test", "doc.pdf", "http://doc.pdf", "doc")
+        with patch.object(job_queue, "merge_group", merge_group), \
+                patch.object(job_queue, "get_merge_token_budget", lambda is_final: budgets[is_final]):
+            return reduce_summaries(job, [text_of(summary_tokens)] * count, checkpoint or FakeCheckpoint(), FakeProgress())
+
+    def test_final_input_fits_final_budget(self):
+        current = self.reduce(200, summary_tokens=600, merged_tokens=1200, group_budget=2600, final_budget=6400)
+        self.assertLessEqual(estimate_tokens(MERGE_SEPARATOR.join(current)), 6400)
+        self.assertLessEqual(max(level for level, _, _ in self.merged_groups), 5)
+        for _, _, tokens in self.merged_groups:
+            self.assertLessEqual(tokens, 2600)
+
+    def test_small_document_goes_straight_to_final_merge(self):
+        summaries = self.reduce(3, summary_tokens=600, merged_tokens=1200, group_budget=2600, final_budget=6400)
+        self.assertEqual(self.merged_groups, [])
+        self.assertEqual(len(summaries), 3)
+
+    def test_single_summary_is_not_merged(self):
+        self.assertEqual(len(self.reduce(1, 9000, 1200, 2600, 6400)), 1)
+        self.assertEqual(self.merged_groups, [])
+
+    def test_checkpointed_groups_are_reused(self):
+        checkpoint = FakeCheckpoint()
+        checkpoint.intermediates[(1, 0)] = text_of(1200)
+        self.reduce(20, summary_tokens=600, merged_tokens=1200, group_budget=2600, final_budget=6400,
+                    checkpoint=checkpoint)
+        level_1 = [g for g in self.merged_groups if g[0] == 1]
+        self.assertEqual(len(level_1), 20 // 4 - 1)
+
+
+class PlanMergeGroupsTests(TestCase):
+    def test_groups_respect_budget(self):
+        groups = plan_merge_groups([text_of(500)] * 12, max_tokens=1600)
+        self.assertEqual(sum(len(g) for g in groups), 12)
+        self.assertTrue(all(estimate_tokens(MERGE_SEPARATOR.join(g)) <= 1600 for g in groups))
+
+    def test_oversized_summaries_are_merged_in_pairs(self):
+        groups = plan_merge_groups([text_of(3000)] * 5, max_tokens=1600)
+        self.assertEqual([len(g) for g in groups], [2, 2, 1])
@@ -0,0 +1,166 @@
+from unittest import TestCase
+
+from ia_backend.services.llm_resilience import (
+    AdaptiveTimeout,
+    CircuitBreaker,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    TIMEOUT_MIN_SAMPLES,
+)
+
+
+class ServiceDown(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+def is_failure(exc):
+    return isinstance(exc, ServiceDown)
+
+
+def fail(breaker, exc_type=ServiceDown):
+    try:
+        with breaker.call(is_failure):
+            raise exc_type("échec")
+    except exc_type:
+        pass
+
+
+def succeed(breaker):
+    with breaker.call(is_failure):
+        pass
+
+
+def abandoned_stream(breaker):
+    with breaker.call(is_failure):
+        yield "fragment"
+        yield "suite"
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        fail(breaker)
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=3, open_seconds=60)
+        open_breaker(breaker)
+        self.assertEqual(breaker.state, STATE_OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertGreater(breaker.retry_after(), 0)
+
+    def test_success_resets_failure_count(self):
+        breaker = CircuitBreaker("test", failure_threshold=3)
+        fail(breaker)
+        fail(breaker)
+        succeed(breaker)
+        fail(breaker)
+        self.assertEqual(breaker.state, STATE_CLOSED)
+
+    def test_single_probe_then_close(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, open_seconds=0)
+        open_breaker(breaker)
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        self.assertFalse(breaker.allow())  # une seule sonde à la fois
+
+        succeed(breaker)
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_probe_reopens_longer(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, open_seconds=10)
+        open_breaker(breaker)
+        breaker.opened_at -= 10  # délai d'ouverture écoulé
+        self.assertTrue(breaker.allow())
+        fail(breaker)
+        self.assertEqual(breaker.state, STATE_OPEN)
+        self.assertEqual(breaker.open_seconds, 20)
+        self.assertFalse(breaker.probe_inflight)
+
+    def test_client_errors_do_not_count(self):
+        breaker = CircuitBreaker("test", failure_threshold=2)
+        for _ in range(5):
+            fail(breaker, BadRequest)
+        self.assertEqual(breaker.state, STATE_CLOSED)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_client_error_releases_probe(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, open_seconds=0)
+        open_breaker(breaker)
+        self.assertTrue(breaker.allow())
+        fail(breaker, BadRequest)
+        self.assertEqual(breaker.state, STATE_HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+    def test_abandoned_probe_is_released(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, open_seconds=0)
+        open_breaker(breaker)
+        self.assertTrue(breaker.allow())
+
+        stream = abandoned_stream(breaker)
+        next(stream)
+        stream.close()  # GeneratorExit : le consommateur abandonne le flux
+
+        self.assertFalse(breaker.probe_inflight)
+        self.assertEqual(breaker.state, STATE_OPEN)
+        self.assertEqual(breaker.snapshot()["abandoned"], 1)
+
+    def test_abandoned_call_while_closed_is_not_a_failure(self):
+        breaker = CircuitBreaker("test", failure_threshold=1)
+        stream = abandoned_stream(breaker)
+        next(stream)
+        stream.close()
+        self.assertEqual(breaker.state, STATE_CLOSED)
+
+    def test_stale_probe_is_replaced(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, open_seconds=0, probe_timeout=0)
+        open_breaker(breaker)
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())  # sonde précédente sans verdict au-delà du délai
+
+
+class AdaptiveTimeoutTests(TestCase):
+    def trained(self, latency=20.0):
+        timeouts = AdaptiveTimeout(default=600.0)
+        for _ in range(TIMEOUT_MIN_SAMPLES):
+            timeouts.observe("m:800", latency)
+        return timeouts
+
+    def test_default_until_enough_samples(self):
+        timeouts = AdaptiveTimeout(default=600.0)
+        timeouts.observe("m:800", 10.0)
+        self.assertEqual(timeouts.timeout("m:800"), 600.0)
+
+    def test_learns_from_latencies(self):
+        self.assertLess(self.trained().timeout("m:800"), 600.0)
+
+    def test_timeout_doubles_until_next_response(self):
+        timeouts = self.trained()
+        base = timeouts.timeout("m:800")
+
+        timeouts.record_timeout("m:800")
+        self.assertAlmostEqual(timeouts.timeout("m:800"), base * 2)
+        timeouts.record_timeout("m:800")
+        self.assertAlmostEqual(timeouts.timeout("m:800"), base * 4)
+
+        timeouts.observe("m:800", 20.0)
+        self.assertAlmostEqual(timeouts.timeout("m:800"), base, delta=1.0)
+
+    def test_backoff_is_capped_by_ceiling(self):
+        timeouts = self.trained()
+        for _ in range(10):
+            timeouts.record_timeout("m:800")
+        self.assertLessEqual(timeouts.timeout("m:800"), 600.0)
+
+    def test_timeout_on_unknown_key_is_ignored(self):
+        timeouts = AdaptiveTimeout(default=600.0)
+        timeouts.record_timeout("inconnu")
+        self.assertEqual(timeouts.timeout("inconnu"), 600.0)
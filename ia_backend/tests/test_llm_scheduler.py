@@ -0,0 +1,141 @@
+import threading
+from unittest import TestCase
+
+from ia_backend.services.llm_scheduler import (
+    LLMScheduler,
+    PRIORITY_BATCH,
+    PRIORITY_CLASSIFICATION,
+    PRIORITY_INTERACTIVE,
+)
+
+
+class FakePressure:
+    """Compteur de pression sans Redis ; vérifie qu'il n'est jamais lu sous le verrou."""
+
+    def __init__(self, scheduler=None, value=0):
+        self.scheduler = scheduler
+        self.current = value
+        self.read_under_lock = False
+
+    def value(self):
+        if self.scheduler is not None and self.scheduler._lock.locked():
+            self.read_under_lock = True
+        return self.current
+
+    def incr(self):
+        pass
+
+    def decr(self):
+        pass
+
+
+def make_scheduler(max_inflight=2, model_limits=None, reserved=1, pressure=0):
+    scheduler = LLMScheduler(max_inflight=max_inflight, model_limits=model_limits or {"m": 10}, reserved_interactive=reserved)
+    scheduler.pressure = FakePressure(scheduler, pressure)
+    return scheduler
+
+
+class PendingAcquire:
+    """acquire() lancé dans un thread : `granted` passe à True quand le slot est obtenu."""
+
+    def __init__(self, scheduler, model="m", priority=PRIORITY_BATCH, tenant=None):
+        self.granted = threading.Event()
+
+        def run():
+            scheduler.acquire(model, priority, tenant)
+            self.granted.set()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+    def wait(self, timeout=1.0):
+        return self.granted.wait(timeout)
+
+
+class SchedulerAdmissionTests(TestCase):
+    def test_global_cap(self):
+        scheduler = make_scheduler(max_inflight=2, reserved=0)
+        scheduler.acquire("m", PRIORITY_INTERACTIVE)
+        scheduler.acquire("m", PRIORITY_INTERACTIVE)
+
+        pending = PendingAcquire(scheduler, priority=PRIORITY_INTERACTIVE)
+        self.assertFalse(pending.wait(0.2))
+
+        scheduler.release("m", PRIORITY_INTERACTIVE)
+        self.assertTrue(pending.wait())
+
+    def test_model_cap(self):
+        scheduler = make_scheduler(max_inflight=4, model_limits={"a": 1, "b": 1}, reserved=0)
+        scheduler.acquire("a", PRIORITY_BATCH)
+
+        blocked = PendingAcquire(scheduler, model="a")
+        other_model = PendingAcquire(scheduler, model="b")
+        self.assertTrue(other_model.wait())
+        self.assertFalse(blocked.wait(0.2))
+
+        scheduler.release("a", PRIORITY_BATCH)
+        self.assertTrue(blocked.wait())
+
+    def test_reserved_interactive_slot(self):
+        scheduler = make_scheduler(max_inflight=2, reserved=1)
+        scheduler.acquire("m", PRIORITY_BATCH)
+
+        batch = PendingAcquire(scheduler, priority=PRIORITY_BATCH)
+        self.assertFalse(batch.wait(0.2))  # le dernier slot est réservé à l'interactif
+
+        interactive = PendingAcquire(scheduler, priority=PRIORITY_INTERACTIVE)
+        self.assertTrue(interactive.wait())
+
+    def test_priority_order_on_release(self):
+        scheduler = make_scheduler(max_inflight=1, reserved=0)
+        scheduler.acquire("m", PRIORITY_BATCH)
+
+        batch = PendingAcquire(scheduler, priority=PRIORITY_BATCH)
+        classification = PendingAcquire(scheduler, priority=PRIORITY_CLASSIFICATION)
+        self.assertFalse(batch.wait(0.1))
+        self.assertFalse(classification.wait(0.1))
+
+        scheduler.release("m", PRIORITY_BATCH)
+        self.assertTrue(classification.wait())
+        self.assertFalse(batch.wait(0.1))
+
+    def test_fair_share_between_tenants(self):
+        scheduler = make_scheduler(max_inflight=2, reserved=0)
+        scheduler.acquire("m", PRIORITY_BATCH, tenant="a")
+        scheduler.acquire("m", PRIORITY_BATCH, tenant="a")
+
+        same_tenant = PendingAcquire(scheduler, tenant="a")
+        self.assertFalse(same_tenant.wait(0.1))
+        other_tenant = PendingAcquire(scheduler, tenant="b")
+        self.assertFalse(other_tenant.wait(0.1))
+
+        scheduler.release("m", PRIORITY_BATCH, tenant="a")
+        self.assertTrue(other_tenant.wait())  # tenant le moins servi d'abord, malgré l'ordre d'arrivée
+        self.assertFalse(same_tenant.wait(0.1))
+
+    def test_external_pressure_limits_batch(self):
+        scheduler = make_scheduler(max_inflight=4, reserved=0, pressure=1)
+        scheduler.acquire("m", PRIORITY_BATCH)
+
+        batch = PendingAcquire(scheduler, priority=PRIORITY_BATCH)
+        self.assertFalse(batch.wait(0.2))
+
+        scheduler.pressure.current = 0
+        self.assertTrue(batch.wait(2.0))  # ré-évalué au prochain tour de DISPATCH_POLL
+
+    def test_pressure_is_never_read_under_lock(self):
+        scheduler = make_scheduler(max_inflight=2, reserved=1)
+        scheduler.acquire("m", PRIORITY_BATCH)
+        pending = PendingAcquire(scheduler, priority=PRIORITY_BATCH)
+        self.assertFalse(pending.wait(0.6))
+        scheduler.release("m", PRIORITY_BATCH)
+        self.assertTrue(pending.wait())
+        scheduler.metrics()
+        self.assertFalse(scheduler.pressure.read_under_lock)
+
+    def test_slot_releases_on_error(self):
+        scheduler = make_scheduler(max_inflight=1, reserved=0)
+        with self.assertRaises(RuntimeError):
+            with scheduler.slot("m", PRIORITY_INTERACTIVE):
+                raise RuntimeError("échec appel")
+        self.assertEqual(scheduler.metrics()["inflight"], 0)
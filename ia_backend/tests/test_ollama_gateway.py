@@ -0,0 +1,140 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+import requests
+
+from ia_backend.services import ollama_gateway
+from ia_backend.services.llm_resilience import CircuitBreaker, LLMUnavailableError
+from ia_backend.services.llm_scheduler import LLMScheduler
+
+
+class FakePressure:
+    def value(self):
+        return 0
+
+    def incr(self):
+        pass
+
+    def decr(self):
+        pass
+
+
+class FakeCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.entries[key] = value
+
+
+class FakeResponse:
+    def __init__(self, data, status=200):
+        self.data = data
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """Rejoue `answers` : texte de réponse, code HTTP d'erreur ou exception de transport."""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = 0
+        self.payloads = []
+
+    def post(self, url, json=None, timeout=None):
+        self.calls += 1
+        self.payloads.append(json)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        if isinstance(answer, int):
+            return FakeResponse({"error": "requête refusée"}, status=answer)
+        return FakeResponse({"response": answer})
+
+
+class GatewayTestCase(TestCase):
+    def setUp(self):
+        self.scheduler = LLMScheduler(max_inflight=1, model_limits={"m": 1}, reserved_interactive=0)
+        self.scheduler.pressure = FakePressure()
+        self.cache = FakeCache()
+        self.breaker = CircuitBreaker("test", failure_threshold=5)
+        patches = [
+            patch.object(ollama_gateway, "scheduler", self.scheduler),
+            patch.object(ollama_gateway, "response_cache", self.cache),
+            patch.object(ollama_gateway, "get_breaker", lambda base_url, model: self.breaker),
+            patch.object(ollama_gateway, "backoff_delay", lambda attempt: 0),
+            patch.object(ollama_gateway.telemetry, "record", lambda *args, **kwargs: None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def generate(self, session, **kwargs):
+        with patch.object(ollama_gateway, "get_session", lambda: session):
+            return ollama_gateway.generate_ollama("prompt", models=["m"], **kwargs)
+
+
+class GenerateCacheTests(GatewayTestCase):
+    def generate(self, session, **kwargs):
+        return super().generate(session, cache=True, **kwargs)
+
+    def test_response_is_cached(self):
+        session = FakeSession(["réponse"])
+        self.assertEqual(self.generate(session), "réponse")
+        self.assertEqual(self.generate(session), "réponse")
+        self.assertEqual(session.calls, 1)
+
+    def test_rejected_response_is_not_cached(self):
+        session = FakeSession(["pas du json", '{"type": "générale"}'])
+        is_json = lambda text: text.startswith("{")
+        self.assertEqual(self.generate(session, cache_validator=is_json), "pas du json")
+        self.assertEqual(self.cache.entries, {})
+        self.assertEqual(self.generate(session, cache_validator=is_json), '{"type": "générale"}')
+        self.assertEqual(session.calls, 2)
+        self.assertEqual(list(self.cache.entries.values()), ['{"type": "générale"}'])
+
+
+class GenerateErrorTests(GatewayTestCase):
+    def test_client_error_is_not_an_outage(self):
+        session = FakeSession([400])
+        self.assertEqual(self.generate(session), "")
+        self.assertEqual(session.calls, 1)  # ni retry ni panne signalée
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_transport_errors_raise_unavailable(self):
+        session = FakeSession([requests.ConnectionError("refusé"), requests.ConnectionError("refusé")])
+        with self.assertRaises(LLMUnavailableError):
+            self.generate(session)
+        self.assertEqual(session.calls, 2)
+        self.assertEqual(self.scheduler.metrics()["inflight"], 0)
+
+    def test_client_error_falls_back_to_next_model(self):
+        session = FakeSession([404, "réponse"])
+        with patch.object(ollama_gateway, "get_session", lambda: session):
+            self.assertEqual(ollama_gateway.generate_ollama("prompt", models=["m", "m"]), "réponse")
+
+
+class NumCtxTests(GatewayTestCase):
+    def test_default_num_ctx_is_the_model_one(self):
+        session = FakeSession(["réponse", "réponse"])
+        with patch.dict(ollama_gateway.MODEL_NUM_CTX, {"m": 8192}):
+            self.generate(session)
+            self.generate(session, num_ctx=2048)
+        self.assertEqual([p["options"]["num_ctx"] for p in session.payloads], [8192, 2048])
+
+    def test_warmup_uses_the_model_num_ctx(self):
+        session = FakeSession([""])
+        with patch.dict(ollama_gateway.MODEL_NUM_CTX, {"m": 8192}), \
+                patch.object(ollama_gateway, "get_session", lambda: session):
+            ollama_gateway.warm_models(["m"])
+        self.assertEqual(session.payloads[0]["options"], {"num_ctx": 8192})
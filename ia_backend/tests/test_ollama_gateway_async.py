@@ -0,0 +1,132 @@
+import asyncio
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from ia_backend.services import ollama_gateway
+from ia_backend.services.llm_resilience import CircuitBreaker, STATE_HALF_OPEN, STATE_OPEN
+from ia_backend.services.llm_scheduler import LLMScheduler, PRIORITY_BATCH
+
+
+class FakePressure:
+    def value(self):
+        return 0
+
+    def incr(self):
+        pass
+
+    def decr(self):
+        pass
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self, content_type="application/json"):
+        return self.data
+
+
+class FakeRequest:
+    def __init__(self, session):
+        self.session = session
+
+    async def __aenter__(self):
+        self.session.started.set()
+        if self.session.hang:
+            await asyncio.Event().wait()  # Ollama qui ne répond jamais
+        return FakeResponse({"response": " réponse "})
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, hang=False):
+        self.hang = hang
+        self.started = asyncio.Event()
+
+    def post(self, url, json=None, timeout=None):
+        return FakeRequest(self)
+
+
+def make_scheduler():
+    scheduler = LLMScheduler(max_inflight=1, model_limits={"m": 1}, reserved_interactive=0)
+    scheduler.pressure = FakePressure()
+    return scheduler
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class AsyncGenerateCancellationTests(TestCase):
+    def setUp(self):
+        self.scheduler = make_scheduler()
+        self.breaker = CircuitBreaker("test", failure_threshold=1, open_seconds=0)
+        patches = [
+            patch.object(ollama_gateway, "scheduler", self.scheduler),
+            patch.object(ollama_gateway, "get_breaker", lambda base_url, model: self.breaker),
+            patch.object(ollama_gateway.telemetry, "record", lambda *args, **kwargs: None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def generate(self, session, before_cancel):
+        async def run():
+            with patch.object(ollama_gateway, "get_async_session", self.async_return(session)):
+                task = asyncio.ensure_future(ollama_gateway.agenerate_ollama("prompt", models=["m"]))
+                if before_cancel is None:
+                    return await task
+                await before_cancel()
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+        return asyncio.run(run())
+
+    @staticmethod
+    def async_return(value):
+        async def getter():
+            return value
+        return getter
+
+    def open_breaker(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+
+    def test_success_releases_slot(self):
+        self.assertEqual(self.generate(FakeSession(), None), "réponse")
+        self.assertEqual(self.scheduler.metrics()["inflight"], 0)
+
+    def test_cancel_during_request_releases_slot_and_probe(self):
+        self.open_breaker()
+        session = FakeSession(hang=True)
+        self.generate(session, session.started.wait)
+
+        self.assertEqual(self.scheduler.metrics()["inflight"], 0)
+        self.assertFalse(self.breaker.probe_inflight)
+        self.assertEqual(self.breaker.snapshot()["abandoned"], 1)
+
+    def test_cancel_while_waiting_for_slot_releases_it_once_granted(self):
+        self.open_breaker()
+        self.scheduler.acquire("m", PRIORITY_BATCH)  # seul slot occupé : l'appel reste en file
+
+        async def queued():
+            self.assertTrue(await asyncio.get_running_loop().run_in_executor(
+                None, wait_until, lambda: self.scheduler.metrics()["queue_depth"]["batch"] == 1
+            ))
+        self.generate(FakeSession(), queued)
+        self.assertNotEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.assertFalse(self.breaker.probe_inflight)
+
+        self.scheduler.release("m", PRIORITY_BATCH)  # l'attente abandonnée obtient le slot...
+        self.assertTrue(wait_until(lambda: self.scheduler.metrics()["inflight"] == 0))  # ...et le rend
+        self.scheduler.acquire("m", PRIORITY_BATCH)
+        self.assertEqual(self.scheduler.metrics()["inflight"], 1)
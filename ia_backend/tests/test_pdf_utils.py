@@ -0,0 +1,77 @@
+from unittest import TestCase
+
+from ia_backend.services.pdf_utils import chunk_pages_by_tokens, split_by_token_window
+from ia_backend.services.token_budget import estimate_tokens
+
+BUDGET = 300
+
+
+def prose_page(page: int, sentences: int = 40) -> str:
+    paragraphs = []
+    for p in range(4):
+        paragraphs.append(" ".join(
+            f"La phrase {i} du paragraphe {p} de la page {page} décrit un résultat mesuré."
+            for i in range(sentences // 4)
+        ))
+    return "\n\n".join(paragraphs)
+
+
+def table_page(page: int, rows: int = 60) -> str:
+    return "\n".join(f"Ligne {page}-{r} | 2023 | 1 245,50 | 12 % | Région Nord" for r in range(rows))
+
+
+def bullet_page(page: int, items: int = 50) -> str:
+    return "\n\n".join(f"• élément {page}-{i} de la liste sans ponctuation finale" for i in range(items))
+
+
+class ChunkPagesByTokensTests(TestCase):
+    def assert_within_budget(self, blocks):
+        self.assertTrue(blocks)
+        for block in blocks:
+            self.assertLessEqual(estimate_tokens(block.text), BUDGET)
+            self.assertLessEqual(block.tokens, BUDGET)
+
+    def test_prose_is_split_on_sentence_boundaries(self):
+        blocks = chunk_pages_by_tokens([prose_page(p) for p in range(5)], BUDGET)
+        self.assert_within_budget(blocks)
+        for block in blocks:
+            self.assertTrue(block.text.rstrip().endswith("."))
+
+    def test_table_without_punctuation_is_hard_split(self):
+        blocks = chunk_pages_by_tokens([table_page(p) for p in range(10)], BUDGET)
+        self.assertGreater(len(blocks), 10)
+        self.assert_within_budget(blocks)
+
+    def test_bullet_list_is_hard_split(self):
+        blocks = chunk_pages_by_tokens([bullet_page(p) for p in range(10)], BUDGET)
+        self.assertGreater(len(blocks), 5)
+        self.assert_within_budget(blocks)
+
+    def test_text_is_not_lost(self):
+        pages = [table_page(0), prose_page(1), bullet_page(2)]
+        blocks = chunk_pages_by_tokens(pages, BUDGET)
+        source_words = " ".join(pages).split()
+        block_words = " ".join(block.text for block in blocks).split()
+        self.assertEqual(block_words, source_words)
+
+    def test_pages_are_tracked_in_order(self):
+        blocks = chunk_pages_by_tokens([prose_page(p) for p in range(3)], BUDGET)
+        pages = [p for block in blocks for p in block.pages]
+        self.assertEqual(sorted(set(pages)), [0, 1, 2])
+        self.assertEqual(pages, sorted(pages))
+
+    def test_empty_pages(self):
+        self.assertEqual(chunk_pages_by_tokens(["", "  ", None], BUDGET), [])
+
+
+class SplitByTokenWindowTests(TestCase):
+    def test_windows_fit_budget(self):
+        text = " ".join(f"mot{i}" for i in range(5000))
+        pieces = split_by_token_window(text, 100)
+        self.assertTrue(all(estimate_tokens(piece) <= 100 for piece in pieces))
+        self.assertEqual(" ".join(pieces), text)
+
+    def test_word_longer_than_window_is_cut(self):
+        pieces = split_by_token_window("a" * 1000, 100)
+        self.assertTrue(all(estimate_tokens(piece) <= 100 for piece in pieces))
+        self.assertEqual("".join(pieces), "a" * 1000)
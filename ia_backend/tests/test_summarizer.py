@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from ia_backend.services.summarizer import MAX_KEYWORDS, parse_keywords_themes
+
+
+class ParseKeywordsThemesTests(TestCase):
+    def test_json_object(self):
+        raw = '{"mots_cles": ["énergie", "réseau"], "themes": ["transition énergétique"]}'
+        self.assertEqual(parse_keywords_themes(raw), (["énergie", "réseau"], ["transition énergétique"]))
+
+    def test_json_with_surrounding_text_and_accented_keys(self):
+        raw = 'Voici le résultat :\n{"mots-clés": "énergie, réseau", "thèmes": ["climat"]}\nFin.'
+        self.assertEqual(parse_keywords_themes(raw), (["énergie", "réseau"], ["climat"]))
+
+    def test_english_keys(self):
+        raw = '{"keywords": ["budget"], "themes": []}'
+        self.assertEqual(parse_keywords_themes(raw), (["budget"], []))
+
+    def test_labelled_lines_fallback(self):
+        raw = "**Mots-clés :** énergie, réseau; stockage\n- Thèmes : climat, industrie"
+        self.assertEqual(
+            parse_keywords_themes(raw),
+            (["énergie", "réseau", "stockage"], ["climat", "industrie"])
+        )
+
+    def test_invalid_json_falls_back_to_lines(self):
+        raw = '{"mots_cles": ["énergie",\nMots clés : énergie, réseau\nThemes : climat'
+        self.assertEqual(parse_keywords_themes(raw), (["énergie", "réseau"], ["climat"]))
+
+    def test_terms_are_cleaned_deduplicated_and_limited(self):
+        raw = '{"mots_cles": [" - Énergie.", "énergie", "\\"réseau\\"", "", "a", "b", "c", "d", "e"], "themes": "x"}'
+        keywords, themes = parse_keywords_themes(raw)
+        self.assertEqual(keywords[:2], ["Énergie", "réseau"])
+        self.assertEqual(len(keywords), MAX_KEYWORDS)
+        self.assertEqual(themes, ["x"])
+
+    def test_empty_or_unusable_response(self):
+        self.assertEqual(parse_keywords_themes(""), ([], []))
+        self.assertEqual(parse_keywords_themes(None), ([], []))
+        self.assertEqual(parse_keywords_themes("Aucun mot-clé identifiable."), ([], []))
+        self.assertEqual(parse_keywords_themes('["énergie"]'), ([], []))
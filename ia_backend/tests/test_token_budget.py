@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from ia_backend.services.token_budget import (
+    CHARS_PER_TOKEN,
+    MERGE_SEPARATOR,
+    context_budget,
+    estimate_tokens,
+    group_by_token_budget,
+)
+
+
+def text_of(tokens: int) -> str:
+    return "x" * (tokens * CHARS_PER_TOKEN)
+
+
+class ContextBudgetTests(TestCase):
+    def test_budget_leaves_room_for_prompt_and_generation(self):
+        template = text_of(100) + "{text}"
+        self.assertEqual(context_budget(4096, template, 1500, 150), 4096 - 100 - 1500 - 150)
+
+    def test_budget_has_a_floor(self):
+        self.assertEqual(context_budget(1024, "{text}", 2000, 150), 256)
+
+
+class GroupByTokenBudgetTests(TestCase):
+    def test_groups_respect_size_and_budget(self):
+        texts = [text_of(300) for _ in range(12)]
+        groups = group_by_token_budget(texts, max_tokens=1000, max_size=5)
+
+        self.assertEqual(sum(len(g) for g in groups), 12)
+        for group in groups:
+            self.assertLessEqual(len(group), 5)
+            self.assertLessEqual(estimate_tokens(MERGE_SEPARATOR.join(group)), 1000)
+
+    def test_order_is_preserved(self):
+        texts = [f"{i:03d}" + text_of(200) for i in range(9)]
+        groups = group_by_token_budget(texts, max_tokens=700, max_size=5)
+        self.assertEqual([t for g in groups for t in g], texts)
+
+    def test_oversized_text_gets_its_own_group(self):
+        texts = [text_of(100), text_of(5000), text_of(100)]
+        groups = group_by_token_budget(texts, max_tokens=1000, max_size=5)
+        self.assertEqual([len(g) for g in groups], [1, 1, 1])
+
+    def test_empty_input(self):
+        self.assertEqual(group_by_token_budget([], max_tokens=1000, max_size=5), [])
+
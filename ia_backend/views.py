@@ -7,15 +7,20 @@ import hashlib
 import logging
 from urllib.parse import urlparse
 
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from ia_backend.services.pdf_utils import extract_blocks_from_pdf
+from ia_backend.services.pdf_utils import estimate_block_count
+from ia_backend.services.summarizer import get_block_token_budget
 from ia_backend.services.backup_service import load_global_summary_if_exists, save_global_summary
 from ia_backend.job_queue import Job
 from ia_backend.tasks import process_job_task
 
-from ia_backend.ask_engine import load_all_blocks, find_relevant_blocks, generate_answer
+from ia_backend.services.ollama_gateway import get_gateway_metrics, get_telemetry_metrics, LLMUnavailableError, LLMStreamInterrupted
+from ia_backend.services.job_progress import read_progress, mark_job_status, FINAL_PROGRESS_STAGES, PROGRESS_QUEUED
+from ia_backend.ask_engine import generate_answer, generate_answer_stream, rerank_batcher
+from ia_backend.services.ask_context import AskContext
 from celery.result import AsyncResult
 
 # ---------- Logging centralisé ----------
@@ -29,6 +34,10 @@ if not logger.handlers:
     logger.addHandler(handler)
 
 CACHE_DIR = "temp_cache"
+PROGRESS_POLL_INTERVAL = 0.5   # secondes entre deux lectures de la progression
+PROGRESS_KEEPALIVE = 15        # commentaire SSE pour garder la connexion ouverte
+PROGRESS_STREAM_MAX = 4 * 3600 # durée max d'un flux SSE
+PROGRESS_MISSING_GRACE = 60    # flux fermé si la progression disparaît plus longtemps
 
 
 def extract_filename_from_url(pdf_url):
@@ -85,8 +94,8 @@ def summarize_from_url(request):
         return Response({"error": "PDF invalide.", "detail": str(e)}, status=400)
 
     try:
-        total_pages = extract_blocks_from_pdf(local_pdf_path, return_pages_only=True)
-        estimated_blocks = total_pages if total_pages < 10 else total_pages // 3
+        # Nombre réel de blocs (même découpage par budget de tokens que le worker)
+        estimated_blocks = estimate_block_count(local_pdf_path, get_block_token_budget()) or 1
     except Exception as e:
         logger.warning(f"Erreur lecture préliminaire PDF : {e}")
         estimated_blocks = 10
@@ -102,6 +111,8 @@ def summarize_from_url(request):
 
     logger.info(f"📨 Job {job_id} envoyé à Celery (priorité={estimated_blocks})")
 
+    # Progression publiée dès l'envoi : le flux SSE peut s'ouvrir avant le démarrage du worker
+    mark_job_status(job_id, PROGRESS_QUEUED)
     task = process_job_task.apply_async(args=[job_data])
 
     return Response({
@@ -136,6 +147,52 @@ def get_summarize_status(request, task_id):
         return Response({"status": res.state})
 
 
+@api_view(["GET"])
+def get_summarize_progress(request, job_id):
+    progress = read_progress(job_id)
+    if progress is None:
+        return Response({"error": "Aucune progression pour ce job_id."}, status=404)
+    return Response(progress)
+
+
+def stream_summarize_progress(request, job_id):
+    """
+    Flux Server-Sent Events : un événement à chaque changement de progression,
+    fermé quand le job est terminé ou en échec. 404 si le job_id n'a aucune progression
+    (inconnu ou mal saisi) : le flux n'occupe pas un thread pendant PROGRESS_STREAM_MAX.
+    """
+    if read_progress(job_id) is None:
+        return JsonResponse({"error": "Aucune progression pour ce job_id."}, status=404)
+
+    def event_stream():
+        started = time.time()
+        last_payload = None
+        last_sent = started
+        last_seen = started
+
+        while time.time() - started < PROGRESS_STREAM_MAX:
+            progress = read_progress(job_id)
+            if progress is not None:
+                last_seen = time.time()
+            elif time.time() - last_seen >= PROGRESS_MISSING_GRACE:
+                return
+            if progress is not None and progress != last_payload:
+                last_payload = progress
+                last_sent = time.time()
+                yield f"event: progress\ndata: {json.dumps(progress, ensure_ascii=False)}\n\n"
+                if progress.get("stage") in FINAL_PROGRESS_STAGES:
+                    return
+            elif time.time() - last_sent >= PROGRESS_KEEPALIVE:
+                last_sent = time.time()
+                yield ": keep-alive\n\n"
+            time.sleep(PROGRESS_POLL_INTERVAL)
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # pas de bufferisation côté reverse proxy
+    return response
+
+
 @api_view(["POST"])
 def ask_from_url(request):
     question = request.data.get("question")
@@ -143,40 +200,119 @@ def ask_from_url(request):
     entreprise = request.data.get("entreprise")
     session_id = request.data.get("session_id") or str(uuid.uuid4())
     reformule = request.data.get("reformule", False)
-    general = request.data.get("general", False)
+    pdf_filename = request.data.get("pdf_filename")  # optionnel : limiter la recherche à un PDF du job
+    with_timings = request.data.get("timings", False)    # optionnel : temps par étape dans la réponse
 
     if not question or not job_id or not entreprise:
         return Response({"error": "question, job_id et entreprise sont requis."}, status=400)
 
-    try:
-        blocks = load_all_blocks(entreprise, job_id)
-    except FileNotFoundError:
-        blocks = []
-    except Exception as e:
-        return Response({"error": f"Erreur lors du chargement des blocs : {str(e)}"}, status=500)
+    ctx = AskContext(question, entreprise, job_id)
 
+    # Les blocs sont chargés une seule fois, dans generate_answer (magasin résident par job)
     try:
         answer = generate_answer(
             question=question,
-            blocks=blocks,
             job_id=job_id,
             session_id=session_id,
             user_id=None,
+            entreprise=entreprise,
             reformule=reformule,
-            general=general
+            pdf_filename=pdf_filename,
+            ctx=ctx
         )
+    except LLMUnavailableError as e:
+        logger.error(f"LLM indisponible pour generate_answer : {e}")
+        response = Response({"error": "Service IA momentanément indisponible.", "retry_after": round(e.retry_after)}, status=503)
+        response["Retry-After"] = str(max(1, round(e.retry_after)))
+        return response
     except Exception as e:
         logger.error(f"Erreur generate_answer : {e}")
         return Response({"error": f"Erreur IA : {str(e)}"}, status=500)
 
-    return Response({
+    payload = {
         "question": question,
         "answer": answer,
         "job_id": job_id,
         "entreprise": entreprise,
         "session_id": session_id
-    })
+    }
+    if with_timings:
+        payload["timings"] = ctx.summary()
+    return Response(payload)
+
+
+
+@api_view(["GET"])
+def llm_metrics(request):
+    """
+    Métriques de la passerelle LLM du process web (file d'attente, slots, attentes)
+    + télémétrie par appel fusionnée sur tous les process (tokens/s, tokens de prompt,
+    attente en file vs génération), par appelant, modèle et entreprise,
+    + lots du re-ranking croisé (taille moyenne, scores servis depuis le cache).
+    """
+    metrics = get_gateway_metrics()
+    metrics["telemetry"] = get_telemetry_metrics()
+    metrics["rerank"] = rerank_batcher.stats()
+    return Response(metrics)
+
+
+@api_view(["POST"])
+def ask_from_url_stream(request):
+    """
+    Variante streaming de ask_from_url (Server-Sent Events) :
+    un événement `token` par fragment généré, puis un événement `done`.
+    Flux coupé en cours de génération : événement `error` avec `truncated: true`
+    (les tokens déjà reçus ne forment pas une réponse complète).
+    """
+    question = request.data.get("question")
+    job_id = request.data.get("job_id")
+    entreprise = request.data.get("entreprise")
+    session_id = request.data.get("session_id") or str(uuid.uuid4())
+    reformule = request.data.get("reformule", False)
+    pdf_filename = request.data.get("pdf_filename")
+    with_timings = request.data.get("timings", False)
+
+    if not question or not job_id or not entreprise:
+        return Response({"error": "question, job_id et entreprise sont requis."}, status=400)
 
+    ctx = AskContext(question, entreprise, job_id)
+
+    def event_stream():
+        try:
+            for chunk in generate_answer_stream(
+                question=question,
+                job_id=job_id,
+                session_id=session_id,
+                user_id=None,
+                entreprise=entreprise,
+                reformule=reformule,
+                pdf_filename=pdf_filename,
+                ctx=ctx
+            ):
+                yield f"event: token\ndata: {json.dumps({'token': chunk}, ensure_ascii=False)}\n\n"
+        except LLMUnavailableError as e:
+            logger.error(f"LLM indisponible pour generate_answer_stream : {e}")
+            error = {"error": "Service IA momentanément indisponible.", "status": 503, "retry_after": round(e.retry_after)}
+            yield f"event: error\ndata: {json.dumps(error, ensure_ascii=False)}\n\n"
+            return
+        except LLMStreamInterrupted as e:
+            logger.error(f"Flux interrompu pour generate_answer_stream : {e}")
+            error = {"error": "Réponse interrompue, veuillez réessayer.", "status": 503, "truncated": True}
+            yield f"event: error\ndata: {json.dumps(error, ensure_ascii=False)}\n\n"
+            return
+        except Exception as e:
+            logger.error(f"Erreur generate_answer_stream : {e}")
+            yield f"event: error\ndata: {json.dumps({'error': f'Erreur IA : {str(e)}'}, ensure_ascii=False)}\n\n"
+            return
+        done = {"job_id": job_id, "entreprise": entreprise, "session_id": session_id}
+        if with_timings:
+            done["timings"] = ctx.summary()
+        yield f"event: done\ndata: {json.dumps(done, ensure_ascii=False)}\n\n"
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @api_view(["GET"])